@@ -0,0 +1,42 @@
+"""Compares awaiting remote Context values one at a time before rendering,
+against render_async(), which awaits them concurrently.
+
+Usage: python benchmarks/bench_async.py [VALUES]
+"""
+
+import sys
+import time
+import asyncio
+import enyaml
+
+LATENCY = 0.01
+
+
+async def fetch(value):
+    await asyncio.sleep(LATENCY)
+    return value
+
+
+def main(values=40):
+    names = [f'v{i}' for i in range(values)]
+    tmpl = enyaml.Template(''.join(f'{name}: !$ {name}\n' for name in names))
+
+    async def serial():
+        ctx = enyaml.Context()
+        for i, name in enumerate(names):
+            ctx[name] = await fetch(i)
+        return tmpl.render(ctx)
+
+    async def concurrent():
+        ctx = enyaml.Context({name: fetch(i) for i, name in enumerate(names)})
+        return await tmpl.render_async(ctx)
+
+    for label, func in (('await each', serial), ('render_async', concurrent)):
+        start = time.perf_counter()
+        asyncio.run(func())
+        elapsed = time.perf_counter() - start
+        print(f'{label:15} {elapsed * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,31 @@
+"""Compares composing a template with TemplateLoader and CTemplateLoader,
+against loading it from a GraphCache.
+
+Usage: python benchmarks/bench_cache.py [SECTIONS]
+"""
+
+import sys
+import time
+import tempfile
+import enyaml
+from bench_loader import make_source
+
+
+def main(sections=5000):
+    source = make_source(sections)
+    with tempfile.TemporaryDirectory() as directory:
+        cache = enyaml.GraphCache(directory)
+        for Loader in (enyaml.TemplateLoader, enyaml.CTemplateLoader):
+            start = time.perf_counter()
+            enyaml.TemplateSet(source, Loader)
+            elapsed = time.perf_counter() - start
+            print(f'{Loader.__name__:18} {elapsed:6.3f} s')
+        enyaml.TemplateSet(source, cache=cache)
+        start = time.perf_counter()
+        enyaml.TemplateSet(source, cache=cache)
+        elapsed = time.perf_counter() - start
+        print(f'{"GraphCache":18} {elapsed:6.3f} s')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
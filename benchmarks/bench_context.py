@@ -0,0 +1,35 @@
+"""Measures Context lookup cost against scope depth, compared to a plain
+ChainMap.
+
+Usage: python benchmarks/bench_context.py [NUMBER]
+"""
+
+import sys
+import timeit
+from collections import ChainMap
+from contextlib import ExitStack
+from enyaml import Context
+
+
+def main(number=200000):
+    for depth in (1, 4, 8, 16, 32):
+        results = []
+        for cls in (ChainMap, Context):
+            ctx = cls({'outer': 1})
+            with ExitStack() as stack:
+                for i in range(depth):
+                    if cls is Context:
+                        stack.enter_context(ctx.push({f'x{i}': i}))
+                    else:
+                        ctx.maps.insert(0, {f'x{i}': i})
+                elapsed = min(timeit.repeat(
+                    lambda: ctx['outer'], number=number, repeat=3))
+            results.append(elapsed / number * 1e9)
+        print(
+            f'depth {depth:3}: ChainMap {results[0]:7.1f} ns  '
+            f'Context {results[1]:7.1f} ns'
+        )
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
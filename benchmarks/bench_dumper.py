@@ -0,0 +1,29 @@
+"""Compares output throughput of TemplateDumper and RenderedDumper on
+rendered data.
+
+Usage: python benchmarks/bench_dumper.py [ITEMS]
+"""
+
+import sys
+import time
+import enyaml
+
+
+def main(items=20000):
+    data = [
+        {'name': f'item{i}', 'values': [i, i / 2, True, None],
+         'nested': {'a': 'text', 'b': [1, 2, 3]}}
+        for i in range(items)
+    ]
+    for label, dump in (
+        ('TemplateDumper', enyaml.dump),
+        ('RenderedDumper', enyaml.dump_rendered),
+    ):
+        start = time.perf_counter()
+        size = len(dump(data).encode()) / 1e6
+        elapsed = time.perf_counter() - start
+        print(f'{label:16} {size / elapsed:6.2f} MB/s')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
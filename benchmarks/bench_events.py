@@ -0,0 +1,41 @@
+"""Compares rendering a template to YAML text via render_all() and
+dump_all_rendered(), against render_to_stream().
+
+Usage: python benchmarks/bench_events.py [ITEMS]
+"""
+
+import sys
+import time
+import tracemalloc
+import enyaml
+
+
+SOURCE = '''
+items:
+  !for i in range(count):
+    name: !$f "item{i}"
+    index: !$ i
+    values: [1, 2.5, true, null, text]
+    nested: {a: 1, b: {c: 2, d: [x, y, z]}}
+'''
+
+
+def main(items=5000):
+    enyaml.add_builtin('range', range)
+    tmpl = enyaml.TemplateSet(SOURCE)
+    for label, func in (
+        ('construct + dump', lambda ctx: enyaml.dump_all_rendered(
+            tmpl.render_all(ctx))),
+        ('render_to_stream', lambda ctx: tmpl.render_to_stream(ctx)),
+    ):
+        tracemalloc.start()
+        start = time.perf_counter()
+        func(enyaml.Context({'count': items}))
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f'{label:18} {elapsed:6.2f} s  peak {peak / 1e6:7.1f} MB')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
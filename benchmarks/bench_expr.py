@@ -0,0 +1,31 @@
+"""Compares tree-walking and compiled evaluation of expressions.
+
+Usage: python benchmarks/bench_expr.py [NUMBER]
+"""
+
+import sys
+import timeit
+from enyaml.expr import parse
+
+
+TERM = "(a * 2 + b.c - 3.5 if flag and not off else d // 4)"
+CTX = {'a': 1, 'b': {'c': 2}, 'd': 9, 'flag': True, 'off': False}
+
+
+def main(number=20000):
+    for size in (1, 4, 16, 64):
+        expr = parse(' + '.join([TERM] * size))
+        compiled = expr.compile()
+        walk = min(timeit.repeat(
+            lambda: expr.evaluate(CTX), number=number, repeat=3))
+        comp = min(timeit.repeat(
+            lambda: compiled(CTX), number=number, repeat=3))
+        print(
+            f'{size:3} terms: evaluate {walk / number * 1e6:8.2f} us  '
+            f'compiled {comp / number * 1e6:8.2f} us  '
+            f'({walk / comp:.1f}x)'
+        )
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,22 @@
+"""Measures !$f rendering cost against the size of the Context.
+
+Usage: python benchmarks/bench_format.py [NUMBER]
+"""
+
+import sys
+import timeit
+import enyaml
+
+
+def main(number=2000):
+    tmpl = enyaml.Template('!$f "{host}:{port}"')
+    for size in (10, 1000, 100000):
+        ctx = enyaml.Context({f'key{i}': i for i in range(size)})
+        ctx.update(host='localhost', port=80)
+        elapsed = min(timeit.repeat(
+            lambda: tmpl.render(ctx), number=number, repeat=3))
+        print(f'{size:7} keys: {elapsed / number * 1e6:8.2f} us/render')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,44 @@
+"""Compares re-rendering a large template in full against re-rendering it
+incrementally after one Context key has changed.
+
+Usage: python benchmarks/bench_incremental.py [SERVICES]
+"""
+
+import sys
+import time
+import enyaml
+from enyaml.incremental import IncrementalRenderer
+
+
+SOURCE = '''
+version: !$ version
+services:
+  !for svc in services:
+    name: !$ svc
+    image: !$f "registry/{svc}:latest"
+    env: {LOG_LEVEL: info, REGION: !$ region}
+    ports: [80, 443]
+'''
+
+
+def main(services=5000):
+    tmpl = enyaml.Template(SOURCE)
+    ctx = enyaml.Context({
+        'version': 1, 'region': 'us',
+        'services': [f'svc{i}' for i in range(services)],
+    })
+    renderer = IncrementalRenderer(tmpl, ctx)
+    renderer.render()
+    ctx['version'] = 2
+    for label, func in (
+        ('Template.render_direct', lambda: tmpl.render_direct(ctx)),
+        ('rerender', lambda: renderer.rerender({'version'})),
+    ):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        print(f'{label:24} {elapsed * 1e3:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
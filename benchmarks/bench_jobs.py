@@ -0,0 +1,39 @@
+"""Measures how rendering many template files with render_files() scales
+with the number of worker processes.
+
+Usage: python benchmarks/bench_jobs.py [FILES]
+"""
+
+import os
+import sys
+import time
+import tempfile
+from enyaml.batch import render_files
+from bench_loader import make_source
+
+
+def main(files=400):
+    source = make_source(50)
+    with tempfile.TemporaryDirectory() as directory:
+        pairs = []
+        for i in range(files):
+            infile = os.path.join(directory, f'in{i}.yaml')
+            with open(infile, 'w') as f:
+                f.write(source)
+            pairs.append((infile, os.path.join(directory, f'out{i}.yaml')))
+        baseline = None
+        for jobs in (1, 2, 4, 8):
+            start = time.perf_counter()
+            for _, _, error in render_files(pairs, jobs=jobs):
+                assert error is None, error
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(
+                f'{jobs} workers {elapsed:7.2f} s  '
+                f'{files / elapsed:7.0f} files/s  '
+                f'({baseline / elapsed:.1f}x)'
+            )
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
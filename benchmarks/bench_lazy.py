@@ -0,0 +1,50 @@
+"""Compares reading one value from a large rendered document, rendered in full
+and rendered lazily.
+
+Usage: python benchmarks/bench_lazy.py [SERVICES] [NUMBER]
+"""
+
+import sys
+import timeit
+import enyaml
+
+
+SOURCE = '''
+!set
+region: eu-west-1
+---
+services:
+  !for name in names:
+    image: !$f "registry.example.com/{name}:latest"
+    region: !$ region
+    env:
+      NAME: !$ name
+      URL: !$f "https://{name}.{region}.example.com"
+    ports: [80, 443]
+'''
+
+
+def main(services=2000, number=5):
+    tmpl = enyaml.Template(SOURCE)
+    names = [f'svc{i}' for i in range(services)]
+    target = services // 2
+
+    def full():
+        data = tmpl.render_direct(enyaml.Context({'names': names}))
+        return data['services'][target]['env']['URL']
+
+    def lazy():
+        data = tmpl.render_lazy(enyaml.Context({'names': names}))
+        return data['services'][target]['env']['URL']
+
+    assert full() == lazy()
+    for label, func in (
+        ('render_direct', full),
+        ('render_lazy', lazy),
+    ):
+        elapsed = min(timeit.repeat(func, number=number, repeat=3))
+        print(f'{label:14} {elapsed / number * 1e3:8.2f} ms/lookup')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
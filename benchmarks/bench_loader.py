@@ -0,0 +1,35 @@
+"""Compares template parsing throughput of TemplateLoader and
+CTemplateLoader.
+
+Usage: python benchmarks/bench_loader.py [SECTIONS]
+"""
+
+import sys
+import time
+import enyaml
+
+
+def make_source(sections):
+    lines = ['!set {items: [a, b, c]}', '---']
+    for i in range(sections):
+        lines.append(f'section{i}:')
+        lines.append('  name: !$f "section {items}"')
+        lines.append('  values: [1, 2.5, true, null, text]')
+        lines.append('  nested: {a: 1, b: {c: 2, d: [x, y, z]}}')
+        lines.append('  looped:')
+        lines.append('    !for item in items: !$ item')
+    return '\n'.join(lines)
+
+
+def main(sections=5000):
+    source = make_source(sections)
+    size = len(source.encode()) / 1e6
+    for Loader in (enyaml.TemplateLoader, enyaml.CTemplateLoader):
+        start = time.perf_counter()
+        enyaml.TemplateSet(source, Loader)
+        elapsed = time.perf_counter() - start
+        print(f'{Loader.__name__:18} {size / elapsed:6.2f} MB/s')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
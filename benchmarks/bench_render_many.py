@@ -0,0 +1,35 @@
+"""Compares rendering one template for many contexts with enyaml.render(),
+against render_many() with 1, 2 and 4 worker processes.
+
+Usage: python benchmarks/bench_render_many.py [CONTEXTS]
+"""
+
+import sys
+import time
+import enyaml
+from bench_template import SOURCE
+
+
+def main(contexts=5000):
+    def make_contexts():
+        return ({'name': f'tenant{i}'} for i in range(contexts))
+
+    tmpl = enyaml.Template(SOURCE)
+    for label, func in (
+        ('enyaml.render', lambda: [
+            enyaml.render(SOURCE, enyaml.Context(ctx))
+            for ctx in make_contexts()
+        ]),
+    ) + tuple(
+        (f'render_many(jobs={jobs})', lambda jobs=jobs: list(
+            enyaml.render_many(tmpl, make_contexts(), jobs=jobs)))
+        for jobs in (1, 2, 4)
+    ):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        print(f'{label:20} {contexts / elapsed:8.0f} renders/s')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
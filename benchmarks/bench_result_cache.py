@@ -0,0 +1,27 @@
+"""Compares rendering a Template against returning the result from a
+ResultCache.
+
+Usage: python benchmarks/bench_result_cache.py [NUMBER]
+"""
+
+import sys
+import timeit
+import enyaml
+from bench_template import SOURCE
+
+
+def main(number=2000):
+    tmpl = enyaml.Template(SOURCE)
+    cache = enyaml.ResultCache()
+    for label, func in (
+        ('Template.render', lambda: tmpl.render(enyaml.Context())),
+        ('ResultCache.render',
+         lambda: cache.render(tmpl, enyaml.Context())),
+    ):
+        elapsed = min(timeit.repeat(func, number=number, repeat=3))
+        print(f'{label:24} {number / elapsed:10.0f} renders/s')
+    print(cache.info())
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,58 @@
+"""Renders mostly-static documents of two sizes, with static-subtree hoisting
+on and off, to measure how the cost of rendering scales with document size.
+
+"render" only renders the nodes; "render+construct" also constructs the
+Python data, which always costs time proportional to the whole document.
+
+Usage: python benchmarks/bench_static.py [NUMBER]
+"""
+
+import sys
+import timeit
+from unittest import mock
+import enyaml
+from enyaml.nodes import BaseTemplateNode
+
+
+def make_source(sections=200):
+    lines = []
+    for i in range(sections):
+        lines.append(f'section{i}:')
+        lines.append('  name: static')
+        lines.append('  values: [1, 2.5, true, null, text]')
+        lines.append('  nested: {a: 1, b: {c: 2, d: [x, y, z]}}')
+        if i % 20 == 0:
+            lines.append('  dynamic: !$ value')
+    return '\n'.join(lines)
+
+
+def render_only(tmpl, ctx):
+    loader = tmpl.make_loader()
+    for node in tmpl.nodes:
+        loader.render_node(node, ctx)
+
+
+def time(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e3
+
+
+def main(number=20):
+    ctx = enyaml.Context({'value': 1})
+    for hoisting in (False, True):
+        with mock.patch.object(
+            BaseTemplateNode, '_is_static',
+            BaseTemplateNode._is_static if hoisting else lambda self: False
+        ):
+            for sections in (200, 2000):
+                tmpl = enyaml.Template(make_source(sections))
+                render = time(lambda: render_only(tmpl, ctx), number)
+                full = time(lambda: tmpl.render(ctx), number)
+                print(
+                    f'hoisting {"on " if hoisting else "off"} '
+                    f'{sections:5} sections: render {render:8.2f} ms  '
+                    f'render+construct {full:8.2f} ms'
+                )
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,45 @@
+"""Compares rendering a pre-composed Template against enyaml.render(), and
+rendering it straight to Python data.
+
+Usage: python benchmarks/bench_template.py [NUMBER]
+"""
+
+import sys
+import timeit
+import enyaml
+
+
+SOURCE = '''
+!set
+name: world
+items: [a, b, c, d, e]
+---
+greeting: !$f "Hello, {name}"
+static:
+  nested:
+    - 1
+    - 2.5
+    - true
+    - text
+  other: {x: 1, y: 2, z: 3}
+looped:
+  !for item in items:
+    name: !$ item
+    label: !$f "item {item}"
+'''
+
+
+def main(number=2000):
+    tmpl = enyaml.Template(SOURCE)
+    for label, func in (
+        ('enyaml.render', lambda: enyaml.render(SOURCE, enyaml.Context())),
+        ('Template.render', lambda: tmpl.render(enyaml.Context())),
+        ('Template.render_direct',
+         lambda: tmpl.render_direct(enyaml.Context())),
+    ):
+        elapsed = min(timeit.repeat(func, number=number, repeat=3))
+        print(f'{label:24} {number / elapsed:10.0f} renders/s')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
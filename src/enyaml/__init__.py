@@ -10,17 +10,29 @@ pass :class:`.TemplateLoader` and :class:`.TemplateDumper` as the default
 also provided for convenience.
 
 Additionally, two new high-level functions are provided for rendering ENYAML
-templates.
+templates. Templates which are rendered many times can be composed once into a
+:class:`.Template` or :class:`.TemplateSet` object instead.
 """
 
 __version__ = '0.1'
 
+import io
 import yaml
 from functools import partial
 from .util import *     # noqa: F403
 from .nodes import *    # noqa: F403
 from .loader import *   # noqa: F403
 from .dumper import *   # noqa: F403
+from .template import *  # noqa: F403
+from .events import *   # noqa: F403
+from .lazy import *     # noqa: F403
+from .selector import *  # noqa: F403
+from .cache import *    # noqa: F403
+from .incremental import *  # noqa: F403
+from .batch import *    # noqa: F403
+from .aio import *      # noqa: F403
+from . import events
+from .nodes import NOTHING
 
 
 def render(stream, ctx, Loader=TemplateLoader):  # noqa: F405
@@ -71,6 +83,121 @@ def render_all(stream, ctx, Loader=TemplateLoader):  # noqa: F405
         loader.dispose()
 
 
+def render_direct(stream, ctx, Loader=TemplateLoader):  # noqa: F405
+    """Load and render a single-document template straight to Python data.
+
+    Like :func:`render`, but without creating the rendered nodes. See
+    :meth:`.BaseTemplateLoader.render_node_data`.
+    """
+    loader = Loader(stream)
+    try:
+        return loader.render_single_data_direct(ctx)
+    finally:
+        loader.dispose()
+
+
+def render_all_direct(stream, ctx, Loader=TemplateLoader):  # noqa: F405
+    """Load and render a stream of template documents straight to Python
+    data.
+
+    Like :func:`render_all`, but without creating the rendered nodes. See
+    :meth:`.BaseTemplateLoader.render_node_data`.
+    """
+    loader = Loader(stream)
+    try:
+        while loader.check_node():
+            data = loader.render_node_data(loader.get_node(), ctx)
+            if data is not NOTHING:
+                yield data
+    finally:
+        loader.dispose()
+
+
+async def render_async(stream, ctx, Loader=TemplateLoader):  # noqa: F405
+    """Load and render a single-document template from a coroutine.
+
+    Like :func:`render`, but awaitable values in the Context are awaited
+    first, concurrently. See :mod:`enyaml.aio`.
+    """
+    return await Template(stream, Loader).render_async(ctx)  # noqa: F405
+
+
+async def render_all_async(
+    stream, ctx, Loader=TemplateLoader  # noqa: F405
+):
+    """Load and render a stream of template documents from a coroutine.
+
+    Like :func:`render_all`, but awaitable values in the Context are awaited
+    first, concurrently. See :mod:`enyaml.aio`.
+
+    :return: A list containing rendered data.
+    """
+    return await TemplateSet(  # noqa: F405
+        stream, Loader).render_all_async(ctx)
+
+
+def render_events(
+    stream, ctx, Loader=TemplateLoader, Dumper=RenderedDumper  # noqa: F405
+):
+    """Load and render a stream of template documents, producing
+    serialization events.
+
+    :param file-like stream: The stream to read the templates from.
+    :param Context ctx: A Context instance.
+    :param Loader: The loader class to instantiate.
+    :param Dumper: The dumper class used to represent rendered values.
+    :return: An iterable of :class:`yaml.Event` objects.
+
+    The rendered nodes are serialized directly, without constructing Python
+    objects from them. See :class:`.EventRenderer`.
+    """
+    loader = Loader(stream)
+    try:
+        renderer = EventRenderer(loader, Dumper(io.StringIO()))  # noqa: F405
+        yield from renderer.render_stream(loader.compose_nodes(), ctx)
+    finally:
+        loader.dispose()
+
+
+def render_to_stream(
+    stream, ctx, out=None,
+    Loader=TemplateLoader, Dumper=RenderedDumper,  # noqa: F405
+    **kwds
+):
+    """Load and render a stream of template documents, writing the output to
+    `out` as YAML.
+
+    Equivalent to ``dump_all_rendered(render_all(stream, ctx), out)``, but the
+    rendered nodes are serialized directly, without constructing Python
+    objects from them. See :class:`.EventRenderer`.
+
+    :param file-like stream: The stream to read the templates from.
+    :param Context ctx: A Context instance.
+    :param file-like out: The stream to write to.
+    :param Loader: The loader class to instantiate.
+    :param Dumper: The dumper class to emit with.
+    :param kwds: Passed on to the `Dumper`.
+    :return: The output, if `out` is :const:`None`.
+    """
+    loader = Loader(stream)
+    try:
+        return events.emit_rendered(
+            loader, loader.compose_nodes(), ctx, out, Dumper, **kwds)
+    finally:
+        loader.dispose()
+
+
+def add_builtin(
+    name, value, Loader=BaseTemplateLoader, deterministic=True  # noqa: F405
+):
+    """Makes a value available by name when rendering templates. By default,
+    it is available with all the template loader classes.
+
+    See :meth:`.BaseTemplateLoader.add_builtin`.
+    """
+    Loader.add_builtin(name, value, deterministic)
+
+
 load = partial(yaml.load, Loader=TemplateLoader)  # noqa: F405
 load_all = partial(yaml.load_all, Loader=TemplateLoader)  # noqa: F405
 scan = partial(yaml.scan, Loader=TemplateLoader)  # noqa: F405
@@ -85,6 +212,9 @@ serialize_all = partial(
     yaml.serialize_all, Dumper=TemplateDumper)  # noqa: F405
 dump = partial(yaml.dump, Dumper=TemplateDumper)  # noqa: F405
 dump_all = partial(yaml.dump_all, Dumper=TemplateDumper)  # noqa: F405
+dump_rendered = partial(yaml.dump, Dumper=RenderedDumper)  # noqa: F405
+dump_all_rendered = partial(
+    yaml.dump_all, Dumper=RenderedDumper)  # noqa: F405
 
 add_implicit_resolver = partial(
     yaml.add_implicit_resolver,
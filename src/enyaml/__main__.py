@@ -2,30 +2,225 @@
 # Released under the BSD 3-Clause License
 # https://enyaml.org/LICENSE
 
+import os
 import sys
+import glob
+import json
 import argparse
-from . import Context, dump_all, render_all
+import contextlib
+import itertools
+import yaml
+from . import (
+    Context, GraphCache, PathNotFoundError, TemplateSet, dump_all_rendered,
+    render_to_stream,
+)
+from .batch import render_files, render_many
 
 
 parser = argparse.ArgumentParser(
     description='Render YAML templates.'
 )
 parser.add_argument(
-    'infile', nargs='?',
-    type=argparse.FileType('r'),
-    default=sys.stdin
+    'infiles', nargs='*', metavar='infile',
+    help='template files or glob patterns to render (default: stdin)'
 )
 parser.add_argument(
     '--outfile', '-o',
     type=argparse.FileType('w'),
-    default=sys.stdout
+    default=sys.stdout,
+    help='where to write the output of a single template (default: stdout)'
+)
+parser.add_argument(
+    '--outdir', '-d', metavar='DIR',
+    help='render each template to a file in DIR, at the path of the template '
+    'relative to the directory containing all of the templates'
+)
+parser.add_argument(
+    '--pattern', '-p', metavar='PATTERN',
+    help='name each output file by formatting PATTERN with the {name}, '
+    '{stem}, {suffix} and {parent} of its template file (default: {name})'
+)
+parser.add_argument(
+    '--jobs', '-j', metavar='N', type=int, default=1,
+    help='render templates in N worker processes, or one per CPU if N is 0 '
+    '(default: 1)'
+)
+parser.add_argument(
+    '--contexts', '-c', metavar='FILE',
+    help='render the template once for each context in FILE, which holds '
+    'either one JSON object per line (if named *.jsonl or *.ndjson) or a '
+    'stream of YAML documents'
+)
+parser.add_argument(
+    '--select', '-s', metavar='PATH',
+    help='only render the value at PATH (e.g. services.api.env) in each '
+    'document'
+)
+parser.add_argument(
+    '--cache', metavar='DIR',
+    help='cache composed templates in DIR, and load them from there when '
+    'they are rendered again'
+)
+parser.add_argument(
+    '--cache-size', metavar='BYTES', type=int, default=64 * 1024 * 1024,
+    help='the size beyond which the least recently used templates are '
+    'removed from the cache (default: %(default)s)'
 )
 
 
-def main():
-    opts = parser.parse_args()
+def expand(patterns):
+    """Expands glob patterns, keeping the paths which aren't patterns as they
+    are, so that missing files are reported.
+    """
+    paths = {}
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if not matches:
+                parser.error(f'no files match {pattern}')
+            paths.update(dict.fromkeys(matches))
+        else:
+            paths[pattern] = None
+    return list(paths)
+
+
+def open_arg(name, path):
+    """Opens a file named by an argument, reporting failures like
+    :class:`argparse.FileType`.
+    """
+    try:
+        return open(path)
+    except OSError as exc:
+        parser.error(f"argument {name}: can't open '{path}': {exc}")
+
+
+def output_path(infile, outdir, pattern, root=None):
+    stem, suffix = os.path.splitext(os.path.basename(infile))
+    name = (pattern or '{name}').format(
+        name=os.path.basename(infile), stem=stem, suffix=suffix,
+        parent=os.path.dirname(infile) or '.'
+    )
+    if outdir is None:
+        return name
+    if root is not None:
+        parent = os.path.dirname(os.path.abspath(infile))
+        name = os.path.join(os.path.relpath(parent, root), name)
+    return os.path.normpath(os.path.join(outdir, name))
+
+
+def output_paths(infiles, outdir, pattern):
+    """Pairs each template file with its output path, keeping the layout of
+    the templates under their common parent directory in `outdir`, so that
+    templates with the same name in different directories don't collide.
+
+    Reports an error if two templates would be rendered to the same file, or
+    a template would be overwritten.
+    """
+    root = None
+    if outdir is not None:
+        root = os.path.commonpath(
+            [os.path.dirname(os.path.abspath(infile)) for infile in infiles])
+    pairs = [
+        (infile, output_path(infile, outdir, pattern, root))
+        for infile in infiles
+    ]
+    templates = {os.path.realpath(infile): infile for infile in infiles}
+    outputs = {}
+    for infile, outfile in pairs:
+        path = os.path.realpath(outfile)
+        if path in templates:
+            parser.error(
+                f'rendering {infile} would overwrite the template '
+                f'{templates[path]}'
+            )
+        elif path in outputs:
+            parser.error(
+                f'{outputs[path]} and {infile} would both be rendered to '
+                f'{outfile}'
+            )
+        outputs[path] = infile
+    return pairs
+
+
+def main_batch(opts):
+    pairs = output_paths(expand(opts.infiles), opts.outdir, opts.pattern)
+    cache = None
+    if opts.cache is not None:
+        cache = GraphCache(opts.cache, opts.cache_size)
+    failed = 0
+    for infile, _, error in render_files(
+        pairs, opts.select, cache, opts.jobs or os.cpu_count()
+    ):
+        if error is not None:
+            failed += 1
+            print(f'{parser.prog}: {infile}: {error}', file=sys.stderr)
+    if failed:
+        print(
+            f'{parser.prog}: {failed} of {len(pairs)} templates failed',
+            file=sys.stderr
+        )
+        return 1
+    return 0
+
+
+def read_contexts(f):
+    """Yields the contexts in a JSON-lines file or a YAML stream."""
+    if os.path.splitext(f.name)[1] in ('.jsonl', '.ndjson'):
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+        yield from yaml.load_all(f, Loader)
+
+
+def main_contexts(opts, infile):
+    tmpl = TemplateSet(infile)
+    with open_arg('--contexts/-c', opts.contexts) as f:
+        results = render_many(
+            tmpl, read_contexts(f), opts.jobs or os.cpu_count())
+        dump_all_rendered(
+            itertools.chain.from_iterable(results), opts.outfile)
+    return 0
+
+
+def main(args=None):
+    opts = parser.parse_args(args)
+    if opts.outdir is not None or opts.pattern is not None:
+        if not opts.infiles or '-' in opts.infiles:
+            parser.error('--outdir and --pattern need template files')
+        elif opts.contexts is not None:
+            parser.error(
+                "--contexts can't be combined with --outdir or --pattern")
+        return main_batch(opts)
+    elif len(opts.infiles) > 1 or any(map(glob.has_magic, opts.infiles)):
+        parser.error('rendering several templates needs --outdir or --pattern')
+    elif opts.contexts is not None and opts.select is not None:
+        parser.error("--contexts can't be combined with --select")
+    if opts.infiles and opts.infiles[0] != '-':
+        infile = open_arg('infile', opts.infiles[0])
+    else:
+        infile = contextlib.nullcontext(sys.stdin)
     ctx = Context()
-    dump_all(render_all(opts.infile, ctx), opts.outfile)
+    with infile as infile:
+        if opts.contexts is not None:
+            return main_contexts(opts, infile)
+        if opts.cache is None:
+            if opts.select is None:
+                render_to_stream(infile, ctx, opts.outfile)
+                return 0
+            tmpl = TemplateSet(infile)
+        else:
+            cache = GraphCache(opts.cache, opts.cache_size)
+            tmpl = TemplateSet(infile, cache=cache)
+            if opts.select is None:
+                tmpl.render_to_stream(ctx, opts.outfile)
+                return 0
+    try:
+        data = list(tmpl.select_all(ctx, opts.select))
+    except PathNotFoundError as exc:
+        parser.exit(1, f'{parser.prog}: path not found: {exc.args[0]}\n')
+    dump_all_rendered(data, opts.outfile)
     return 0
 
 
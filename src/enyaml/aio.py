@@ -0,0 +1,122 @@
+# Copyright (c) 2022, Sadie Hain. All rights reserved.
+# Released under the BSD 3-Clause License
+# https://enyaml.org/LICENSE
+
+"""
+Rendering templates from :mod:`asyncio` code.
+
+:meth:`.TemplateSet.render_all_async` and :meth:`.Template.render_async`
+render templates whose Context holds awaitable values, such as coroutines
+fetching secrets or looking up services. Before rendering, the awaitable values
+which the template may look up (see :func:`~enyaml.nodes.referenced_names`)
+are awaited concurrently, so a template which looks up many of them waits
+about as long as the slowest one, rather than for each in turn. The results
+are rendered with in a new scope pushed onto the Context, so the Context itself
+isn't modified; since a coroutine can only be awaited once, a Context which is
+rendered with more than once should hold tasks or futures instead.
+
+Only the values of names in the Context are awaited up front. An awaitable
+found anywhere else, for example nested in a collection, is rendered as it is.
+
+The template is then rendered in a worker thread (see
+:func:`asyncio.to_thread`), so the event loop isn't blocked. Builtins (see
+:meth:`.BaseTemplateLoader.add_builtin`) may be coroutine functions: when the
+iterable of a :tmpl:tag:`for` node is awaitable, or an asynchronous iterable,
+the render waits while it is awaited (or iterated) on the event loop. Each of
+these waits is a separate round trip, since its arguments may depend on the
+Context at that point in the document.
+"""
+
+__all__ = [
+    'resolve_awaitables',
+]
+
+import asyncio
+import inspect
+import contextvars
+
+#: The event loop the current render was started from, if it was started
+#: with :func:`render_async`.
+render_loop = contextvars.ContextVar('render_loop', default=None)
+
+
+async def resolve_awaitables(ctx, names):
+    """Awaits the awaitable values of names in a Context, concurrently.
+
+    :param Context ctx: The Context to look the names up in.
+    :param iterable names: The names to look up. Names which aren't in the
+       Context are ignored.
+    :return: A :class:`dict` of the results, keyed by name.
+
+    .. testsetup::
+
+       import asyncio
+       from enyaml import Context
+       from enyaml.aio import resolve_awaitables
+
+    >>> async def fetch(value):
+    ...     return value
+    >>> ctx = Context({'a': fetch(1), 'b': 2})
+    >>> asyncio.run(resolve_awaitables(ctx, ['a', 'b', 'c']))
+    {'a': 1}
+    """
+    pending = {}
+    for name in names:
+        value = ctx.get(name)
+        if inspect.isawaitable(value):
+            pending[name] = value
+    if not pending:
+        return {}
+    values = await asyncio.gather(*pending.values())
+    return dict(zip(pending, values))
+
+
+async def collect(iterable):
+    return [item async for item in iterable]
+
+
+async def wait(awaitable):
+    return await awaitable
+
+
+def resolve_iterable(iterable):
+    """Returns the items of an awaitable or asynchronous iterable, awaiting
+    it on the loop the current render was started from. Other iterables are
+    returned as they are.
+
+    :raises TypeError: when the iterable needs to be awaited, but the render
+       wasn't started with :func:`render_async`.
+    """
+    if inspect.isawaitable(iterable):
+        coro = wait
+    elif hasattr(iterable, '__aiter__'):
+        coro = collect
+    else:
+        return iterable
+    loop = render_loop.get()
+    if loop is None:
+        if inspect.iscoroutine(iterable):
+            iterable.close()
+        raise TypeError(
+            'awaitable iterables can only be rendered with render_async')
+    return asyncio.run_coroutine_threadsafe(coro(iterable), loop).result()
+
+
+async def render_async(tmpl, ctx, render):
+    """Renders a template in a worker thread, once the awaitable values in
+    the Context have been awaited.
+
+    :param TemplateSet tmpl: The template to render.
+    :param Context ctx: The Context with which to render.
+    :param callable render: Called with the Context in the worker thread, and
+       returns the result.
+    """
+    resolved = await resolve_awaitables(ctx, tmpl.names)
+    token = render_loop.set(asyncio.get_running_loop())
+    try:
+        def target():
+            with ctx.push(resolved):
+                return render(ctx)
+        return await asyncio.to_thread(target)
+    finally:
+        render_loop.reset(token)
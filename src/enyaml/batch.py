@@ -0,0 +1,210 @@
+# Copyright (c) 2022, Sadie Hain. All rights reserved.
+# Released under the BSD 3-Clause License
+# https://enyaml.org/LICENSE
+
+"""
+Rendering many templates at once.
+
+:func:`render_files` renders template files to output files, optionally
+across a pool of worker processes. The workers are started once, and each
+renders many files, so the cost of starting Python and importing ENYAML is
+only paid once per worker rather than once per file. A file which fails to
+render is reported, and doesn't stop the others from being rendered.
+
+:func:`render_many` renders one template with many Contexts. The template is
+composed once, and sent to each worker once, when it starts.
+"""
+
+__all__ = [
+    'render_file',
+    'render_files',
+    'render_many',
+]
+
+import os
+import itertools
+import collections
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, wait,
+)
+import yaml
+from .util import Context
+from .template import Template, TemplateSet
+from .cache import GraphCache
+from .dumper import RenderedDumper
+
+
+def render_file(infile, outfile, select=None, cache=None):
+    """Renders a template file to an output file.
+
+    :param str infile: The path of the template file.
+    :param str outfile: The path to write the output to. Its directory is
+       created if necessary.
+    :param str select: Only render the value at this path in each document.
+       See :mod:`enyaml.selector`.
+    :param GraphCache cache: A cache of composed templates to use.
+    """
+    with open(infile) as f:
+        tmpl = TemplateSet(f, cache=cache)
+    parent = os.path.dirname(outfile)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    ctx = Context()
+    if select is None:
+        with open(outfile, 'w') as out:
+            tmpl.render_to_stream(ctx, out)
+        return
+    data = list(tmpl.select_all(ctx, select))
+    with open(outfile, 'w') as out:
+        yaml.dump_all(data, out, Dumper=RenderedDumper)
+
+
+def _render_file(job):
+    infile, outfile, select, cache = job
+    if cache is not None:
+        cache = GraphCache(*cache)
+    try:
+        render_file(infile, outfile, select, cache)
+    except Exception as exc:
+        # Exceptions don't all survive pickling, so workers send back the
+        # message.
+        return infile, outfile, f'{type(exc).__name__}: {exc}'
+    return infile, outfile, None
+
+
+def render_files(pairs, select=None, cache=None, jobs=1):
+    """Renders template files to output files.
+
+    :param iterable pairs: Pairs of input and output paths.
+    :param str select: Only render the value at this path in each document.
+    :param GraphCache cache: A cache of composed templates to use.
+    :param int jobs: The number of worker processes to render with. With
+       :const:`1`, the files are rendered in this process.
+    :return: An iterable of ``(infile, outfile, error)`` tuples, in the order
+       of `pairs`, where `error` is a message describing the exception raised
+       while rendering the file, or :const:`None`.
+    """
+    if cache is not None:
+        cache = cache.directory, cache.max_size
+    work = ((infile, outfile, select, cache) for infile, outfile in pairs)
+    if jobs == 1:
+        yield from map(_render_file, work)
+        return
+    with ProcessPoolExecutor(jobs) as pool:
+        yield from pool.map(_render_file, work, chunksize=4)
+
+
+template = None
+
+
+def _set_template(tmpl):
+    global template
+    template = tmpl
+
+
+def _render(tmpl, ctx):
+    if not isinstance(ctx, Context):
+        ctx = Context(ctx)
+    if isinstance(tmpl, Template):
+        return tmpl.render(ctx)
+    return list(tmpl.render_all(ctx))
+
+
+def _render_in_worker(contexts):
+    results = []
+    for ctx in contexts:
+        try:
+            results.append(_render(template, ctx))
+        except Exception as exc:
+            # The results before the failed one are still produced.
+            return results, exc
+    return results, None
+
+
+def _results(future):
+    results, exc = future.result()
+    yield from results
+    if exc is not None:
+        raise exc
+
+
+def render_many(
+    tmpl, contexts, jobs=1, ordered=True, max_pending=None, chunksize=8
+):
+    """Renders a template with each of many Contexts.
+
+    The contexts are read from `contexts` as they are needed, and no more
+    than `max_pending` chunks of them are queued or being rendered at once,
+    so the memory used doesn't grow with the number of contexts.
+
+    :param tmpl: The template, as a :class:`.TemplateSet`, or a stream or
+       string to compose a :class:`.Template` from.
+    :param iterable contexts: The Contexts (or plain mappings) to render
+       with. When rendering in worker processes, their contents are pickled,
+       and :tmpl:tag:`set` nodes don't modify them.
+    :param int jobs: The number of worker processes to render with. With
+       :const:`1`, the template is rendered in this process.
+    :param bool ordered: Whether to produce the results in the order of
+       `contexts`. Otherwise they are produced as they are completed.
+    :param int max_pending: The number of chunks to have queued or being
+       rendered at once. Defaults to twice `jobs`.
+    :param int chunksize: The number of contexts sent to a worker at a time.
+    :return: An iterable of the results, as returned by
+       :meth:`.Template.render` (or a list, as returned by
+       :meth:`.TemplateSet.render_all`). If `ordered` is false, it contains
+       ``(index, result)`` pairs instead, where `index` is the position of
+       the Context in `contexts`. An exception raised while rendering is
+       raised when its result is reached.
+
+    .. testsetup::
+
+       from enyaml.batch import render_many
+
+    >>> contexts = [{'name': 'a'}, {'name': 'b'}]
+    >>> list(render_many('!$f "hello {name}"', contexts))
+    ['hello a', 'hello b']
+    """
+    if not isinstance(tmpl, TemplateSet):
+        tmpl = Template(tmpl)
+    if jobs == 1:
+        for i, ctx in enumerate(contexts):
+            result = _render(tmpl, ctx)
+            yield result if ordered else (i, result)
+        return
+    if max_pending is None:
+        max_pending = 2 * jobs
+    contexts = iter(contexts)
+    with ProcessPoolExecutor(
+        jobs, initializer=_set_template, initargs=(tmpl,)
+    ) as pool:
+        start = 0
+
+        def submit():
+            nonlocal start
+            chunk = [
+                dict(ctx) if isinstance(ctx, Context) else ctx
+                for ctx in itertools.islice(contexts, chunksize)
+            ]
+            if not chunk:
+                return None
+            future = pool.submit(_render_in_worker, chunk)
+            future.start = start
+            start += len(chunk)
+            return future
+
+        pending = collections.deque()
+        while True:
+            while len(pending) < max_pending:
+                future = submit()
+                if future is None:
+                    break
+                pending.append(future)
+            if not pending:
+                return
+            if ordered:
+                yield from _results(pending.popleft())
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                yield from enumerate(_results(future), future.start)
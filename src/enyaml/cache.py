@@ -0,0 +1,386 @@
+# Copyright (c) 2022, Sadie Hain. All rights reserved.
+# Released under the BSD 3-Clause License
+# https://enyaml.org/LICENSE
+
+"""
+Caches of composed templates and rendered results.
+
+Composing a template (reading, scanning, parsing and composing the YAML) is
+usually the most expensive part of rendering it once. A :class:`GraphCache`
+stores the composed node graphs of :class:`~enyaml.template.TemplateSet`
+objects in a directory, so that later processes rendering the same templates
+can load them instead. The graphs are stored with their expressions parsed and
+their :tmpl:tag:`for` headers compiled.
+
+Entries are keyed by a hash of the template source, along with everything
+else that affects how it is composed: the ENYAML and Python versions, the
+loader class and its implicit resolvers, and the name of the stream (which
+appears in error messages). Changing any of them simply misses the cache, so
+nothing needs to be invalidated by hand. Entries which can't be read are
+treated as misses and removed. Once the entries take up more than
+:attr:`~GraphCache.max_size` bytes, the least recently used ones are removed.
+
+Entries are pickled, so a cache directory must only be writable by users who
+are trusted to run code in the processes which read it.
+
+A :class:`ResultCache` memoizes rendering a template with the same Context
+contents, within a process.
+"""
+
+__all__ = [
+    'GraphCache',
+    'ResultCache',
+]
+
+import io
+import os
+import sys
+import copy
+import copyreg
+import hashlib
+import marshal
+import pickle
+import tempfile
+import time
+import types
+from collections.abc import Mapping
+import yaml
+from . import __version__
+from .nodes import referenced_names
+from .util import LRUCache, LazyValue
+
+SUFFIX = '.pickle'
+#: Render globals which give templates access to the whole Context.
+OPAQUE_NAMES = frozenset(('ctx', 'render'))
+
+
+def pickle_code(code):
+    return marshal.loads, (marshal.dumps(code),)
+
+
+def pickle_mark(mark):
+    return yaml.Mark, (
+        mark.name, mark.index, mark.line, mark.column, mark.buffer,
+        mark.pointer,
+    )
+
+
+DISPATCH_TABLE = copyreg.dispatch_table.copy()
+DISPATCH_TABLE[types.CodeType] = pickle_code
+DISPATCH_TABLE[yaml.Mark] = pickle_mark
+
+
+def dump_nodes(nodes):
+    """Pickles composed node graphs, with their expressions, format-strings
+    and :tmpl:tag:`for` headers parsed. The result is loaded with
+    :func:`pickle.loads`.
+
+    :param list nodes: The document nodes.
+    :return: :class:`bytes`.
+    """
+    referenced_names(nodes)
+    f = io.BytesIO()
+    pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = DISPATCH_TABLE
+    pickler.dump(nodes)
+    return f.getvalue()
+
+
+class GraphCache:
+    """Stores composed template documents in a directory.
+
+    :param str directory: The directory to store entries in. It is created if
+       it doesn't exist.
+    :param int max_size: The total size of the entries, in bytes, beyond which
+       the least recently used ones are removed.
+
+    >>> import tempfile
+    >>> from enyaml import TemplateSet
+    >>> from enyaml.cache import GraphCache
+    >>> cache = GraphCache(tempfile.mkdtemp())
+    >>> tmpl = TemplateSet('a: !$ a', cache=cache)
+    >>> tmpl = TemplateSet('a: !$ a', cache=cache)
+    >>> cache.hits, cache.misses
+    (1, 1)
+    """
+
+    def __init__(self, directory, max_size=64 * 1024 * 1024):
+        self.directory = os.fspath(directory)
+        self.max_size = max_size
+        self.hits = self.misses = self.evictions = 0
+
+    def key(self, source, Loader, name=None):
+        """Returns the key of the entry for a template.
+
+        :param source: The template source, as :class:`str` or
+           :class:`bytes`.
+        :param Loader: The loader class the template is composed with.
+        :param str name: The name of the stream the source was read from.
+        :return: A hex digest.
+        """
+        h = hashlib.sha256()
+        resolvers = sorted(
+            (first, tag, regexp.pattern)
+            for first, resolvers in Loader.yaml_implicit_resolvers.items()
+            for tag, regexp in resolvers
+        )
+        for part in (
+            __version__, sys.implementation.cache_tag,
+            f'{Loader.__module__}.{Loader.__qualname__}',
+            repr(resolvers), repr(Loader.yaml_path_resolvers),
+            repr(name), type(source).__name__,
+        ):
+            h.update(part.encode('utf-8', 'surrogatepass'))
+            h.update(b'\0')
+        if isinstance(source, str):
+            source = source.encode('utf-8', 'surrogatepass')
+        h.update(source)
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, key):
+        """Loads the composed documents stored under `key`.
+
+        :return: A list of document nodes, or :const:`None` if there is no
+           usable entry.
+        """
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                nodes = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            self.misses += 1
+            self.remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return nodes
+
+    def put(self, key, nodes):
+        """Stores composed documents under `key`, evicting old entries if the
+        cache has grown too large. Documents which can't be pickled aren't
+        stored.
+
+        :param list nodes: The document nodes.
+        """
+        try:
+            data = dump_nodes(nodes)
+        except (pickle.PicklingError, TypeError, AttributeError,
+                RecursionError):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(SUFFIX + '.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                out.write(data)
+            os.replace(tmp, self.path(key))
+        except BaseException:
+            self.remove(tmp)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the total size is no
+        more than :attr:`max_size`.
+        """
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.name.endswith(SUFFIX):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, entry.path, st.st_size))
+                    total += st.st_size
+        except FileNotFoundError:
+            return
+        entries.sort()
+        for _, path, size in entries:
+            if total <= self.max_size:
+                break
+            if self.remove(path):
+                self.evictions += 1
+            total -= size
+
+    def clear(self):
+        """Removes all the entries."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name.endswith(SUFFIX):
+                self.remove(os.path.join(self.directory, name))
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            return False
+        return True
+
+
+class ResultCache:
+    """Memoizes rendering templates.
+
+    Results are keyed by the template and a fingerprint of the values in the
+    Context of the names the template may look up (see
+    :func:`~enyaml.nodes.referenced_names`). A
+    :class:`~enyaml.template.TemplateSet` is composed once and doesn't change,
+    so the object itself stands for its source in the key. Templates which
+    use the ``ctx`` or ``render`` globals, or look up template nodes, may read
+    any name, so the whole Context is fingerprinted for them (and not cached
+    if it holds uncomputed :class:`~enyaml.util.LazyValue` objects).
+
+    The fingerprint of the Context is built from the fingerprints of its
+    values: :class:`dict`, :class:`list`, :class:`tuple` and :class:`set`
+    objects are fingerprinted by their contents, and other values by
+    themselves, along with their type. Values which aren't hashable are passed
+    to `hash_value`. Values which are hashable are assumed not to change while
+    they are cached; ones which are hashed by identity, but rendered by value,
+    must not be modified once they have been rendered with.
+
+    Templates which reference builtins added with ``deterministic=False`` (see
+    :meth:`.BaseTemplateLoader.add_builtin`) are rendered without caching, as
+    are Contexts which can't be fingerprinted. Templates are rendered in a new
+    scope pushed onto the Context, so that :tmpl:tag:`set` nodes don't modify
+    it on either a hit or a miss. Each call returns its own copy of the result.
+
+    :param int maxsize: The maximum number of results to keep.
+    :param float ttl: The number of seconds after which results expire.
+    :param callable hash_value: Called with values which aren't hashable, and
+       returns a hashable fingerprint of them, or raises :exc:`TypeError` if
+       the Context shouldn't be cached.
+    :param callable clock: Returns the current time in seconds, for `ttl`.
+
+    >>> from enyaml import Context, Template
+    >>> from enyaml.cache import ResultCache
+    >>> cache = ResultCache()
+    >>> tmpl = Template('a: !$ a')
+    >>> cache.render(tmpl, Context({'a': [1]}))
+    {'a': [1]}
+    >>> cache.render(tmpl, Context({'a': [1]}))
+    {'a': [1]}
+    >>> cache.info()
+    CacheInfo(hits=1, misses=1, evictions=0, maxsize=128, currsize=1)
+    """
+
+    def __init__(
+        self, maxsize=128, ttl=None, hash_value=None, clock=time.monotonic
+    ):
+        self.hash_value = hash_value
+        self.results = LRUCache(maxsize, ttl, clock)
+        #: The number of renders which weren't cached.
+        self.uncached = 0
+
+    def fingerprint(self, value):
+        """Returns a hashable fingerprint of a value.
+
+        :raises TypeError: when the value can't be fingerprinted.
+        """
+        if isinstance(value, Mapping):
+            return type(value), tuple(
+                (self.fingerprint(key), self.fingerprint(item))
+                for key, item in value.items()
+            )
+        elif isinstance(value, (list, tuple)):
+            return type(value), tuple(map(self.fingerprint, value))
+        elif isinstance(value, (set, frozenset)):
+            return type(value), frozenset(map(self.fingerprint, value))
+        try:
+            hash(value)
+        except TypeError:
+            if self.hash_value is None:
+                raise
+            return type(value), self.hash_value(value)
+        return type(value), value
+
+    def cacheable(self, tmpl):
+        """Whether the results of rendering `tmpl` can be cached."""
+        return not tmpl.Loader.NONDETERMINISTIC & tmpl.names
+
+    def key(self, tmpl, ctx, method):
+        """Returns the key of the result of rendering `tmpl` with `ctx`, or
+        :const:`None` if it shouldn't be cached.
+
+        Only the values of the names which `tmpl` may look up are
+        fingerprinted, so :class:`~enyaml.util.LazyValue` objects it doesn't
+        reference aren't computed.
+        """
+        if not self.cacheable(tmpl):
+            return None
+        names = tmpl.names
+        try:
+            values = [(name, ctx[name]) for name in names if name in ctx]
+            if OPAQUE_NAMES & names or any(
+                isinstance(value, yaml.Node) for _, value in values
+            ):
+                # The template can look up names which can't be known in
+                # advance, so the whole Context is fingerprinted, unless that
+                # would compute its lazy values.
+                if any(
+                    type(value) is LazyValue
+                    for mapping in ctx.maps for value in mapping.values()
+                ):
+                    return None
+                values = ctx.items()
+            return tmpl, method, frozenset(
+                (name, self.fingerprint(value)) for name, value in values)
+        except (TypeError, RecursionError):
+            return None
+
+    def _render(self, tmpl, ctx, method, render):
+        key = self.key(tmpl, ctx, method)
+        with ctx.push():
+            if key is None:
+                self.uncached += 1
+                return render(ctx)
+            result = self.results.get_or_create(key, lambda key: render(ctx))
+        return copy.deepcopy(result)
+
+    def render(self, tmpl, ctx):
+        """Renders a single-document template, or returns a copy of the
+        cached result.
+
+        :param Template tmpl: The template to render.
+        :param Context ctx: The Context with which to render.
+        :return: The rendered data.
+        """
+        return self._render(tmpl, ctx, 'render', tmpl.render)
+
+    def render_all(self, tmpl, ctx):
+        """Renders template documents, or returns a copy of the cached
+        result.
+
+        :param TemplateSet tmpl: The templates to render.
+        :param Context ctx: The Context with which to render.
+        :return: A list of rendered data.
+        """
+        return self._render(
+            tmpl, ctx, 'render_all', lambda ctx: list(tmpl.render_all(ctx)))
+
+    def info(self):
+        """Reports cache statistics.
+
+        :return: A :class:`~enyaml.util.CacheInfo` named tuple of ``hits``,
+           ``misses``, ``evictions``, ``maxsize`` and ``currsize``.
+        """
+        return self.results.info()
+
+    def clear(self):
+        """Discards all the results and resets the statistics."""
+        self.results.clear()
+        self.uncached = 0
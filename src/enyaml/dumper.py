@@ -4,11 +4,17 @@
 
 __all__ = [
     'TemplateDumper',
+    'RenderedDumper',
 ]
 
 import yaml
 from . import nodes
 
+try:
+    from yaml import CSafeDumper as RenderedDumperBase
+except ImportError:
+    from yaml import SafeDumper as RenderedDumperBase
+
 
 class TemplateDumper(yaml.SafeDumper):
     """Dumps un-rendered ENYAML templates."""
@@ -46,6 +52,20 @@ class TemplateDumper(yaml.SafeDumper):
         return super().prepare_tag(tag)
 
 
+class RenderedDumper(RenderedDumperBase):
+    """Dumps rendered ENYAML output.
+
+    Rendered documents contain only plain data, with no template tags, so they
+    are emitted by libyaml when it is available (falling back to
+    :class:`yaml.SafeDumper`).
+    """
+
+    @classmethod
+    def add_implicit_resolver(cls, tag, regexp, first):
+        super().add_implicit_resolver(tag, regexp, first)
+        nodes.resolve_cache.clear()
+
+
 for name in nodes.__all__:
     obj = getattr(nodes, name)
     if hasattr(obj, 'to_yaml'):
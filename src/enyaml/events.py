@@ -0,0 +1,355 @@
+# Copyright (c) 2022, Sadie Hain. All rights reserved.
+# Released under the BSD 3-Clause License
+# https://enyaml.org/LICENSE
+
+__all__ = [
+    'EventRenderer',
+]
+
+import io
+from operator import itemgetter
+import yaml
+from yaml.constructor import ConstructorError
+from .nodes import (
+    SEQUENCE_TAG, MAPPING_TAG, ForNode, ForResult, MappingTemplateNode,
+    SequenceTemplateNode, maybe_render, resolve_scalar,
+)
+
+
+def is_for_loop(node):
+    """Whether `node` is a mapping with a :tmpl:tag:`for` key."""
+    return (
+        type(node) is MappingTemplateNode and '~' not in node.flags
+        and len(node.value) == 1 and isinstance(node.value[0][0], ForNode)
+    )
+
+
+def is_streamable(node):
+    """Whether `node` always renders to a collection, which can be
+    serialized as it is rendered.
+
+    Mappings are only streamed when they contain no :tmpl:tag:`set` nodes,
+    since their values may be rendered after the keys which follow them.
+    """
+    if type(node) is SequenceTemplateNode:
+        return (
+            '~' not in node.flags and not node.static
+            and node.subtag in (None, SEQUENCE_TAG)
+        )
+    elif type(node) is MappingTemplateNode:
+        return is_for_loop(node) or (
+            '~' not in node.flags and not node.static
+            and node.subtag in (None, MAPPING_TAG)
+            and not node.has_merges and not node.has_setters
+            and not any(isinstance(key, ForNode) for key, _ in node.value)
+        )
+    return False
+
+
+class EventRenderer:
+    """Renders template documents straight to serialization events.
+
+    The rendered nodes are serialized as they are, without first being
+    constructed into Python objects and represented back into nodes. Mapping
+    keys are constructed though, in order to apply merges, drop duplicate keys
+    and sort them (when the dumper sorts keys), so that the output loads the
+    same as the output of dumping the rendered data.
+
+    Sequences, mappings and :tmpl:tag:`for` loops are serialized as they are
+    rendered, rather than being rendered whole first, and the items of a loop
+    are rendered one at a time. So only the item being rendered is held in
+    memory, however many items the loop produces.
+
+    :param loader: The loader to render with.
+    :param dumper: The dumper whose resolver, representer and options are used.
+       Scalars which rendered to values other than strings are represented
+       with it.
+    :param str encoding: Passed on to :class:`yaml.StreamStartEvent`.
+    :param bool explicit_start: Passed on to :class:`yaml.DocumentStartEvent`.
+    :param bool explicit_end: Passed on to :class:`yaml.DocumentEndEvent`.
+    :param tuple version: Passed on to :class:`yaml.DocumentStartEvent`.
+    :param dict tags: Passed on to :class:`yaml.DocumentStartEvent`.
+    """
+
+    def __init__(
+        self, loader, dumper, encoding=None, explicit_start=None,
+        explicit_end=None, version=None, tags=None
+    ):
+        self.loader = loader
+        self.dumper = dumper
+        self.encoding = encoding
+        self.explicit_start = explicit_start
+        self.explicit_end = explicit_end
+        self.version = version
+        self.tags = tags
+        self.resolve = dumper.resolve
+        self.stats = getattr(loader, 'stats', None)
+        self.style = dumper.default_style
+        self.default_flow_style = dumper.default_flow_style
+
+    def render_stream(self, nodes, ctx, emit=None):
+        """Renders a stream of template documents.
+
+        :param iterable nodes: The composed document nodes.
+        :param Context ctx: The Context with which to render.
+        :param callable emit: Called with each event, in order. If not given,
+           the events are returned instead.
+        :return: An iterable of events, if `emit` is not given. Only documents
+           which produce output when rendered are included.
+        """
+        if emit is None:
+            return self._iter_stream(nodes, ctx)
+        for events in self.batches(nodes, ctx):
+            for event in events:
+                emit(event)
+
+    def _iter_stream(self, nodes, ctx):
+        for events in self.batches(nodes, ctx):
+            yield from events
+
+    def batches(self, nodes, ctx):
+        """Renders a stream of template documents, yielding the events in
+        batches as they are produced.
+
+        While a batch is being handled, the variables of any enclosing
+        :tmpl:tag:`for` loops are pushed onto `ctx`.
+
+        :param iterable nodes: The composed document nodes.
+        :param Context ctx: The Context with which to render.
+        :return: An iterable of lists of events.
+        """
+        yield [yaml.StreamStartEvent(encoding=self.encoding)]
+        for node in nodes:
+            if is_streamable(node):
+                yield [self.document_start()]
+                try:
+                    yield from self.stream(node, ctx)
+                finally:
+                    self.reset()
+                yield [self.document_end()]
+                continue
+            node = self.loader.render_node(node, ctx)
+            if node:
+                events = []
+                self.document(node, events.append)
+                yield events
+        yield [yaml.StreamEndEvent()]
+
+    def document(self, node, emit):
+        """Serializes a rendered document node."""
+        emit(self.document_start())
+        try:
+            self.node(node, emit)
+        finally:
+            self.reset()
+        emit(self.document_end())
+
+    def document_start(self):
+        return yaml.DocumentStartEvent(
+            explicit=self.explicit_start, version=self.version,
+            tags=self.tags
+        )
+
+    def document_end(self):
+        return yaml.DocumentEndEvent(explicit=self.explicit_end)
+
+    def reset(self):
+        self.loader.constructed_objects = {}
+        self.loader.recursive_objects = {}
+
+    def stream(self, node, ctx):
+        """Renders a template node for which :func:`is_streamable` is true,
+        yielding the events in batches.
+        """
+        if isinstance(node, SequenceTemplateNode):
+            yield from self.stream_sequence(node, ctx)
+        elif is_for_loop(node):
+            key, body = node.value[0]
+            yield [self.start(
+                yaml.SequenceStartEvent, yaml.SequenceNode,
+                key.subtag or SEQUENCE_TAG, None
+            )]
+            yield from self.stream_items(key, body, ctx)
+            yield [yaml.SequenceEndEvent()]
+        else:
+            yield from self.stream_mapping(node, ctx)
+
+    def stream_sequence(self, node, ctx):
+        events = [self.start(
+            yaml.SequenceStartEvent, yaml.SequenceNode,
+            SEQUENCE_TAG, node.flow_style
+        )]
+        for item in node.value:
+            if is_for_loop(item):
+                yield events
+                events = []
+                yield from self.stream_items(*item.value[0], ctx)
+            elif is_streamable(item):
+                yield events
+                events = []
+                yield from self.stream(item, ctx)
+            else:
+                self.rendered(item, ctx, events.append, splice=True)
+        events.append(yaml.SequenceEndEvent())
+        yield events
+
+    def stream_mapping(self, node, ctx):
+        loader = self.loader
+        pairs = []
+        for key, value in node.value:
+            key = maybe_render(key, loader, ctx)
+            deferred = is_streamable(value)
+            if not deferred:
+                value = maybe_render(value, loader, ctx)
+            if None not in (key, value):
+                pairs.append((key, (value, deferred)))
+        events = [self.start(
+            yaml.MappingStartEvent, yaml.MappingNode,
+            MAPPING_TAG, node.flow_style
+        )]
+        for key, (value, deferred) in self.unique_items(
+            pairs, node.start_mark
+        ):
+            self.node(key, events.append)
+            if deferred:
+                yield events
+                events = []
+                yield from self.stream(value, ctx)
+            else:
+                self.node(value, events.append)
+        events.append(yaml.MappingEndEvent())
+        yield events
+
+    def stream_items(self, for_node, body, ctx):
+        """Renders the items of a :tmpl:tag:`for` loop one at a time,
+        yielding the events of each item in batches.
+        """
+        loader = self.loader
+        streamable = is_streamable(body)
+        for scope in for_node.scopes(loader, ctx):
+            with ctx.push(scope):
+                if streamable:
+                    yield from self.stream(body, ctx)
+                else:
+                    events = []
+                    self.rendered(body, ctx, events.append)
+                    yield events
+            loader.constructed_objects = {}
+
+    def rendered(self, node, ctx, emit, splice=False):
+        """Renders a template node whole, and serializes the result.
+
+        :param bool splice: Whether the items of a :tmpl:tag:`for` loop
+           should be serialized in place, as in a sequence.
+        """
+        node = maybe_render(node, self.loader, ctx)
+        if node is None:
+            return
+        if splice and isinstance(node, ForResult):
+            for item in node.value:
+                self.node(item, emit)
+        else:
+            self.node(node, emit)
+
+    def node(self, node, emit):
+        """Serializes a rendered node."""
+        if isinstance(node, yaml.ScalarNode):
+            self.scalar(node, emit)
+        elif isinstance(node, yaml.SequenceNode):
+            emit(self.start(
+                yaml.SequenceStartEvent, yaml.SequenceNode,
+                node.tag, node.flow_style
+            ))
+            for item in node.value:
+                self.node(item, emit)
+            emit(yaml.SequenceEndEvent())
+        else:
+            emit(self.start(
+                yaml.MappingStartEvent, yaml.MappingNode,
+                node.tag, node.flow_style
+            ))
+            for key, value in self.mapping_items(node):
+                self.node(key, emit)
+                self.node(value, emit)
+            emit(yaml.MappingEndEvent())
+
+    def scalar(self, node, emit):
+        value = node.value
+        if not isinstance(value, str):
+            self.node(self.represent(value), emit)
+            return
+        implicit = (
+            node.tag == resolve_scalar(
+                self.dumper, value, (True, False), self.stats),
+            node.tag == self.resolve(yaml.ScalarNode, value, (False, True)),
+        )
+        emit(yaml.ScalarEvent(None, node.tag, implicit, value, self.style))
+
+    def represent(self, value):
+        dumper = self.dumper
+        try:
+            return dumper.represent_data(value)
+        finally:
+            dumper.represented_objects = {}
+            dumper.object_keeper = []
+            dumper.alias_key = None
+
+    def start(self, event_class, kind, tag, flow_style):
+        implicit = tag == self.resolve(kind, None, True)
+        if self.default_flow_style is not None:
+            flow_style = self.default_flow_style
+        return event_class(None, tag, implicit, flow_style=flow_style)
+
+    def mapping_items(self, node):
+        self.loader.flatten_mapping(node)
+        return self.unique_items(node.value, node.start_mark)
+
+    def unique_items(self, pairs, mark):
+        """Drops the pairs with duplicate keys, keeping the last, and sorts
+        them by key when the dumper sorts keys.
+
+        :param list pairs: Pairs of rendered key nodes and values.
+        :param mark: The start mark of the mapping, for errors.
+        """
+        items = {}
+        for key_node, value in pairs:
+            key = self.loader.construct_object(key_node, deep=True)
+            try:
+                items[key] = key_node, value
+            except TypeError as exc:
+                raise ConstructorError(
+                    'while constructing a mapping', mark,
+                    f'found unhashable key ({exc})', key_node.start_mark
+                )
+        items = list(items.items())
+        if self.dumper.sort_keys:
+            try:
+                items.sort(key=itemgetter(0))
+            except TypeError:
+                pass
+        return [pair for _, pair in items]
+
+
+def emit_rendered(loader, nodes, ctx, out, Dumper, **kwds):
+    """Renders template documents, emitting them to `out`.
+
+    :return: The output as a :class:`str` or :class:`bytes`, if `out` is
+       :const:`None`.
+    """
+    getvalue = None
+    if out is None:
+        out = io.StringIO() if kwds.get('encoding') is None else io.BytesIO()
+        getvalue = out.getvalue
+    dumper = Dumper(out, **kwds)
+    try:
+        renderer = EventRenderer(loader, dumper, **{
+            name: kwds[name] for name in (
+                'encoding', 'explicit_start', 'explicit_end',
+                'version', 'tags',
+            ) if name in kwds
+        })
+        renderer.render_stream(nodes, ctx, dumper.emit)
+    finally:
+        dumper.dispose()
+    if getvalue is not None:
+        return getvalue()
@@ -1,3 +1,4 @@
+import operator
 from .lexer import OpToken, IdentifierToken, NumberToken, StringToken
 
 
@@ -30,6 +31,62 @@ class Expression:
         elif isinstance(self.value, Expression):
             return self.value.evaluate(ctx)
 
+    def compile(self):
+        """Compiles the expression to a function of a context.
+
+        Literals are converted once, up front, and the returned function
+        doesn't walk the expression tree.
+        """
+        if isinstance(self.value, IdentifierToken):
+            name = self.value.value
+            return lambda ctx: ctx[name]
+        elif isinstance(self.value, Expression):
+            return self.value.compile()
+        value = self.evaluate(None)
+        return lambda ctx: value
+
+    def names(self):
+        """Yields the identifiers the expression looks up in its context."""
+        if isinstance(self.value, IdentifierToken):
+            yield self.value.value
+        elif isinstance(self.value, Expression):
+            yield from self.value.names()
+
+    def optimize(self):
+        """Returns an equivalent expression with constant subexpressions
+        folded.
+
+        Subexpressions which don't reference any identifiers are evaluated
+        once, here, and replaced by a :class:`ConstantExpression`. If
+        evaluating one raises an exception, it is left alone so that the error
+        is raised when the expression is evaluated.
+        """
+        if isinstance(self.value, (NumberToken, StringToken)):
+            return ConstantExpression(self.evaluate(None))
+        elif isinstance(self.value, Expression):
+            return self.value.optimize()
+        return self
+
+
+class ConstantExpression(Expression):
+    """An expression with a precomputed value."""
+
+    def __str__(self):
+        return repr(self.value)
+
+    def evaluate(self, ctx):
+        return self.value
+
+    def compile(self):
+        value = self.value
+        return lambda ctx: value
+
+    def names(self):
+        return iter(())
+
+    def optimize(self):
+        return self
+
 
 class OpExpression(Expression):
     @classmethod
@@ -41,6 +98,31 @@ class OpExpression(Expression):
         operands = ', '.join(repr(op) for op in self.operands())
         return f'{self.__class__.__name__}({operands})'
 
+    def compile(self):
+        op = self.op
+        operands = [operand.compile() for operand in self.operands()]
+        if len(operands) == 1:
+            rhs, = operands
+            return lambda ctx: op(rhs(ctx))
+        lhs, rhs = operands
+        return lambda ctx: op(lhs(ctx), rhs(ctx))
+
+    def names(self):
+        for operand in self.operands():
+            yield from operand.names()
+
+    def optimize(self):
+        expr = type(self)(*(operand.optimize() for operand in self.operands()))
+        if all(
+            isinstance(operand, ConstantExpression)
+            for operand in expr.operands()
+        ):
+            try:
+                return ConstantExpression(expr.evaluate(None))
+            except Exception:
+                pass
+        return expr
+
 
 class UnaryOpExpression(OpExpression):
     def __init__(self, rhs=None):
@@ -106,11 +188,19 @@ class DotExpression(BinaryOpExpression):
         return f'({self.lhs}.{self.rhs})'
 
     def evaluate(self, ctx):
-        return self.lhs.evaluate(ctx)[self.rhs.value]
+        return self.lhs.evaluate(ctx)[self.rhs.value.value]
+
+    def compile(self):
+        lhs, name = self.lhs.compile(), self.rhs.value.value
+        return lambda ctx: lhs(ctx)[name]
+
+    def names(self):
+        return self.lhs.names()
 
 
 class PowExpression(BinaryOpExpression):
     precedence = 10
+    op = operator.pow
 
     def __str__(self):
         return f'({self.lhs} ^ {self.rhs})'
@@ -121,6 +211,7 @@ class PowExpression(BinaryOpExpression):
 
 class PosExpression(UnaryOpExpression):
     precedence = 9
+    op = operator.pos
 
     def __str__(self):
         return f'(+{self.rhs})'
@@ -131,6 +222,7 @@ class PosExpression(UnaryOpExpression):
 
 class NegExpression(UnaryOpExpression):
     precedence = 9
+    op = operator.neg
 
     def __str__(self):
         return f'(-{self.rhs})'
@@ -141,6 +233,7 @@ class NegExpression(UnaryOpExpression):
 
 class MultExpression(BinaryOpExpression):
     precedence = 8
+    op = operator.mul
 
     def __str__(self):
         return f'({self.lhs} * {self.rhs})'
@@ -151,6 +244,7 @@ class MultExpression(BinaryOpExpression):
 
 class DivExpression(BinaryOpExpression):
     precedence = 8
+    op = operator.truediv
 
     def __str__(self):
         return f'({self.lhs} / {self.rhs})'
@@ -161,6 +255,7 @@ class DivExpression(BinaryOpExpression):
 
 class FloorDivExpression(BinaryOpExpression):
     precedence = 8
+    op = operator.floordiv
 
     def __str__(self):
         return f'({self.lhs} // {self.rhs})'
@@ -171,6 +266,7 @@ class FloorDivExpression(BinaryOpExpression):
 
 class ModExpression(BinaryOpExpression):
     precedence = 8
+    op = operator.mod
 
     def __str__(self):
         return f'({self.lhs} % {self.rhs})'
@@ -181,6 +277,7 @@ class ModExpression(BinaryOpExpression):
 
 class AddExpression(BinaryOpExpression):
     precedence = 7
+    op = operator.add
 
     def __str__(self):
         return f'({self.lhs} + {self.rhs})'
@@ -191,6 +288,7 @@ class AddExpression(BinaryOpExpression):
 
 class SubtractExpression(BinaryOpExpression):
     precedence = 7
+    op = operator.sub
 
     def __str__(self):
         return f'({self.lhs} - {self.rhs})'
@@ -201,6 +299,7 @@ class SubtractExpression(BinaryOpExpression):
 
 class LtExpression(BinaryOpExpression):
     precedence = 6
+    op = operator.lt
 
     def __str__(self):
         return f'({self.lhs} < {self.rhs})'
@@ -211,6 +310,7 @@ class LtExpression(BinaryOpExpression):
 
 class GtExpression(BinaryOpExpression):
     precedence = 6
+    op = operator.gt
 
     def __str__(self):
         return f'({self.lhs} > {self.rhs})'
@@ -221,6 +321,7 @@ class GtExpression(BinaryOpExpression):
 
 class LeExpression(BinaryOpExpression):
     precedence = 6
+    op = operator.le
 
     def __str__(self):
         return f'({self.lhs} <= {self.rhs})'
@@ -231,6 +332,7 @@ class LeExpression(BinaryOpExpression):
 
 class GeExpression(BinaryOpExpression):
     precedence = 6
+    op = operator.ge
 
     def __str__(self):
         return f'({self.lhs} >= {self.rhs})'
@@ -241,6 +343,7 @@ class GeExpression(BinaryOpExpression):
 
 class EqExpression(BinaryOpExpression):
     precedence = 6
+    op = operator.eq
 
     def __str__(self):
         return f'({self.lhs} == {self.rhs})'
@@ -251,6 +354,7 @@ class EqExpression(BinaryOpExpression):
 
 class NeExpression(BinaryOpExpression):
     precedence = 6
+    op = operator.ne
 
     def __str__(self):
         return f'({self.lhs} != {self.rhs})'
@@ -268,6 +372,10 @@ class InExpression(BinaryOpExpression):
     def evaluate(self, ctx):
         return self.lhs.evaluate(ctx) in self.rhs.evaluate(ctx)
 
+    def compile(self):
+        lhs, rhs = self.lhs.compile(), self.rhs.compile()
+        return lambda ctx: lhs(ctx) in rhs(ctx)
+
 
 class NotInExpression(BinaryOpExpression):
     precedence = 6
@@ -278,9 +386,14 @@ class NotInExpression(BinaryOpExpression):
     def evaluate(self, ctx):
         return self.lhs.evaluate(ctx) not in self.rhs.evaluate(ctx)
 
+    def compile(self):
+        lhs, rhs = self.lhs.compile(), self.rhs.compile()
+        return lambda ctx: lhs(ctx) not in rhs(ctx)
+
 
 class NotExpression(UnaryOpExpression):
     precedence = 5
+    op = operator.not_
 
     def __str__(self):
         return f'(not {self.rhs})'
@@ -298,6 +411,16 @@ class AndExpression(BinaryOpExpression):
     def evaluate(self, ctx):
         return self.lhs.evaluate(ctx) and self.rhs.evaluate(ctx)
 
+    def compile(self):
+        lhs, rhs = self.lhs.compile(), self.rhs.compile()
+        return lambda ctx: lhs(ctx) and rhs(ctx)
+
+    def optimize(self):
+        lhs = self.lhs.optimize()
+        if isinstance(lhs, ConstantExpression):
+            return self.rhs.optimize() if lhs.value else lhs
+        return type(self)(lhs, self.rhs.optimize())
+
 
 class OrExpression(BinaryOpExpression):
     precedence = 3
@@ -308,6 +431,16 @@ class OrExpression(BinaryOpExpression):
     def evaluate(self, ctx):
         return self.lhs.evaluate(ctx) or self.rhs.evaluate(ctx)
 
+    def compile(self):
+        lhs, rhs = self.lhs.compile(), self.rhs.compile()
+        return lambda ctx: lhs(ctx) or rhs(ctx)
+
+    def optimize(self):
+        lhs = self.lhs.optimize()
+        if isinstance(lhs, ConstantExpression):
+            return lhs if lhs.value else self.rhs.optimize()
+        return type(self)(lhs, self.rhs.optimize())
+
 
 class IfExpression(TernaryOpExpression):
     precedence = 1
@@ -323,6 +456,16 @@ class IfExpression(TernaryOpExpression):
             else self.rhs.evaluate(ctx)
         )
 
+    def compile(self):
+        lhs, middle, rhs = (op.compile() for op in self.operands())
+        return lambda ctx: lhs(ctx) if middle(ctx) else rhs(ctx)
+
+    def optimize(self):
+        middle = self.middle.optimize()
+        if isinstance(middle, ConstantExpression):
+            return (self.lhs if middle.value else self.rhs).optimize()
+        return type(self)(self.lhs.optimize(), middle, self.rhs.optimize())
+
 
 class AssignExpression(BinaryOpExpression):
     precedence = 0
@@ -333,6 +476,11 @@ class AssignExpression(BinaryOpExpression):
     def evaluate(self, ctx):
         raise NotImplementedError()
 
+    def compile(self):
+        def assign(ctx):
+            raise NotImplementedError()
+        return assign
+
 
 UnaryOpExpression._cls_map = {
     '+': PosExpression,
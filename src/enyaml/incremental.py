@@ -0,0 +1,438 @@
+# Copyright (c) 2022, Sadie Hain. All rights reserved.
+# Released under the BSD 3-Clause License
+# https://enyaml.org/LICENSE
+
+"""
+Re-rendering templates incrementally.
+
+An :class:`IncrementalRenderer` renders a template while recording which
+Context keys each part of the output read. After keys in the Context have
+changed, :meth:`~IncrementalRenderer.rerender` renders again only the parts
+which read them, and splices the new values into a copy of the previous
+result. Collections along the way to a re-rendered part are rebuilt; all the
+other data is shared with the previous result.
+
+The output is divided into parts the same way as for :mod:`enyaml.lazy`: the
+items of sequences, mappings and :tmpl:tag:`for` loops, and the node chosen by
+an :tmpl:tag:`if` node, each record their own reads, while nodes which can't
+be divided (such as those with tags other than the default ones) are
+re-rendered whole. A document containing :tmpl:tag:`set` nodes isn't divided
+either, as later parts of it may depend on the order in which it was rendered.
+When it is re-rendered, the keys it sets are treated as changed for the
+documents which follow it; when it isn't, the values it set are restored
+without rendering it.
+
+Parts which reference builtins added with ``deterministic=False`` (see
+:meth:`.BaseTemplateLoader.add_builtin`) are re-rendered every time. Values in
+the Context which are modified in place must be passed to
+:meth:`~IncrementalRenderer.rerender` as changed, just like the keys which are
+set to new values.
+
+.. testsetup::
+
+   from enyaml import Context, Template
+   from enyaml.incremental import IncrementalRenderer
+
+>>> ctx = Context({'name': 'api', 'port': 80})
+>>> renderer = IncrementalRenderer(
+...     Template('{name: !$ name, url: !$f "http://host:{port}"}'), ctx)
+>>> renderer.render()
+{'name': 'api', 'url': 'http://host:80'}
+>>> ctx['port'] = 8080
+>>> renderer.rerender({'port'})
+{'name': 'api', 'url': 'http://host:8080'}
+>>> renderer.rerendered, renderer.reused
+(1, 4)
+"""
+
+__all__ = [
+    'TrackingContext',
+    'IncrementalRenderer',
+]
+
+import collections.abc
+from yaml.composer import ComposerError
+from yaml.constructor import ConstructorError
+from .nodes import (
+    NOTHING, ForItems, IfNode, MappingTemplateNode, SequenceTemplateNode,
+    as_data, maybe_render_object,
+)
+from .lazy import is_for_loop, is_lazy, may_set
+from .template import Template
+from .util import Context
+
+
+class TrackingContext(Context):
+    """A Context which records the keys looked up and set through it.
+
+    .. attribute:: reads
+
+       The keys which have been looked up (or tested for), whether or not
+       they were found.
+
+    .. attribute:: writes
+
+       The keys which have been set.
+    """
+
+    def __init__(self, *maps):
+        super().__init__(*maps)
+        self.reads = set()
+        self.writes = set()
+
+    def __getitem__(self, key):
+        self.reads.add(key)
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        self.reads.add(key)
+        return super().__contains__(key)
+
+    def get(self, key, default=None):
+        self.reads.add(key)
+        return super().get(key, default)
+
+    def __setitem__(self, key, value):
+        self.writes.add(key)
+        super().__setitem__(key, value)
+
+
+class Part:
+    """A part of the output, the keys it read itself, and the keys read by
+    it and all the parts within it.
+    """
+    __slots__ = ('node', 'reads', 'deps', 'value')
+
+    def __init__(self, node):
+        self.node = node
+        self.reads = self.deps = frozenset()
+        self.value = NOTHING
+
+
+class Leaf(Part):
+    """A part which is rendered whole. `saved` holds the values it set in the
+    document's scope.
+    """
+    __slots__ = ('saved',)
+
+
+class Choice(Part):
+    """An :tmpl:tag:`if` node, which reads the keys of its tests."""
+    __slots__ = ('child',)
+
+
+class Loop(Part):
+    """A :tmpl:tag:`for` loop, which reads the keys of its iterable."""
+    __slots__ = ('scopes', 'bodies')
+
+
+class SequencePart(Part):
+    __slots__ = ('items',)
+
+
+class MappingPart(Part):
+    __slots__ = ('items',)
+
+
+class IncrementalRenderer:
+    """Renders a template, and re-renders the parts of it which read changed
+    Context keys.
+
+    The renderer looks keys up in the scopes of `ctx`, so changes made to it
+    after rendering are seen when re-rendering. The templates are rendered in
+    a new scope, so :tmpl:tag:`set` nodes don't modify `ctx`.
+
+    :param TemplateSet tmpl: The templates to render. If it is a
+       :class:`.Template`, the results are single documents, as for
+       :meth:`.Template.render`; otherwise they are lists of documents, as for
+       :meth:`.TemplateSet.render_all`.
+    :param Context ctx: The Context with which to render.
+
+    .. attribute:: rerendered
+
+       The number of parts which were rendered by the last call.
+
+    .. attribute:: reused
+
+       The number of parts whose previous values were reused by the last call.
+    """
+
+    def __init__(self, tmpl, ctx):
+        self.tmpl = tmpl
+        self.ctx = TrackingContext(*ctx.maps)
+        self.volatile = tmpl.Loader.NONDETERMINISTIC
+        self.loader = None
+        self.documents = None
+        self.rerendered = self.reused = 0
+
+    def render(self):
+        """Renders the templates, recording the keys each part reads.
+
+        :return: The rendered data.
+        """
+        self.documents = None
+        return self.rerender(())
+
+    def rerender(self, changed):
+        """Re-renders the parts of the templates which read any of the
+        `changed` keys, reusing the rest of the previous result.
+
+        :param iterable changed: The keys which have changed since the last
+           render.
+        :return: The rendered data.
+        """
+        changed = set(changed)
+        self.rerendered = self.reused = 0
+        self.ctx.rebuild()
+        self.loader = self.tmpl.make_loader(ctx=self.ctx)
+        try:
+            with self.ctx.push() as ctx:
+                scope = ctx.maps[0]
+                if self.documents is None:
+                    self.documents = [
+                        self.document(node, scope)
+                        for node in self.tmpl.nodes
+                    ]
+                else:
+                    self.documents = [
+                        self.refresh_document(part, scope, changed)
+                        for part in self.documents
+                    ]
+        finally:
+            self.loader.dispose()
+            self.loader = None
+        return self.result()
+
+    def result(self):
+        data = [
+            part.value for part in self.documents
+            if part.value is not NOTHING
+        ]
+        if not isinstance(self.tmpl, Template):
+            return data
+        if len(data) > 1:
+            first, second = [
+                part.node for part in self.documents
+                if part.value is not NOTHING
+            ][:2]
+            raise ComposerError(
+                'expected a single document in the stream',
+                first.start_mark,
+                'but found another document', second.start_mark
+            )
+        return data[0] if data else None
+
+    def document(self, node, scope):
+        try:
+            if may_set(node) or '~' in getattr(node, 'flags', ''):
+                part = self.leaf(node, top=True)
+                part.saved = {
+                    key: scope[key] for key in part.saved if key in scope}
+            else:
+                part = self.build(node)
+            part.value = as_data(self.loader, part.value)
+            return part
+        finally:
+            self.loader.constructed_objects = {}
+            self.loader.recursive_objects = {}
+
+    def refresh_document(self, part, scope, changed):
+        try:
+            if type(part) is Leaf and part.saved is not None:
+                if self.affected(part, changed):
+                    part = self.document(part.node, scope)
+                    changed.update(part.saved)
+                else:
+                    self.reused += 1
+                    # Set through the Context, so that the names shadow any
+                    # defined by outer scopes.
+                    for key, value in part.saved.items():
+                        self.ctx[key] = value
+                return part
+            part, _ = self.refresh(part, changed)
+            part.value = as_data(self.loader, part.value)
+            return part
+        finally:
+            self.loader.constructed_objects = {}
+            self.loader.recursive_objects = {}
+
+    def track(self, render, *args):
+        """Calls `render`, returning its result along with the keys read and
+        set while it ran.
+        """
+        ctx = self.ctx
+        reads, writes = ctx.reads, ctx.writes
+        ctx.reads, ctx.writes = set(), set()
+        try:
+            result = render(*args)
+            return result, frozenset(ctx.reads), ctx.writes
+        finally:
+            ctx.reads, ctx.writes = reads, writes
+
+    def affected(self, part, changed, keys='reads'):
+        keys = getattr(part, keys)
+        return not keys.isdisjoint(changed) or (
+            self.volatile and not keys.isdisjoint(self.volatile))
+
+    @staticmethod
+    def deps(reads, parts):
+        deps = set(reads)
+        for part in parts:
+            deps.update(part.deps)
+        return frozenset(deps)
+
+    def build(self, node):
+        """Renders a node, dividing it into parts where possible."""
+        if isinstance(node, IfNode) and '~' not in node.flags:
+            return self.choice(node)
+        elif is_for_loop(node):
+            return self.loop(node)
+        elif type(node) is SequenceTemplateNode and is_lazy(node):
+            return self.sequence(node)
+        elif type(node) is MappingTemplateNode and is_lazy(node):
+            return self.mapping(node)
+        return self.leaf(node)
+
+    def leaf(self, node, top=False):
+        self.rerendered += 1
+        part = Leaf(node)
+        if top and hasattr(node, 'render_object'):
+            render = node.render_object
+        else:
+            def render(loader, ctx):
+                return maybe_render_object(node, loader, ctx)
+        part.value, part.reads, writes = self.track(
+            render, self.loader, self.ctx)
+        part.deps = part.reads
+        part.saved = writes if top else None
+        return part
+
+    def choice(self, node):
+        self.rerendered += 1
+        part = Choice(node)
+        child, part.reads, _ = self.track(node.select, lambda test: as_data(
+            self.loader, maybe_render_object(test, self.loader, self.ctx)))
+        part.child = None if child is None else self.build(child)
+        part.value = NOTHING if child is None else part.child.value
+        part.deps = self.deps(part.reads, [part.child] if child else [])
+        return part
+
+    def loop(self, node):
+        self.rerendered += 1
+        part = Loop(node)
+        for_node, body = node.value[0]
+        part.scopes, part.reads, _ = self.track(
+            lambda: list(for_node.scopes(self.loader, self.ctx)))
+        part.bodies = []
+        for scope in part.scopes:
+            with self.ctx.push(scope):
+                part.bodies.append(self.build(body))
+        part.value = self.loop_value(part)
+        part.deps = self.deps(part.reads, part.bodies)
+        return part
+
+    def loop_value(self, part):
+        return ForItems(
+            as_data(self.loader, body.value) for body in part.bodies
+            if body.value is not NOTHING
+        )
+
+    def sequence(self, node):
+        self.rerendered += 1
+        part = SequencePart(node)
+        part.items = [self.build(item) for item in node.value]
+        part.value = self.sequence_value(part)
+        part.deps = self.deps(part.reads, part.items)
+        return part
+
+    def sequence_value(self, part):
+        value = []
+        for item in part.items:
+            if item.value is NOTHING:
+                continue
+            elif isinstance(item.value, ForItems):
+                value.extend(item.value)
+            else:
+                value.append(item.value)
+        return value
+
+    def mapping(self, node):
+        self.rerendered += 1
+        part = MappingPart(node)
+        part.items = [
+            (self.leaf(key), self.build(value))
+            for key, value in node.value
+        ]
+        part.value = self.mapping_value(part)
+        part.deps = self.deps(
+            part.reads, [p for pair in part.items for p in pair])
+        return part
+
+    def mapping_value(self, part):
+        value = {}
+        for key, item in part.items:
+            if key.value is NOTHING or item.value is NOTHING:
+                continue
+            data = as_data(self.loader, key.value)
+            if not isinstance(data, collections.abc.Hashable):
+                raise ConstructorError(
+                    'while constructing a mapping', part.node.start_mark,
+                    'found unhashable key', key.node.start_mark
+                )
+            value[data] = as_data(self.loader, item.value)
+        return value
+
+    def refresh(self, part, changed):
+        """Brings a part up to date.
+
+        :return: The part (or a new one replacing it), and whether its value
+           changed.
+        """
+        if self.affected(part, changed):
+            return self.build(part.node), True
+        self.reused += 1
+        if not self.affected(part, changed, 'deps'):
+            return part, False
+        elif type(part) is Choice:
+            if part.child is None:
+                return part, False
+            part.child, dirty = self.refresh(part.child, changed)
+            if dirty:
+                part.value = part.child.value
+                part.deps = self.deps(part.reads, [part.child])
+            return part, dirty
+        elif type(part) is Loop:
+            dirty = False
+            for i, scope in enumerate(part.scopes):
+                with self.ctx.push(scope):
+                    part.bodies[i], body_dirty = self.refresh(
+                        part.bodies[i], changed)
+                dirty = dirty or body_dirty
+            if dirty:
+                part.value = self.loop_value(part)
+                part.deps = self.deps(part.reads, part.bodies)
+            return part, dirty
+        elif type(part) is SequencePart:
+            dirty = self.refresh_all(part.items, changed)
+            if dirty:
+                part.value = self.sequence_value(part)
+                part.deps = self.deps(part.reads, part.items)
+            return part, dirty
+        elif type(part) is MappingPart:
+            keys = [key for key, _ in part.items]
+            values = [value for _, value in part.items]
+            dirty = self.refresh_all(keys, changed)
+            dirty = self.refresh_all(values, changed) or dirty
+            if dirty:
+                part.items = list(zip(keys, values))
+                part.value = self.mapping_value(part)
+                part.deps = self.deps(part.reads, keys + values)
+            return part, dirty
+        return part, False
+
+    def refresh_all(self, parts, changed):
+        dirty = False
+        for i, part in enumerate(parts):
+            parts[i], part_dirty = self.refresh(part, changed)
+            dirty = dirty or part_dirty
+        return dirty
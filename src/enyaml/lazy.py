@@ -0,0 +1,286 @@
+# Copyright (c) 2022, Sadie Hain. All rights reserved.
+# Released under the BSD 3-Clause License
+# https://enyaml.org/LICENSE
+
+"""
+Lazily rendered views of template documents.
+
+Rendering a document lazily returns :class:`LazyMapping` and
+:class:`LazySequence` objects in place of the :class:`dict` and :class:`list`
+objects which rendering would produce. Their keys and lengths are known up
+front, but their items are only rendered (and constructed) when they are first
+accessed, so the cost of using a large document is proportional to how much of
+it is read.
+
+:tmpl:tag:`set` nodes are still executed in document order, when the view
+containing them is created, and items which come after them see the Context as
+it was at their position in the document. Collections which contain
+:tmpl:tag:`set` nodes are therefore rendered as soon as their parent is, and
+only the collections without any are deferred. Each deferred item is rendered
+with a snapshot of the Context taken when it was deferred (shared between the
+items deferred between two :tmpl:tag:`set` nodes).
+
+Lazy views hold on to the loader and Context snapshots they were rendered
+with, and are not safe to access from several threads at once.
+"""
+
+__all__ = [
+    'LazyMapping',
+    'LazySequence',
+    'realize',
+]
+
+import collections.abc
+from contextlib import ExitStack
+from yaml.constructor import ConstructorError
+from .nodes import (
+    NOTHING, SEQUENCE_TAG, MAPPING_TAG, ForItems, ForNode, IfNode,
+    MappingTemplateNode, SequenceTemplateNode, as_data, maybe_render_object,
+)
+
+
+class Deferred:
+    """A node to be rendered when its value is first accessed."""
+    __slots__ = ('loader', 'node', 'ctx', 'scopes')
+
+    def __init__(self, loader, node, ctx, scopes):
+        self.loader = loader
+        self.node = node
+        self.ctx = ctx
+        self.scopes = scopes
+
+    def realize(self):
+        builder = Builder(self.loader, self.ctx, frozen=True)
+        try:
+            with ExitStack() as stack:
+                for scope in self.scopes:
+                    stack.enter_context(self.ctx.push(scope))
+                    builder.scopes.append(scope)
+                return as_data(self.loader, builder.build(self.node))
+        finally:
+            self.loader.constructed_objects = {}
+            self.loader.recursive_objects = {}
+
+
+class LazyMapping(collections.abc.Mapping):
+    """A read-only mapping whose values are rendered on first access."""
+
+    def __init__(self, items):
+        self._items = items
+
+    def __getitem__(self, key):
+        value = self._items[key]
+        if type(value) is Deferred:
+            value = self._items[key] = value.realize()
+        return value
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict(self)!r})'
+
+
+class LazySequence(collections.abc.Sequence):
+    """A read-only sequence whose items are rendered on first access."""
+
+    def __init__(self, items):
+        self._items = items
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        value = self._items[index]
+        if type(value) is Deferred:
+            value = self._items[index] = value.realize()
+        return value
+
+    def __len__(self):
+        return len(self._items)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, LazySequence)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f'{type(self).__name__}({list(self)!r})'
+
+
+def realize(data):
+    """Renders everything left to render in a lazy view.
+
+    :param data: A lazily rendered document.
+    :return: The same data, with lazy views replaced by :class:`dict` and
+       :class:`list` objects.
+    """
+    if isinstance(data, LazyMapping):
+        return {key: realize(value) for key, value in data.items()}
+    elif isinstance(data, LazySequence):
+        return [realize(item) for item in data]
+    return data
+
+
+def is_for_loop(node):
+    return (
+        type(node) is MappingTemplateNode and '~' not in node.flags
+        and len(node.value) == 1 and isinstance(node.value[0][0], ForNode)
+        and node.value[0][0].subtag in (None, SEQUENCE_TAG)
+    )
+
+
+def is_lazy(node):
+    """Whether `node` is rendered to a lazy view."""
+    if type(node) is SequenceTemplateNode:
+        return '~' not in node.flags and node.subtag in (None, SEQUENCE_TAG)
+    elif type(node) is MappingTemplateNode:
+        return is_for_loop(node) or (
+            '~' not in node.flags and node.subtag in (None, MAPPING_TAG)
+            and not node.has_merges
+            and not any(isinstance(key, ForNode) for key, _ in node.value)
+        )
+    return False
+
+
+def is_deferrable(node):
+    """Whether rendering `node` can be put off until it is accessed."""
+    return is_lazy(node) and not node.has_setters
+
+
+def may_set(node):
+    return (
+        getattr(node, 'basetag', None) == 'set'
+        or getattr(node, 'has_setters', False)
+    )
+
+
+class Builder:
+    """Renders template nodes to lazy views.
+
+    :param loader: The loader to render with.
+    :param Context ctx: The Context to render with.
+    :param bool frozen: Whether `ctx` is a snapshot, which nothing else will
+       modify. Otherwise, nodes are deferred with a snapshot of `ctx`.
+    """
+
+    def __init__(self, loader, ctx, frozen=False):
+        self.loader = loader
+        self.ctx = ctx
+        self.frozen = frozen
+        self.scopes = []
+        self._snapshot = None
+        self._depth = 0
+
+    def defer(self, node):
+        if self.frozen:
+            ctx = self.ctx
+        else:
+            if self._snapshot is None:
+                self._snapshot = self.ctx.snapshot()
+                self._depth = len(self.scopes)
+            ctx = self._snapshot
+        return Deferred(self.loader, node, ctx, tuple(self.scopes))
+
+    def eager(self, node):
+        value = maybe_render_object(node, self.loader, self.ctx)
+        if may_set(node):
+            self._snapshot = None
+        return value
+
+    def build(self, node):
+        """Renders a node, returning a lazy view if it is a collection.
+
+        :return: The data, :data:`~enyaml.nodes.NOTHING` if the node produces
+           no output, or a :class:`~enyaml.nodes.ForItems` list.
+        """
+        if isinstance(node, IfNode) and '~' not in node.flags:
+            node = self.select(node)
+            if node is None:
+                return NOTHING
+            return self.build(node)
+        if is_for_loop(node):
+            return LazySequence(self.loop(node))
+        elif type(node) is SequenceTemplateNode and is_lazy(node):
+            return LazySequence(self.sequence(node))
+        elif type(node) is MappingTemplateNode and is_lazy(node):
+            return LazyMapping(self.mapping(node))
+        return self.eager(node)
+
+    def select(self, node):
+        result = node.select(lambda test: as_data(
+            self.loader, self.eager(test)))
+        if may_set(node):
+            self._snapshot = None
+        return result
+
+    def item(self, node):
+        """Renders a sequence item, returning a list of items to splice into
+        the sequence.
+        """
+        if isinstance(node, IfNode) and '~' not in node.flags:
+            node = self.select(node)
+            if node is None:
+                return []
+            return self.item(node)
+        if is_for_loop(node):
+            return self.loop(node)
+        elif is_deferrable(node):
+            return [self.defer(node)]
+        value = self.build(node)
+        if value is NOTHING:
+            return []
+        elif isinstance(value, ForItems):
+            return value
+        return [value]
+
+    def sequence(self, node):
+        items = []
+        for item in node.value:
+            items.extend(self.item(item))
+        return items
+
+    def mapping(self, node):
+        items = {}
+        for key_node, value_node in node.value:
+            key = self.eager(key_node)
+            if is_deferrable(value_node):
+                value = self.defer(value_node)
+            else:
+                value = self.build(value_node)
+            if key is NOTHING or value is NOTHING:
+                continue
+            key = as_data(self.loader, key)
+            if not isinstance(key, collections.abc.Hashable):
+                raise ConstructorError(
+                    'while constructing a mapping', node.start_mark,
+                    'found unhashable key', key_node.start_mark
+                )
+            items[key] = as_data(self.loader, value)
+        return items
+
+    def loop(self, node):
+        for_node, body = node.value[0]
+        deferrable = is_deferrable(body)
+        items = []
+        for scope in for_node.scopes(self.loader, self.ctx):
+            with self.ctx.push(scope):
+                self.scopes.append(scope)
+                try:
+                    if deferrable:
+                        items.append(self.defer(body))
+                    else:
+                        value = self.build(body)
+                        if value is not NOTHING:
+                            items.append(as_data(self.loader, value))
+                finally:
+                    self.scopes.pop()
+            if self._snapshot is not None and \
+                    len(self.scopes) < self._depth:
+                self._snapshot = None
+        return items
@@ -3,32 +3,126 @@
 # https://enyaml.org/LICENSE
 
 __all__ = [
+    'BaseTemplateLoader',
     'TemplateLoader',
+    'CTemplateLoader',
 ]
 
 import re
 import yaml
 from yaml.composer import ComposerError
-from . import nodes
+from . import nodes, lazy, selector
+from .util import RenderStats
 
+try:
+    from yaml import CSafeLoader
+except ImportError:
+    CSafeLoader = None
 
-TAG_RX = re.compile(r'(!(?:[0-9a-zA-Z-_]*!)?)?(.*)$')
 
+TAG_RX = re.compile(r'(!(?:[0-9a-zA-Z-_]*!)?)?(.*)$')
 
-class TemplateLoader(yaml.SafeLoader):
-    """Loads and renders ENYAML templates.
 
-    :param file-like stream: The stream to read the templates from.
+class BaseTemplateLoader:
+    """Rendering support shared by the template loaders. Mixed in ahead of a
+    PyYAML loader class.
     """
     TAG_MAP = {}
     DEFAULT_TAGS = yaml.SafeLoader.DEFAULT_TAGS.copy()
     DEFAULT_TAGS['!'] = nodes.TAG_PREFIX
+    BUILTINS = {
+        'list': list,
+        'zip': zip,
+    }
+    NONDETERMINISTIC = frozenset()
+
+    def __init__(self, stream):
+        super().__init__(stream)
+        self.render_scopes = {}
+        # The ids of the static results this loader has rendered without
+        # copying. See nodes.hoist_static.
+        self.static_used = set()
+        self.stats = RenderStats()
+
+    @classmethod
+    def add_implicit_resolver(cls, tag, regexp, first):
+        super().add_implicit_resolver(tag, regexp, first)
+        nodes.resolve_cache.clear()
+
+    @classmethod
+    def add_builtin(cls, name, value, deterministic=True):
+        """Makes a value available by name to all templates rendered with this
+        loader class, or any of its subclasses, without being set in the
+        Context. Values added to :class:`BaseTemplateLoader` are available
+        with both :class:`TemplateLoader` and :class:`CTemplateLoader`.
+
+        :param str name: The name to make the value available under.
+        :param value: The value, typically a function.
+        :param bool deterministic: Whether templates using the value always
+           render the same way given the same Context. Templates which
+           reference a value added with :const:`False`, like a function
+           returning the current time, aren't cached by
+           :class:`~enyaml.cache.ResultCache`.
+        """
+        if 'BUILTINS' not in cls.__dict__:
+            cls.BUILTINS = cls.BUILTINS.copy()
+        if 'NONDETERMINISTIC' not in cls.__dict__:
+            cls.NONDETERMINISTIC = cls.NONDETERMINISTIC
+        # Subclasses which have had builtins added have their own copies,
+        # which are updated too.
+        classes = [cls]
+        for klass in classes:
+            classes.extend(klass.__subclasses__())
+            if 'BUILTINS' in klass.__dict__:
+                klass.BUILTINS[name] = value
+            if 'NONDETERMINISTIC' in klass.__dict__:
+                if deterministic:
+                    klass.NONDETERMINISTIC = klass.NONDETERMINISTIC - {name}
+                else:
+                    klass.NONDETERMINISTIC = klass.NONDETERMINISTIC | {name}
+
+    def render_scope(self, ctx):
+        """Returns the scope that expressions are evaluated in when rendering
+        with `ctx`.
+
+        The scope looks names up in `ctx`, and then in the render globals:
+        ``ctx`` itself, and the ``__builtins__`` (:attr:`BUILTINS`, plus a
+        ``render`` function). It is created on first use, and reused for the
+        lifetime of the loader.
+
+        :param Context ctx: The Context being rendered with.
+        :return: A :class:`~enyaml.nodes.RenderScope`.
+        """
+        try:
+            return self.render_scopes[id(ctx)][1]
+        except KeyError:
+            scope = nodes.RenderScope(ctx, nodes.make_globals(self, ctx))
+            self.render_scopes[id(ctx)] = (ctx, scope)
+            return scope
+
+    def compose_nodes(self):
+        """Composes the remaining documents in the stream.
+
+        :return: An iterable of document nodes.
+        """
+        while self.check_node():
+            yield self.get_node()
+
+    def render_node(self, node, ctx):
+        """Renders a composed document node.
+
+        :param yaml.Node node: The document node to render.
+        :param Context ctx: The Context with which to render.
+        :return: The rendered node, or :const:`None` if the document produces
+           no output.
+        """
+        if hasattr(node, 'render'):
+            node = node.render(self, ctx)
+        return node or None
 
     def _render_next_node(self, ctx):
         while self.check_node():
-            node = self.get_node()
-            if hasattr(node, 'render'):
-                node = node.render(self, ctx)
+            node = self.render_node(self.get_node(), ctx)
             if node:
                 return node
 
@@ -62,6 +156,109 @@ class TemplateLoader(yaml.SafeLoader):
         if node:
             return self.construct_document(node)
 
+    def render_node_data(self, node, ctx):
+        """Renders a composed document node straight to Python data.
+
+        The result is the same as constructing the node returned by
+        :meth:`render_node`, but is built without creating the rendered nodes
+        (see :meth:`.BaseTemplateNode.render_object`).
+
+        :param yaml.Node node: The document node to render.
+        :param Context ctx: The Context with which to render.
+        :return: The rendered data, or :data:`enyaml.nodes.NOTHING` if the
+           document produces no output.
+        """
+        try:
+            if hasattr(node, 'render_object'):
+                data = node.render_object(self, ctx)
+            else:
+                data = self.construct_object(node, deep=True)
+            if data is nodes.NOTHING:
+                return data
+            return nodes.as_data(self, data)
+        finally:
+            self.constructed_objects = {}
+            self.recursive_objects = {}
+
+    def render_node_lazy(self, node, ctx):
+        """Renders a composed document node lazily.
+
+        Collections are rendered to :class:`~enyaml.lazy.LazyMapping` and
+        :class:`~enyaml.lazy.LazySequence` views, whose items are rendered
+        when they are first accessed. See :mod:`enyaml.lazy`. The loader must
+        not be disposed of while the views are in use.
+
+        :param yaml.Node node: The document node to render.
+        :param Context ctx: The Context with which to render.
+        :return: The rendered data, or :data:`enyaml.nodes.NOTHING` if the
+           document produces no output.
+        """
+        try:
+            if '~' in getattr(node, 'flags', ''):
+                data = node.render_object(self, ctx)
+            else:
+                data = lazy.Builder(self, ctx).build(node)
+            if data is nodes.NOTHING:
+                return data
+            return nodes.as_data(self, data)
+        finally:
+            self.constructed_objects = {}
+            self.recursive_objects = {}
+
+    def select_node_data(self, node, ctx, path):
+        """Renders the value at a path within a composed document node,
+        skipping the parts of the document which aren't needed for it. See
+        :mod:`enyaml.selector`.
+
+        :param yaml.Node node: The document node to render.
+        :param Context ctx: The Context with which to render.
+        :param path: The path to select, e.g. ``services.api.env``.
+        :return: The selected data, or :data:`enyaml.nodes.NOTHING` if the
+           document produces no output.
+        :raises ~enyaml.selector.PathNotFoundError: when the path isn't in
+           the rendered document.
+        """
+        try:
+            return selector.Selector(self, ctx, path).select(node)
+        finally:
+            self.constructed_objects = {}
+            self.recursive_objects = {}
+
+    def _render_next_data(self, ctx):
+        while self.check_node():
+            node = self.get_node()
+            data = self.render_node_data(node, ctx)
+            if data is not nodes.NOTHING:
+                return node, data
+        return None, None
+
+    def render_data_direct(self, ctx):
+        """Renders the next document in the stream straight to Python data.
+
+        Like :meth:`render_data`, but using :meth:`render_node_data`.
+
+        :param Context ctx: The Context with which to render.
+        :return: Rendered result.
+        """
+        return self._render_next_data(ctx)[1]
+
+    def render_single_data_direct(self, ctx):
+        """Renders a single document stream straight to Python data.
+
+        Like :meth:`render_single_data`, but using :meth:`render_node_data`.
+
+        :param Context ctx: The Context with which to render.
+        :return: Rendered result.
+        """
+        node, data = self._render_next_data(ctx)
+        if self.check_node():
+            event = self.get_event()
+            raise ComposerError(
+                'expected a single document in the stream', node.start_mark,
+                'but found another document', event.start_mark
+            )
+        return data
+
     def get_data(self):
         if self.check_node():
             node = self.get_node()
@@ -77,8 +274,47 @@ class TemplateLoader(yaml.SafeLoader):
             return self.construct_document(node)
         return None
 
+    def templatify(self, node, basetag, subtag, flags):
+        """Turns a composed node into the template node class for its tag.
+
+        :param yaml.Node node: The node, whose tag has already been rewritten
+           into the ENYAML namespace.
+        :param str basetag: The ENYAML tag, e.g. ``tmpl``, ``$`` or ``for``.
+        :param str subtag: The tag of the rendered node, if given.
+        :param str flags: The tag flags.
+        """
+        for cls in type(node).__mro__:
+            try:
+                node.__class__ = self.TAG_MAP[basetag, cls]
+            except KeyError:
+                continue
+            break
+        node.subtag = subtag
+        node.flags = flags
+        if type(node) is nodes.ScalarTemplateNode:
+            # Resolve literal scalars now, rather than on first render.
+            node.render(self, None)
+        return node
+
+    def expand_subtag(self, tag_handles, basetag, subtag, flags):
+        m = TAG_RX.match(subtag)
+        if m:
+            handle, suffix = m.groups()
+            if handle:
+                subtag = tag_handles[handle]+suffix
+        return subtag, nodes.unsplit_tag(basetag, subtag, flags)
+
+
+class TemplateLoader(BaseTemplateLoader, yaml.SafeLoader):
+    """Loads and renders ENYAML templates.
+
+    :param file-like stream: The stream to read the templates from.
+    """
+
     def parse_node(self, block=False, indentless_sequence=False):
         event = super().parse_node(block, indentless_sequence)
+        if isinstance(event, yaml.AliasEvent):
+            return event
         if isinstance(event, yaml.ScalarEvent) and (
             event.tag is None or
             not event.tag.startswith(nodes.TAG_PREFIX)
@@ -90,13 +326,8 @@ class TemplateLoader(yaml.SafeLoader):
             event.tag = f'{nodes.TAG_PREFIX}tmpl:{event.tag}'
         event.basetag, event.subtag, event.flags = nodes.split_tag(event.tag)
         if event.subtag:
-            m = TAG_RX.match(event.subtag)
-            if m:
-                handle, suffix = m.groups()
-                if handle:
-                    event.subtag = self.tag_handles[handle]+suffix
-                    event.tag = nodes.unsplit_tag(
-                        event.basetag, event.subtag, event.flags)
+            event.subtag, event.tag = self.expand_subtag(
+                self.tag_handles, event.basetag, event.subtag, event.flags)
         return event
 
     def compose_node(self, parent, index):
@@ -104,18 +335,79 @@ class TemplateLoader(yaml.SafeLoader):
         node = super().compose_node(parent, index)
         if not hasattr(event, 'basetag'):
             return node
-        for cls in type(node).__mro__:
-            try:
-                node.__class__ = self.TAG_MAP[event.basetag, cls]
-            except KeyError:
-                continue
-            break
-        node.subtag = event.subtag
-        node.flags = event.flags
-        return node
+        return self.templatify(node, event.basetag, event.subtag, event.flags)
+
+
+if CSafeLoader is not None:
+    class CTemplateLoader(BaseTemplateLoader, CSafeLoader):
+        """Loads and renders ENYAML templates, using libyaml to parse and
+        compose them.
+
+        The nodes composed by libyaml are retagged into the ENYAML namespace
+        afterwards, the same way :class:`TemplateLoader` tags them while
+        parsing. When PyYAML is built without libyaml, this is an alias of
+        :class:`TemplateLoader`.
+
+        :param file-like stream: The stream to read the templates from.
+
+        .. note::
+
+           libyaml is stricter about which characters may appear in a tag, so
+           subtags containing a comma (e.g. ``!tmpl:tag:yaml.org,2002:str``)
+           must be written in verbatim form. Handles from ``%TAG`` directives
+           aren't expanded within subtags; only the default ``!`` and ``!!``
+           handles are.
+        """
+
+        def get_node(self):
+            node = super().get_node()
+            if node is not None:
+                self.retag(node)
+            return node
+
+        def get_single_node(self):
+            node = super().get_single_node()
+            if node is not None:
+                self.retag(node)
+            return node
+
+        def retag(self, node, seen=None):
+            """Rewrites the tags of a composed node graph into the ENYAML
+            namespace, and converts the nodes to template nodes.
+            """
+            if seen is None:
+                seen = set()
+            if id(node) in seen:
+                return
+            seen.add(id(node))
+            tag = node.tag
+            if tag.startswith('!'):
+                tag = nodes.TAG_PREFIX + tag[1:]
+            if not tag.startswith(nodes.TAG_PREFIX):
+                if isinstance(node, yaml.ScalarNode):
+                    return
+                elif tag == self.resolve(type(node), None, (True, False)):
+                    tag = f'{nodes.TAG_PREFIX}tmpl'
+                else:
+                    tag = f'{nodes.TAG_PREFIX}tmpl:{tag}'
+            basetag, subtag, flags = nodes.split_tag(tag)
+            if subtag:
+                subtag, tag = self.expand_subtag(
+                    self.DEFAULT_TAGS, basetag, subtag, flags)
+            node.tag = tag
+            if isinstance(node, yaml.SequenceNode):
+                for item in node.value:
+                    self.retag(item, seen)
+            elif isinstance(node, yaml.MappingNode):
+                for key, value in node.value:
+                    self.retag(key, seen)
+                    self.retag(value, seen)
+            self.templatify(node, basetag, subtag, flags)
+else:
+    CTemplateLoader = TemplateLoader
 
 
 for name in nodes.__all__:
     obj = getattr(nodes, name)
     if hasattr(obj, 'basetag') and hasattr(obj, 'node_type'):
-        TemplateLoader.TAG_MAP[obj.basetag, obj.node_type] = obj
+        BaseTemplateLoader.TAG_MAP[obj.basetag, obj.node_type] = obj
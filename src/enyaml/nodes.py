@@ -18,16 +18,81 @@ __all__ = [
 
 import re
 import copy
+import collections.abc
+import string
+import types
 import functools
 import yaml
 from yaml.constructor import ConstructorError
 
 from .expr import parse as parse_expr
+from .util import LRUCache
+from .aio import resolve_iterable
 
 
 TAG_PREFIX = 'tag:enyaml.org,2022:'
 FLAGS = '~'
 FOR_RX = re.compile(r'((?:(?:^|\s*,\s*)[a-zA-Z_]\w*)+)\s+in\s')
+FIELD_ROOT_RX = re.compile(r'[^.[]*')
+# Attributes which only make sense on template nodes, and are removed when a
+# node is detemplified.
+TEMPLATE_ATTRS = (
+    'subtag', 'flags', 'expr', 'compiled', 'static', 'static_results',
+    'fields', 'has_merges', 'has_setters',
+)
+SEQUENCE_TAG = yaml.resolver.BaseResolver.DEFAULT_SEQUENCE_TAG
+MAPPING_TAG = yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG
+STR_TAG = yaml.resolver.BaseResolver.DEFAULT_SCALAR_TAG
+MERGE_TAGS = ('tag:yaml.org,2002:merge', 'tag:yaml.org,2002:value')
+
+#: Returned when rendering to Python data, by nodes which produce no output.
+NOTHING = object()
+
+#: Parsed and optimized expressions, keyed by expression text.
+expression_cache = LRUCache(1024)
+
+#: Tags of implicitly resolved scalars, keyed by resolver class, value and
+#: implicit flags. Shared by all loaders and dumpers, and cleared whenever an
+#: implicit resolver is added to one of them. Unlike :data:`expression_cache`,
+#: this is a plain :class:`dict`, since a locked lookup costs about as much
+#: as resolving the tag again.
+resolve_cache = {}
+RESOLVE_CACHE_SIZE = 4096
+
+
+def compile_expr(string):
+    return parse_expr(string).optimize()
+
+
+def resolve_scalar(resolver, value, implicit, stats=None):
+    """Resolves the tag of a scalar, like ``resolver.resolve(yaml.ScalarNode,
+    value, implicit)``, caching the result in :data:`resolve_cache`.
+
+    :param stats: A :class:`~enyaml.util.RenderStats` to count the cache hits
+       and misses in.
+    """
+    if not implicit[0] or resolver.yaml_path_resolvers:
+        return resolver.resolve(yaml.ScalarNode, value, implicit)
+    key = (type(resolver), value, implicit)
+    try:
+        tag = resolve_cache[key]
+    except KeyError:
+        pass
+    else:
+        if stats is not None:
+            stats.resolve_hits += 1
+        return tag
+    if stats is not None:
+        stats.resolve_misses += 1
+    tag = resolver.resolve(yaml.ScalarNode, value, implicit)
+    while resolve_cache and len(resolve_cache) >= RESOLVE_CACHE_SIZE:
+        try:
+            resolve_cache.pop(next(iter(resolve_cache)), None)
+        except (RuntimeError, StopIteration):
+            # Another thread changed the cache while we were evicting.
+            pass
+    resolve_cache[key] = tag
+    return tag
 
 
 def split_tag(tag):
@@ -53,12 +118,174 @@ def unsplit_tag(basetag, subtag, flags):
     ))
 
 
+def format_fields(fmt):
+    """Yields the names of the variables referenced by a format-string."""
+    for _, field, spec, _ in string.Formatter().parse(fmt):
+        if field is not None:
+            name = FIELD_ROOT_RX.match(field).group()
+            if name and not name.isdigit():
+                yield name
+        if spec:
+            yield from format_fields(spec)
+
+
 def maybe_render(node, loader, ctx):
     if hasattr(node, 'render') and '~' not in node.flags:
         return node.render(loader, ctx)
     return node
 
 
+def maybe_render_object(node, loader, ctx):
+    if hasattr(node, 'render') and '~' not in node.flags:
+        return node.render_object(loader, ctx)
+    return loader.construct_object(node, deep=True)
+
+
+def construct_result(loader, node):
+    """Constructs the result of a render method as Python data."""
+    if node is None:
+        return NOTHING
+    if isinstance(node, ForResult):
+        items = ForItems(
+            loader.construct_object(item, deep=True) for item in node.value)
+        items.node = node
+        return items
+    return loader.construct_object(node, deep=True)
+
+
+def as_data(loader, value):
+    if isinstance(value, ForItems):
+        return value.as_data(loader)
+    return value
+
+
+def is_static(node):
+    """Whether rendering `node` doesn't depend on the Context."""
+    if not hasattr(node, 'render') or '~' in node.flags:
+        return True
+    return getattr(node, 'static', False)
+
+
+def walk(nodes):
+    """Yields each node of composed node graphs once.
+
+    :param iterable nodes: The document nodes.
+    """
+    seen = set()
+    stack = list(nodes)
+    stack.reverse()
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        yield node
+        if isinstance(node.value, list):
+            for item in reversed(node.value):
+                if isinstance(item, tuple):
+                    stack.extend(reversed(item))
+                else:
+                    stack.append(item)
+
+
+def code_names(code):
+    """Returns the global names a code object and the code nested in it,
+    such as comprehensions and lambdas, may look up.
+    """
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= code_names(const)
+    return names
+
+
+def referenced_names(nodes):
+    """Returns the names which the expressions, format-strings and
+    :tmpl:tag:`for` headers in composed node graphs may look up when rendered.
+
+    The names are found without rendering, so templates which come from the
+    Context, and any names they look up, aren't included. Expressions which
+    can't be parsed are skipped; their errors are raised when rendering.
+
+    :param iterable nodes: The document nodes.
+    :return: A :class:`frozenset` of names.
+    """
+    names = set()
+    for node in walk(nodes):
+        try:
+            if isinstance(node, ExpressionNode):
+                names.update(node.expr.names())
+            elif isinstance(node, FormatStringNode):
+                names.update(node.fields)
+            elif isinstance(node, ForNode):
+                names.update(code_names(node.header[1]))
+        except Exception:
+            pass
+    return frozenset(names)
+
+
+def copy_result(node):
+    """Copies the collection nodes of a rendered node graph, sharing the
+    scalars.
+    """
+    if isinstance(node, yaml.SequenceNode):
+        value = [copy_result(item) for item in node.value]
+    elif isinstance(node, yaml.MappingNode):
+        value = [
+            (copy_result(key), copy_result(value))
+            for key, value in node.value
+        ]
+    else:
+        return node
+    return type(node)(
+        node.tag, value, node.start_mark, node.end_mark, node.flow_style)
+
+
+def has_merge_keys(node):
+    """Whether a rendered node graph contains merge (``<<``) or value
+    (``=``) keys, which the constructor flattens in place.
+    """
+    if isinstance(node, yaml.SequenceNode):
+        return any(map(has_merge_keys, node.value))
+    elif isinstance(node, yaml.MappingNode):
+        return any(
+            key.tag in MERGE_TAGS or has_merge_keys(key)
+            or has_merge_keys(value)
+            for key, value in node.value
+        )
+    return False
+
+
+def hoist_static(render):
+    """Decorates a render method so that static nodes are rendered only once
+    (per loader class), and the result is reused thereafter.
+
+    The first use of a result by a loader gets the result itself, so that
+    rendering a static subtree costs the same however large it is. Further
+    uses by the same loader get their own copy of the result's collection
+    nodes, so that, as before, every occurrence constructs to a distinct
+    object. Results containing merge keys, which are flattened in place when
+    constructed, are always copied.
+    """
+    @functools.wraps(render)
+    def wrapper(self, loader, ctx):
+        if not self.static:
+            return render(self, loader, ctx)
+        results = self.__dict__.setdefault('static_results', {})
+        try:
+            node, shared = results[type(loader)]
+        except KeyError:
+            node = render(self, loader, ctx)
+            shared = not has_merge_keys(node)
+            results[type(loader)] = node, shared
+        used = getattr(loader, 'static_used', None)
+        if shared and used is not None and id(node) not in used:
+            used.add(id(node))
+            return node
+        return copy_result(node)
+    return wrapper
+
+
 def user_render(loader, ctx, tmpl, local_ctx=None):
     if local_ctx is None:
         local_ctx = {}
@@ -66,17 +293,40 @@ def user_render(loader, ctx, tmpl, local_ctx=None):
         return loader.construct_object(tmpl.render(loader, ctx), deep=True)
 
 
-def get_globals(loader, ctx):
+def make_globals(loader, ctx):
+    builtins = dict(loader.BUILTINS)
+    builtins['render'] = functools.partial(user_render, loader, ctx)
     return {
-        '__builtins__': {
-            'list': list,
-            'zip': zip,
-            'render': functools.partial(user_render, loader, ctx),
-        },
+        '__builtins__': builtins,
         'ctx': ctx,
     }
 
 
+def get_scope(loader, ctx):
+    if hasattr(loader, 'render_scope'):
+        return loader.render_scope(ctx)
+    return RenderScope(ctx, make_globals(loader, ctx))
+
+
+def get_globals(loader, ctx):
+    return get_scope(loader, ctx).globals
+
+
+class RenderScope:
+    '''Looks names up in the Context, falling back to the render globals.'''
+    __slots__ = ('ctx', 'globals')
+
+    def __init__(self, ctx, globals):
+        self.ctx = ctx
+        self.globals = globals
+
+    def __getitem__(self, key):
+        try:
+            return self.ctx[key]
+        except KeyError:
+            return self.globals[key]
+
+
 class RenderError(yaml.error.MarkedYAMLError):
     pass
 
@@ -84,6 +334,27 @@ class RenderError(yaml.error.MarkedYAMLError):
 class BaseTemplateNode:
     basetag = 'tmpl'
 
+    @functools.cached_property
+    def static(self):
+        '''Whether rendering this node doesn't depend on the Context.
+
+        Static nodes contain no :tmpl:tag:`$`, :tmpl:tag:`$f`,
+        :tmpl:tag:`for`, :tmpl:tag:`if` or :tmpl:tag:`set` nodes, so they are
+        rendered once and the result is reused.
+        '''
+        return self._is_static()
+
+    def _is_static(self):
+        return self.basetag == BaseTemplateNode.basetag
+
+    def __getstate__(self):
+        # Compiled expressions are closures, and static results are keyed by
+        # loader class, so neither is pickled. Both are recreated on use.
+        state = self.__dict__.copy()
+        state.pop('compiled', None)
+        state.pop('static_results', None)
+        return state
+
     @classmethod
     def to_yaml(cls, dumper, data):
         node = copy.copy(data)
@@ -93,11 +364,19 @@ class BaseTemplateNode:
         return node
 
     def _detemplify(self, loader, implicit=True, deep=False):
-        self.tag = self.subtag or loader.resolve(
-            self.node_type, self.value, (implicit, False))
+        if self.subtag:
+            self.tag = self.subtag
+        elif self.node_type is yaml.ScalarNode:
+            self.tag = resolve_scalar(
+                loader, self.value, (implicit, False),
+                getattr(loader, 'stats', None)
+            )
+        else:
+            self.tag = loader.resolve(
+                self.node_type, self.value, (implicit, False))
         self.__class__ = self.node_type
-        self.__dict__.pop('subtag', None)
-        self.__dict__.pop('flags', None)
+        for name in TEMPLATE_ATTRS:
+            self.__dict__.pop(name, None)
 
     def make_result_node(self, loader, value, implicit=True):
         node = copy.copy(self)
@@ -105,16 +384,38 @@ class BaseTemplateNode:
         node._detemplify(loader, implicit)
         return node
 
+    @hoist_static
     def render(self, loader, ctx):
         return self.make_result_node(loader, self.value)
 
+    def render_object(self, loader, ctx):
+        '''Renders the node straight to Python data.
+
+        Gives the same result as constructing the node returned by
+        :meth:`render`, but collections, expressions and format-strings are
+        turned into Python objects directly, without creating result nodes.
+
+        :return: The data, :data:`NOTHING` if the node produces no output, or a
+           :class:`ForItems` list to be spliced into an enclosing sequence.
+        '''
+        return construct_result(loader, self.render(loader, ctx))
+
 
 class ScalarTemplateNode(BaseTemplateNode, yaml.ScalarNode):
     node_type = yaml.ScalarNode
 
 
 class BaseCollectionTemplateNode(BaseTemplateNode):
-    pass
+    @functools.cached_property
+    def has_setters(self):
+        '''Whether the node contains any :tmpl:tag:`set` nodes.'''
+        for child in self.children():
+            if isinstance(child, SetterNode) or (
+                isinstance(child, BaseCollectionTemplateNode)
+                and child.has_setters
+            ):
+                return True
+        return False
 
 
 class SequenceTemplateNode(BaseCollectionTemplateNode, yaml.SequenceNode):
@@ -127,6 +428,13 @@ class SequenceTemplateNode(BaseCollectionTemplateNode, yaml.SequenceNode):
                 if isinstance(node, BaseTemplateNode):
                     node._detemplify(loader, implicit, deep)
 
+    def _is_static(self):
+        return super()._is_static() and all(map(is_static, self.value))
+
+    def children(self):
+        return iter(self.value)
+
+    @hoist_static
     def render(self, loader, ctx):
         value = []
         for item in self.value:
@@ -138,6 +446,18 @@ class SequenceTemplateNode(BaseCollectionTemplateNode, yaml.SequenceNode):
                     value.append(item)
         return self.make_result_node(loader, value)
 
+    def render_object(self, loader, ctx):
+        if self.subtag not in (None, SEQUENCE_TAG):
+            return super().render_object(loader, ctx)
+        data = []
+        for item in self.value:
+            item = maybe_render_object(item, loader, ctx)
+            if isinstance(item, ForItems):
+                data.extend(item)
+            elif item is not NOTHING:
+                data.append(item)
+        return data
+
 
 class MappingTemplateNode(BaseCollectionTemplateNode, yaml.MappingNode):
     node_type = yaml.MappingNode
@@ -151,6 +471,28 @@ class MappingTemplateNode(BaseCollectionTemplateNode, yaml.MappingNode):
                 if isinstance(value_node, BaseTemplateNode):
                     value_node._detemplify(loader, implicit, deep)
 
+    def _is_static(self):
+        return super()._is_static() and all(
+            is_static(key) and is_static(value) for key, value in self.value)
+
+    def children(self):
+        for key, value in self.value:
+            yield key
+            yield value
+
+    @functools.cached_property
+    def has_merges(self):
+        '''Whether the mapping may have merge (``<<``) or value (``=``) keys,
+        which are left to the constructor to apply when rendering to Python
+        data.
+        '''
+        return any(
+            type(key) is ScalarTemplateNode or (
+                type(key) is yaml.ScalarNode and key.tag in MERGE_TAGS)
+            for key, _ in self.value
+        )
+
+    @hoist_static
     def render(self, loader, ctx):
         value = []
         for item_key, item_value in self.value:
@@ -165,11 +507,48 @@ class MappingTemplateNode(BaseCollectionTemplateNode, yaml.MappingNode):
                 value.append((item_key, item_value))
         return self.make_result_node(loader, value)
 
+    def render_object(self, loader, ctx):
+        if self.subtag not in (None, MAPPING_TAG) or self.has_merges:
+            return super().render_object(loader, ctx)
+        data = {}
+        for item_key, item_value in self.value:
+            if isinstance(item_key, ForNode):
+                if len(self.value) > 1:
+                    raise RenderError(
+                        'not expecting other items', item_key.start_mark)
+                return item_key.render_object_items(loader, ctx, item_value)
+            key = maybe_render_object(item_key, loader, ctx)
+            value = maybe_render_object(item_value, loader, ctx)
+            if key is NOTHING or value is NOTHING:
+                continue
+            key = as_data(loader, key)
+            if not isinstance(key, collections.abc.Hashable):
+                raise ConstructorError(
+                    'while constructing a mapping', self.start_mark,
+                    'found unhashable key', item_key.start_mark
+                )
+            data[key] = as_data(loader, value)
+        return data
+
 
 class ForResult(yaml.SequenceNode):
     pass
 
 
+class ForItems(list):
+    '''The Python data rendered by a :tmpl:tag:`for` node, which is spliced
+    into an enclosing sequence.
+    '''
+    #: The :class:`ForResult` the items were constructed from, if any.
+    node = None
+
+    def as_data(self, loader):
+        '''The items as a value in their own right.'''
+        if self.node is None:
+            return list(self)
+        return loader.construct_object(self.node, deep=True)
+
+
 class ForNode(yaml.ScalarNode):
     '''Represents a :tmpl:tag:`for` expression node.
     '''
@@ -177,19 +556,47 @@ class ForNode(yaml.ScalarNode):
     basetag = 'for'
     flags = ''
 
-    def render_items(self, loader, ctx, tmpl):
+    @functools.cached_property
+    def header(self):
+        '''The loop target names, and the compiled iterable expression.'''
         m = FOR_RX.match(self.value)
         if m is None:
             raise RenderError(
                 'invalid for expression', self.start_mark)
-        names, = m.groups()
+        names = tuple(name.strip() for name in m.group(1).split(','))
         expr = self.value[m.end():].strip()
+        return names, compile(expr, '<for>', 'eval')
+
+    @staticmethod
+    def bind(names, item):
+        if len(names) == 1:
+            return {names[0]: item}
+        values = tuple(item)
+        if len(values) > len(names):
+            raise ValueError(
+                f'too many values to unpack (expected {len(names)})')
+        elif len(values) < len(names):
+            raise ValueError(
+                f'not enough values to unpack '
+                f'(expected {len(names)}, got {len(values)})'
+            )
+        return dict(zip(names, values))
+
+    def scopes(self, loader, ctx):
+        '''Yields the loop variables to push onto the Context for each
+        iteration, evaluating the iterable lazily.
+        '''
+        names, code = self.header
+        iterable = eval(code, get_globals(loader, ctx), ctx)
+        if not hasattr(iterable, '__iter__'):
+            iterable = resolve_iterable(iterable)
+        for item in iterable:
+            yield self.bind(names, item)
+
+    def render_items(self, loader, ctx, tmpl):
         value = []
-        globals = get_globals(loader, ctx)
-        for i in eval(expr, globals, ctx):
-            with ctx.push():
-                with ctx.push({'i': i}, 1):
-                    exec(f'{names} = i', globals, ctx)
+        for scope in self.scopes(loader, ctx):
+            with ctx.push(scope):
                 node = maybe_render(tmpl, loader, ctx)
                 if node is not None:
                     value.append(node)
@@ -197,9 +604,23 @@ class ForNode(yaml.ScalarNode):
             yaml.SequenceNode, None, (None, None))
         return ForResult(tag, value)
 
+    def render_object_items(self, loader, ctx, tmpl):
+        if self.subtag not in (None, SEQUENCE_TAG):
+            return construct_result(
+                loader, self.render_items(loader, ctx, tmpl))
+        items = ForItems()
+        for scope in self.scopes(loader, ctx):
+            with ctx.push(scope):
+                item = maybe_render_object(tmpl, loader, ctx)
+                if item is not NOTHING:
+                    items.append(as_data(loader, item))
+        return items
+
     def render(self, loader, ctx):
         raise RenderError("can't render a ForNode", self.start_mark)
 
+    render_object = render
+
     def _detemplify(self, loader, implicit=True, deep=False):
         raise ConstructorError(
             "can't construct a ForNode", self.start_mark)
@@ -224,6 +645,10 @@ class SetterNode(MappingTemplateNode):
         )
         return None
 
+    def render_object(self, loader, ctx):
+        self.render(loader, ctx)
+        return NOTHING
+
 
 class ExpressionNode(ScalarTemplateNode):
     '''Represents a :tmpl:tag:`$` node.
@@ -233,15 +658,35 @@ class ExpressionNode(ScalarTemplateNode):
     '''
     basetag = '$'
 
+    @functools.cached_property
+    def expr(self):
+        '''The parsed expression, with constant subexpressions folded.
+
+        Parsed on first use, and shared with any other node having the same
+        expression text through :data:`expression_cache`.
+        '''
+        return expression_cache.get_or_create(self.value, compile_expr)
+
+    @functools.cached_property
+    def compiled(self):
+        '''The expression, compiled to a function of the Context.'''
+        return self.expr.compile()
+
     def render(self, loader, ctx):
-        expr = parse_expr(self.value)
-        globals = get_globals(loader, ctx)
-        with ctx.push(globals, len(ctx.maps)):
-            value = expr.evaluate(ctx)
+        value = self.compiled(get_scope(loader, ctx))
         if isinstance(value, yaml.Node):
             return maybe_render(value, loader, ctx)
         return self.make_result_node(loader, value, implicit=False)
 
+    def render_object(self, loader, ctx):
+        value = self.compiled(get_scope(loader, ctx))
+        if isinstance(value, yaml.Node):
+            return maybe_render_object(value, loader, ctx)
+        if self.subtag is None:
+            return value
+        return construct_result(
+            loader, self.make_result_node(loader, value, implicit=False))
+
 
 class FormatStringNode(ScalarTemplateNode):
     '''Represents a :tmpl:tag:`$f` node.
@@ -250,10 +695,33 @@ class FormatStringNode(ScalarTemplateNode):
     '''
     basetag = '$f'
 
+    @functools.cached_property
+    def fields(self):
+        '''The names of the variables referenced by the format-string.'''
+        return frozenset(format_fields(self.value))
+
+    def format(self, loader, ctx):
+        '''Formats the format-string with values from the Context.'''
+        dct = {name: ctx[name] for name in self.fields if name in ctx}
+        if len(dct) < len(self.fields):
+            for name, value in get_globals(loader, ctx).items():
+                if name in self.fields:
+                    dct.setdefault(name, value)
+        return self.value.format_map(dct)
+
     def render(self, loader, ctx):
-        dct = get_globals(loader, ctx)
-        dct.update(ctx)
-        return self.make_result_node(loader, self.value.format_map(dct))
+        return self.make_result_node(loader, self.format(loader, ctx))
+
+    def render_object(self, loader, ctx):
+        value = self.format(loader, ctx)
+        tag = self.subtag or resolve_scalar(
+            loader, value, (True, False), getattr(loader, 'stats', None))
+        if tag == STR_TAG:
+            return value
+        return loader.construct_object(
+            yaml.ScalarNode(tag, value, self.start_mark, self.end_mark),
+            deep=True
+        )
 
 
 class IfNode(SequenceTemplateNode):
@@ -265,19 +733,35 @@ class IfNode(SequenceTemplateNode):
     '''
     basetag = 'if'
 
-    def render(self, loader, ctx):
+    def select(self, test):
+        '''Returns the first matching node, the default node, or
+        :const:`None`.
+
+        :param callable test: Called with each test node, returns whether it
+           matches.
+        '''
         rest = self.value
         if len(rest) < 2:
             raise ValueError('expecting more')
         while rest:
             if len(rest) == 1:
                 result, = rest
-                break
-            test, result, *rest = rest
-            if loader.construct_object(
-                maybe_render(test, loader, ctx), deep=True
-            ):
-                break
-        else:
+                return result
+            node, result, *rest = rest
+            if test(node):
+                return result
+        return None
+
+    def render(self, loader, ctx):
+        result = self.select(lambda test: loader.construct_object(
+            maybe_render(test, loader, ctx), deep=True))
+        if result is None:
             return None
         return maybe_render(result, loader, ctx)
+
+    def render_object(self, loader, ctx):
+        result = self.select(lambda test: as_data(
+            loader, maybe_render_object(test, loader, ctx)))
+        if result is None:
+            return NOTHING
+        return maybe_render_object(result, loader, ctx)
@@ -0,0 +1,204 @@
+# Copyright (c) 2022, Sadie Hain. All rights reserved.
+# Released under the BSD 3-Clause License
+# https://enyaml.org/LICENSE
+
+"""
+Rendering selected parts of template documents.
+
+A path such as ``services.api.env`` names a value within a rendered document:
+each component is a mapping key (compared with the string form of the rendered
+keys), or the index of a sequence item. Only the nodes needed to produce the
+value are rendered: the keys of the mappings along the path, the items which
+precede the selected one in sequences, and any nodes containing
+:tmpl:tag:`set` nodes which could affect the value. Everything else is
+skipped.
+"""
+
+__all__ = [
+    'parse_path',
+    'PathNotFoundError',
+    'Selector',
+]
+
+from collections.abc import Mapping
+from .nodes import (
+    NOTHING, ForItems, IfNode, MappingTemplateNode, SequenceTemplateNode,
+    as_data, maybe_render_object,
+)
+from .lazy import is_for_loop, is_lazy, may_set
+
+
+def parse_path(path):
+    """Splits a dotted path into its components.
+
+    :param path: A string like ``services.api.env``, or a sequence of
+       components.
+    :return: A tuple of components.
+    """
+    if isinstance(path, str):
+        return tuple(path.split('.')) if path else ()
+    return tuple(path)
+
+
+class PathNotFoundError(LookupError):
+    """Raised when a selected path isn't in a rendered document. The argument
+    is the path, up to the first component which wasn't found.
+    """
+
+
+def key_matches(key, part):
+    return key == part or str(key) == str(part)
+
+
+def path_error(parts, rest):
+    """The error for a path which isn't found, at the first of `rest`."""
+    found = parts[:len(parts) - len(rest) + 1]
+    return PathNotFoundError('.'.join(map(str, found)))
+
+
+def select_data(data, parts, rest):
+    """Follows the `rest` of a path through rendered data."""
+    for i, part in enumerate(rest):
+        if isinstance(data, Mapping):
+            for key in data:
+                if key_matches(key, part):
+                    data = data[key]
+                    break
+            else:
+                raise path_error(parts, rest[i:])
+        elif isinstance(data, (list, tuple)):
+            try:
+                data = data[int(part)]
+            except (ValueError, IndexError):
+                raise path_error(parts, rest[i:]) from None
+        else:
+            raise path_error(parts, rest[i:])
+    return data
+
+
+class Selector:
+    """Renders the value at a path within a template document.
+
+    :param loader: The loader to render with.
+    :param Context ctx: The Context to render with.
+    :param path: The path to select, as accepted by :func:`parse_path`.
+    """
+
+    def __init__(self, loader, ctx, path):
+        self.loader = loader
+        self.ctx = ctx
+        self.parts = parse_path(path)
+
+    def select(self, node):
+        """Renders the value at the path within `node`.
+
+        :param yaml.Node node: A composed document node.
+        :return: The selected data, or :data:`~enyaml.nodes.NOTHING` if the
+           document produces no output.
+        :raises PathNotFoundError: when the path isn't in the rendered
+           document.
+        """
+        if '~' in getattr(node, 'flags', ''):
+            data = as_data(
+                self.loader, node.render_object(self.loader, self.ctx))
+            if data is NOTHING:
+                return data
+            return select_data(data, self.parts, self.parts)
+        return self.node(node, self.parts)
+
+    def render(self, node):
+        return maybe_render_object(node, self.loader, self.ctx)
+
+    def choose(self, node):
+        """Returns the node chosen by an :tmpl:tag:`if` node (or `node`
+        itself, if it isn't one), or :const:`None`.
+        """
+        while isinstance(node, IfNode) and '~' not in node.flags:
+            node = node.select(lambda test: as_data(
+                self.loader, self.render(test)))
+        return node
+
+    def node(self, node, rest):
+        node = self.choose(node)
+        if node is None:
+            return NOTHING
+        if not rest:
+            return as_data(self.loader, self.render(node))
+        elif is_for_loop(node):
+            return self.sequence([node], rest)
+        elif type(node) is SequenceTemplateNode and is_lazy(node):
+            return self.sequence(node.value, rest)
+        elif type(node) is MappingTemplateNode and is_lazy(node):
+            return self.mapping(node, rest)
+        data = as_data(self.loader, self.render(node))
+        if data is NOTHING:
+            return data
+        return select_data(data, self.parts, rest)
+
+    def mapping(self, node, rest):
+        part = rest[0]
+        result = NOTHING
+        for key_node, value_node in node.value:
+            key = as_data(self.loader, self.render(key_node))
+            if key is not NOTHING and key_matches(key, part):
+                value = self.node(value_node, rest[1:])
+                if value is not NOTHING:
+                    result = value
+            elif may_set(value_node):
+                self.render(value_node)
+        if result is NOTHING:
+            raise path_error(self.parts, rest)
+        return result
+
+    def sequence(self, items, rest):
+        try:
+            index = int(rest[0])
+        except ValueError:
+            raise path_error(self.parts, rest) from None
+        if index < 0:
+            data = []
+            for item in items:
+                data.extend(self.items(item))
+            return select_data(data, self.parts, rest)
+        count = 0
+        for item in items:
+            item = self.choose(item)
+            if item is None:
+                continue
+            elif is_for_loop(item):
+                for_node, body = item.value[0]
+                for scope in for_node.scopes(self.loader, self.ctx):
+                    with self.ctx.push(scope):
+                        if count == index:
+                            value = self.node(body, rest[1:])
+                        elif is_lazy(body):
+                            count += 1
+                            continue
+                        else:
+                            value = as_data(self.loader, self.render(body))
+                    if value is not NOTHING:
+                        if count == index:
+                            return value
+                        count += 1
+            elif is_lazy(item) and not may_set(item):
+                if count == index:
+                    return self.node(item, rest[1:])
+                count += 1
+            else:
+                values = self.items(item)
+                if count + len(values) > index:
+                    return select_data(
+                        values[index - count], self.parts, rest[1:])
+                count += len(values)
+        raise path_error(self.parts, rest)
+
+    def items(self, item):
+        """Renders a sequence item whole, returning the items it adds to the
+        sequence.
+        """
+        value = self.render(item)
+        if value is NOTHING:
+            return []
+        elif isinstance(value, ForItems):
+            return value
+        return [value]
@@ -0,0 +1,392 @@
+# Copyright (c) 2022, Sadie Hain. All rights reserved.
+# Released under the BSD 3-Clause License
+# https://enyaml.org/LICENSE
+
+__all__ = [
+    'TemplateSet',
+    'Template',
+]
+
+import io
+import pickle
+import functools
+from yaml.composer import ComposerError
+from .nodes import NOTHING, referenced_names
+from .util import Context
+from .loader import TemplateLoader
+from .dumper import RenderedDumper
+from .events import EventRenderer, emit_rendered
+from .cache import dump_nodes
+from . import aio
+
+
+def restore(cls, Loader, data):
+    tmpl = cls.__new__(cls)
+    tmpl.Loader = Loader
+    tmpl.nodes = pickle.loads(data)
+    return tmpl
+
+
+class TemplateSet:
+    """A stream of template documents which is composed once, and can then be
+    rendered any number of times.
+
+    The stream is read, parsed and composed when the TemplateSet is created.
+    Rendering only walks the composed node graph, using a fresh loader for
+    each call, so the same TemplateSet can be rendered repeatedly.
+
+    A TemplateSet can also be rendered from several threads at once. Each
+    call keeps its render state on its own loader, and the composed nodes are
+    only read; what is computed from them on first use (parsed expressions,
+    compiled :tmpl:tag:`for` headers and the results of static nodes) is the
+    same whichever thread computes it first, so threads racing to compute it
+    at worst duplicate the work.
+    Each concurrent call needs its own :class:`.Context`, or its own layer
+    over a shared one (see :meth:`.Context.new_child`), and its own
+    :class:`.RenderStats`, if any. Lazily rendered results must only be used
+    by one thread at a time.
+
+    :param file-like stream: The stream to read the templates from.
+    :param Loader: The loader class to compose and render with.
+    :param GraphCache cache: A cache to load the composed documents from,
+       and to store them in if they aren't there. See :mod:`enyaml.cache`.
+
+    .. testsetup::
+
+       from enyaml import Context, TemplateSet
+
+    >>> tmpl = TemplateSet('--- !$ a\\n--- !$ a + 1\\n')
+    >>> list(tmpl.render_all(Context({'a': 1})))
+    [1, 2]
+    >>> list(tmpl.render_all(Context({'a': 10})))
+    [10, 11]
+    """
+
+    def __init__(self, stream, Loader=TemplateLoader, cache=None):
+        self.Loader = Loader
+        if cache is None:
+            self.nodes = self.compose(stream)
+            return
+        name = getattr(stream, 'name', None)
+        if hasattr(stream, 'read'):
+            stream = stream.read()
+        key = cache.key(stream, Loader, name)
+        self.nodes = cache.get(key)
+        if self.nodes is None:
+            self.nodes = self.compose(stream, name)
+            cache.put(key, self.nodes)
+
+    def compose(self, stream, name=None):
+        """Composes the template documents in `stream`.
+
+        :param str name: The name of the stream to use in error messages, if
+           it has been read into a string already.
+        :return: A list of document nodes.
+        """
+        loader = self.Loader(stream)
+        try:
+            if name is not None:
+                loader.name = name
+            return list(loader.compose_nodes())
+        finally:
+            loader.dispose()
+
+    def __reduce__(self):
+        # Pickled the same way as by GraphCache, so that compiled for
+        # headers survive, e.g. when sent to worker processes.
+        return restore, (type(self), self.Loader, dump_nodes(self.nodes))
+
+    @functools.cached_property
+    def names(self):
+        """The names the templates may look up when rendered. See
+        :func:`~enyaml.nodes.referenced_names`.
+        """
+        return referenced_names(self.nodes)
+
+    def make_loader(self, stats=None, ctx=None):
+        """Creates a loader to render with.
+
+        :param RenderStats stats: The statistics object for the loader to
+           collect in, instead of a new one.
+        :param Context ctx: The Context which will be rendered with. Its
+           :attr:`~.Context.stats` are set to the loader's.
+        :return: A new instance of :attr:`Loader` which is not bound to any
+           input.
+        """
+        loader = self.Loader('')
+        if stats is not None:
+            loader.stats = stats
+        if isinstance(ctx, Context):
+            ctx.stats = loader.stats
+        return loader
+
+    def render_all(self, ctx, stats=None):
+        """Renders the template documents.
+
+        :param Context ctx: The Context with which to render.
+        :param RenderStats stats: Collects statistics about the render, if
+           given.
+        :return: An iterable containing rendered data.
+
+        Only documents which produce output when rendered will be included in
+        the result.
+        """
+        loader = self.make_loader(stats, ctx)
+        try:
+            for node in self.nodes:
+                node = loader.render_node(node, ctx)
+                if node:
+                    yield loader.construct_document(node)
+        finally:
+            loader.dispose()
+
+    async def render_all_async(self, ctx, stats=None):
+        """Renders the template documents from a coroutine, awaiting the
+        awaitable values in the Context first. See :mod:`enyaml.aio`.
+
+        :param Context ctx: The Context with which to render.
+        :param RenderStats stats: Collects statistics about the render, if
+           given.
+        :return: A list containing rendered data.
+        """
+        return await aio.render_async(
+            self, ctx, lambda ctx: list(self.render_all(ctx, stats)))
+
+    def render_all_direct(self, ctx, stats=None):
+        """Renders the template documents straight to Python data.
+
+        Like :meth:`render_all`, but without creating the rendered nodes. See
+        :meth:`.BaseTemplateLoader.render_node_data`.
+
+        :param Context ctx: The Context with which to render.
+        :param RenderStats stats: Collects statistics about the render, if
+           given.
+        :return: An iterable containing rendered data.
+        """
+        loader = self.make_loader(stats, ctx)
+        try:
+            for node in self.nodes:
+                data = loader.render_node_data(node, ctx)
+                if data is not NOTHING:
+                    yield data
+        finally:
+            loader.dispose()
+
+    def render_all_lazy(self, ctx, stats=None):
+        """Renders the template documents lazily.
+
+        Like :meth:`render_all`, but collections are rendered to views whose
+        items are rendered on first access. See :mod:`enyaml.lazy`.
+
+        :param Context ctx: The Context with which to render.
+        :param RenderStats stats: Collects statistics about the render, if
+           given.
+        :return: An iterable containing rendered data.
+        """
+        loader = self.make_loader(stats, ctx)
+        for node in self.nodes:
+            data = loader.render_node_lazy(node, ctx)
+            if data is not NOTHING:
+                yield data
+
+    def select_all(self, ctx, path, stats=None):
+        """Renders the value at a path within each template document,
+        skipping the parts of the documents which aren't needed for it. See
+        :mod:`enyaml.selector`.
+
+        :param Context ctx: The Context with which to render.
+        :param path: The path to select, e.g. ``services.api.env``.
+        :param RenderStats stats: Collects statistics about the render, if
+           given.
+        :return: An iterable containing the selected data from each document
+           which produces output.
+        :raises ~enyaml.selector.PathNotFoundError: when the path isn't in
+           a rendered document.
+        """
+        loader = self.make_loader(stats, ctx)
+        try:
+            for node in self.nodes:
+                data = loader.select_node_data(node, ctx, path)
+                if data is not NOTHING:
+                    yield data
+        finally:
+            loader.dispose()
+
+    def render_events(self, ctx, Dumper=RenderedDumper, stats=None):
+        """Renders the template documents to serialization events.
+
+        :param Context ctx: The Context with which to render.
+        :param RenderStats stats: Collects statistics about the render, if
+           given.
+        :param Dumper: The dumper class used to represent rendered values.
+        :return: An iterable of :class:`yaml.Event` objects.
+
+        See :class:`~enyaml.events.EventRenderer`.
+        """
+        loader = self.make_loader(stats, ctx)
+        try:
+            renderer = EventRenderer(loader, Dumper(io.StringIO()))
+            yield from renderer.render_stream(self.nodes, ctx)
+        finally:
+            loader.dispose()
+
+    def render_to_stream(
+        self, ctx, stream=None, Dumper=RenderedDumper, stats=None, **kwds
+    ):
+        """Renders the template documents, and writes them to `stream` as
+        YAML.
+
+        :param Context ctx: The Context with which to render.
+        :param RenderStats stats: Collects statistics about the render, if
+           given.
+        :param file-like stream: The stream to write to.
+        :param Dumper: The dumper class to emit with.
+        :param kwds: Passed on to the `Dumper`.
+        :return: The output, if `stream` is :const:`None`.
+        """
+        loader = self.make_loader(stats, ctx)
+        try:
+            return emit_rendered(
+                loader, self.nodes, ctx, stream, Dumper, **kwds)
+        finally:
+            loader.dispose()
+
+
+class Template(TemplateSet):
+    """A single-document template which is composed once, and can then be
+    rendered any number of times.
+
+    See :class:`TemplateSet`, and :func:`~enyaml.render` for what counts as a
+    single-document template.
+
+    .. testsetup::
+
+       from enyaml import Context, Template
+
+    >>> tmpl = Template('greeting: !$f "Hello, {name}"')
+    >>> tmpl.render(Context({'name': 'Guido'}))
+    {'greeting': 'Hello, Guido'}
+    """
+
+    def _render_single(self, ctx, render, stats):
+        loader = self.make_loader(stats, ctx)
+        try:
+            nodes = iter(self.nodes)
+            for node in nodes:
+                rendered = render(loader, node)
+                if rendered is not NOTHING:
+                    break
+            else:
+                return None
+            next_node = next(nodes, None)
+            if next_node is not None:
+                raise ComposerError(
+                    'expected a single document in the stream',
+                    node.start_mark,
+                    'but found another document', next_node.start_mark
+                )
+            return rendered
+        finally:
+            loader.dispose()
+
+    def render(self, ctx, stats=None):
+        """Renders the template.
+
+        :param Context ctx: The Context with which to render.
+        :param RenderStats stats: Collects statistics about the render, if
+           given.
+        :return: The rendered data.
+        :raises yaml.composer.ComposerError: when there are more than one
+           document in the stream which produce output when rendered, or the
+           document which produces output is not the last document in the
+           stream.
+        """
+        def render(loader, node):
+            rendered = loader.render_node(node, ctx)
+            if rendered:
+                return loader.construct_document(rendered)
+            return NOTHING
+        return self._render_single(ctx, render, stats)
+
+    async def render_async(self, ctx, stats=None):
+        """Renders the template from a coroutine, awaiting the awaitable
+        values in the Context first. See :mod:`enyaml.aio`.
+
+        :param Context ctx: The Context with which to render.
+        :param RenderStats stats: Collects statistics about the render, if
+           given.
+        :return: The rendered data.
+
+        >>> import asyncio
+        >>> from enyaml import Context, Template
+        >>> async def fetch_name():
+        ...     return 'Guido'
+        >>> tmpl = Template('greeting: !$f "Hello, {name}"')
+        >>> asyncio.run(tmpl.render_async(Context({'name': fetch_name()})))
+        {'greeting': 'Hello, Guido'}
+        """
+        return await aio.render_async(
+            self, ctx, lambda ctx: self.render(ctx, stats))
+
+    def select(self, ctx, path, stats=None):
+        """Renders the value at a path within the template, skipping the
+        parts of the document which aren't needed for it. See
+        :mod:`enyaml.selector`.
+
+        :param Context ctx: The Context with which to render.
+        :param path: The path to select, e.g. ``services.api.env``.
+        :param RenderStats stats: Collects statistics about the render, if
+           given.
+        :return: The selected data.
+        :raises ~enyaml.selector.PathNotFoundError: when the path isn't in
+           the rendered document.
+        """
+        return self._render_single(
+            ctx,
+            lambda loader, node: loader.select_node_data(node, ctx, path),
+            stats
+        )
+
+    def render_lazy(self, ctx, stats=None):
+        """Renders the template lazily.
+
+        Like :meth:`render`, but collections are rendered to views whose
+        items are rendered on first access. See :mod:`enyaml.lazy`.
+
+        :param Context ctx: The Context with which to render.
+        :param RenderStats stats: Collects statistics about the render, if
+           given.
+        :return: The rendered data.
+        """
+        loader = self.make_loader(stats, ctx)
+        nodes = iter(self.nodes)
+        for node in nodes:
+            data = loader.render_node_lazy(node, ctx)
+            if data is not NOTHING:
+                break
+        else:
+            return None
+        next_node = next(nodes, None)
+        if next_node is not None:
+            raise ComposerError(
+                'expected a single document in the stream',
+                node.start_mark,
+                'but found another document', next_node.start_mark
+            )
+        return data
+
+    def render_direct(self, ctx, stats=None):
+        """Renders the template straight to Python data.
+
+        Like :meth:`render`, but without creating the rendered nodes. See
+        :meth:`.BaseTemplateLoader.render_node_data`.
+
+        :param Context ctx: The Context with which to render.
+        :param RenderStats stats: Collects statistics about the render, if
+           given.
+        :return: The rendered data.
+        """
+        return self._render_single(
+            ctx, lambda loader, node: loader.render_node_data(node, ctx),
+            stats
+        )
@@ -4,10 +4,17 @@
 
 __all__ = [
     'Context',
+    'LazyValue',
+    'LRUCache',
+    'RenderStats',
 ]
 
+import time
+import functools
+from threading import Lock
 from contextlib import contextmanager
-from collections import ChainMap
+from collections import ChainMap, OrderedDict, namedtuple
+from collections.abc import Mapping
 
 
 class Context(ChainMap):
@@ -29,8 +36,215 @@ class Context(ChainMap):
     {'foo': 2, 'bar': 3}
     >>> dict(c)
     {'foo': 1}
+
+    Lookups are served from a view of which scope defines each key, so their
+    cost doesn't depend on how deeply scopes are nested. The view is kept up
+    to date as scopes are pushed and popped, as items are set or deleted
+    through the Context, and as :attr:`maps` is changed. The innermost scope
+    is always looked in first, and other values are read from the scope
+    which defines them, so changes made directly to the mappings are seen,
+    as with a :class:`~collections.ChainMap`:
+
+    >>> d = {'foo': 1}
+    >>> c = Context(d).new_child()
+    >>> d['foo'] = 2
+    >>> c['foo']
+    2
+    >>> c.maps[0].update(foo=3)
+    >>> c['foo'], (c | {'foo': 4})['foo']
+    (3, 4)
+
+    The one change which isn't seen is adding a key directly to a mapping
+    other than the innermost, in front of the scope which already defines
+    it; a call to :meth:`rebuild` is needed after that.
+
+    A Context is modified while rendering with it (scopes are pushed, and
+    :tmpl:tag:`set` nodes assign to it), so it must only be used by one render
+    at a time. To render several times at once with the same values, give each
+    render its own layer over them with :meth:`new_child`. The layers share the
+    underlying mappings, which must not be modified while they are in use, but
+    scopes and assignments only affect the layer they are made in:
+
+    >>> base = Context({'foo': 1})
+    >>> layer = base.new_child()
+    >>> layer['foo'] = 2
+    >>> base['foo'], layer['foo']
+    (1, 2)
+
+    Values which are expensive to compute, and may not be used, can be set as
+    :class:`LazyValue` objects, which are computed when first looked up.
+
+    .. attribute:: stats
+
+       The :class:`RenderStats` to count computed :class:`LazyValue` objects
+       in. Set by each render using the Context.
     """
 
+    stats = None
+
+    @property
+    def maps(self):
+        """The list of scopes, innermost first. Changing it updates the
+        Context.
+        """
+        return self._maps
+
+    @maps.setter
+    def maps(self, maps):
+        self._maps = Scopes(self, maps)
+        self.rebuild()
+
+    def __reduce__(self):
+        state = self.__dict__.copy()
+        for name in ('_maps', '_scopes', '_lazy'):
+            del state[name]
+        return type(self), tuple(self._maps), state or None
+
+    def rebuild(self):
+        """Rebuilds the view of the Context from its scopes."""
+        scopes = {}
+        lazy = {}
+        for mapping in reversed(self._maps):
+            for key, value in mapping.items():
+                # Unrealized LazyValues are kept apart, so that looking up
+                # other values doesn't have to check for them.
+                if type(value) is LazyValue:
+                    lazy[key] = mapping
+                    scopes.pop(key, None)
+                else:
+                    scopes[key] = mapping
+                    lazy.pop(key, None)
+        self._scopes = scopes
+        self._lazy = lazy
+
+    def _refresh(self, keys):
+        for key in keys:
+            for mapping in self._maps:
+                if key in mapping:
+                    if type(mapping[key]) is LazyValue:
+                        self._lazy[key] = mapping
+                        self._scopes.pop(key, None)
+                    else:
+                        self._scopes[key] = mapping
+                        if self._lazy:
+                            self._lazy.pop(key, None)
+                    break
+            else:
+                self._scopes.pop(key, None)
+                self._lazy.pop(key, None)
+
+    def _realize(self, key, mapping):
+        value = mapping[key]
+        if type(value) is LazyValue:
+            lazy = value
+            value, computed = lazy.realize()
+            if computed and self.stats is not None:
+                self.stats.lazy_realized += 1
+            # The value replaces the LazyValue in the scope which defined it,
+            # so it is discarded along with that scope.
+            try:
+                mapping[key] = value
+            except TypeError:
+                return value
+        self._lazy.pop(key, None)
+        self._scopes[key] = mapping
+        return value
+
+    def __getitem__(self, key):
+        front = self._maps[0]
+        if key in front:
+            value = front[key]
+            if type(value) is LazyValue:
+                return self._realize(key, front)
+            return value
+        try:
+            return self._scopes[key][key]
+        except KeyError:
+            return self.__missing__(key)
+
+    def __missing__(self, key):
+        # The key may have been added to, or deleted from, a scope directly.
+        self._refresh((key,))
+        try:
+            return self._scopes[key][key]
+        except KeyError:
+            pass
+        try:
+            mapping = self._lazy[key]
+        except KeyError:
+            raise KeyError(key) from None
+        return self._realize(key, mapping)
+
+    def __contains__(self, key):
+        if key in self._maps[0]:
+            return True
+        try:
+            if key in self._scopes[key]:
+                return True
+        except KeyError:
+            pass
+        self._refresh((key,))
+        return key in self._scopes or key in self._lazy
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        mapping = self._maps[0]
+        mapping[key] = value
+        if type(value) is LazyValue:
+            self._refresh((key,))
+        else:
+            self._scopes[key] = mapping
+            if self._lazy:
+                self._lazy.pop(key, None)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._refresh((key,))
+
+    def pop(self, key, *args):
+        try:
+            return super().pop(key, *args)
+        finally:
+            self._refresh((key,))
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._refresh((key,))
+        return key, value
+
+    def clear(self):
+        keys = list(self.maps[0])
+        super().clear()
+        self._refresh(keys)
+
+    def snapshot(self):
+        """Returns a new Context holding the current contents of this one,
+        flattened into a single scope.
+        """
+        flat = {key: mapping[key] for key, mapping in self._scopes.items()}
+        flat.update(
+            (key, mapping[key]) for key, mapping in self._lazy.items())
+        flat.update(self._maps[0])
+        ctx = type(self)(flat)
+        ctx.stats = self.stats
+        return ctx
+
+    def __or__(self, other):
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        ctx = self.copy()
+        ctx.update(other)
+        return ctx
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
     @contextmanager
     def push(self, dct=None, pos=0):
         """Push a :term:`mapping` onto the Context as a new scope.
@@ -68,8 +282,245 @@ class Context(ChainMap):
 
         if dct is None:
             dct = {}
-        self.maps.insert(pos, dct)
+        # Only the keys of the pushed mapping need refreshing, so the list is
+        # changed without rebuilding the whole view.
+        list.insert(self._maps, pos, dct)
+        self._refresh(dct)
         try:
             yield self
         finally:
-            del self.maps[pos]
+            list.__delitem__(self._maps, pos)
+            self._refresh(dct)
+
+
+class LazyValue:
+    """A Context value which is computed when it is first looked up.
+
+    The value is computed by calling `factory` with no arguments, and then
+    replaces the LazyValue in the scope of the Context which defined it. If it
+    is never looked up, `factory` is never called. Testing whether the Context
+    contains its key, with ``in``, doesn't compute it, but iterating over the
+    items or values of the Context does.
+
+    The value is computed once, even if the LazyValue is shared between
+    several Contexts (by :meth:`Context.snapshot`, or layers made with
+    :meth:`~Context.new_child`) which are used from different threads. If
+    `factory` raises an exception, nothing is cached, and it is called again
+    on the next lookup.
+
+    :param callable factory: Returns the value.
+
+    .. testsetup::
+
+       from enyaml import Context, LazyValue
+
+    >>> def inventory():
+    ...     print('loading')
+    ...     return ['a', 'b']
+    >>> c = Context({'inventory': LazyValue(inventory)})
+    >>> c['inventory']
+    loading
+    ['a', 'b']
+    >>> c['inventory']
+    ['a', 'b']
+    """
+
+    __slots__ = ('factory', 'value', '_lock')
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._lock = Lock()
+
+    def realize(self):
+        """Computes the value, if it hasn't been already.
+
+        :return: A tuple of the value, and whether it was computed by this
+           call.
+        """
+        if self.factory is None:
+            return self.value, False
+        with self._lock:
+            if self.factory is None:
+                return self.value, False
+            self.value = self.factory()
+            self.factory = None
+            return self.value, True
+
+    def __repr__(self):
+        if self.factory is None:
+            return f'{type(self).__name__}(<realized: {self.value!r}>)'
+        return f'{type(self).__name__}({self.factory!r})'
+
+
+class Scopes(list):
+    """The list of a :class:`Context`'s scopes, which rebuilds its view when
+    it is changed.
+    """
+
+    __slots__ = ('ctx',)
+
+    def __init__(self, ctx, maps=()):
+        super().__init__(maps)
+        self.ctx = ctx
+
+
+def _rebuilds(name):
+    method = getattr(list, name)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwds):
+        try:
+            return method(self, *args, **kwds)
+        finally:
+            self.ctx.rebuild()
+    return wrapper
+
+
+for _name in (
+    '__setitem__', '__delitem__', '__iadd__', '__imul__', 'append', 'extend',
+    'insert', 'pop', 'remove', 'clear', 'reverse', 'sort',
+):
+    setattr(Scopes, _name, _rebuilds(_name))
+del _name
+
+
+CacheInfo = namedtuple(
+    'CacheInfo', 'hits misses evictions maxsize currsize')
+
+
+class LRUCache:
+    """A bounded, thread-safe mapping which discards the least recently used
+    entries once full.
+
+    :param int maxsize: The maximum number of entries to keep.
+    :param float ttl: The number of seconds after which an entry expires, and
+       is discarded (and counted as an eviction) the next time it is looked
+       up. Entries don't expire by default.
+    :param callable clock: Returns the current time in seconds, for `ttl`.
+
+    .. testsetup::
+
+       from enyaml.util import LRUCache
+
+    >>> cache = LRUCache(2)
+    >>> cache.get_or_create('a', str.upper)
+    'A'
+    >>> cache.get_or_create('a', str.upper)
+    'A'
+    >>> cache.get_or_create('b', str.upper)
+    'B'
+    >>> cache.get_or_create('c', str.upper)
+    'C'
+    >>> cache.info()
+    CacheInfo(hits=1, misses=3, evictions=1, maxsize=2, currsize=2)
+    """
+
+    def __init__(self, maxsize=128, ttl=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()
+        self._expires = {}
+        self._lock = Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data and not self._expired(key)
+
+    def _expired(self, key):
+        expires = self._expires.get(key)
+        return expires is not None and expires <= self.clock()
+
+    def get_or_create(self, key, factory):
+        """Returns the entry for `key`, creating it if necessary.
+
+        :param key: The key to look up.
+        :param callable factory: Called with `key` to create the entry when it
+           is not cached. Exceptions propagate, and nothing is cached.
+        :return: The cached or newly created entry.
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                if not self._expires or not self._expired(key):
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key], self._expires[key]
+                self.evictions += 1
+                self.misses += 1
+        value = factory(key)
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if self.ttl is not None:
+                self._expires[key] = self.clock() + self.ttl
+            while len(self._data) > max(self.maxsize, 0):
+                self._expires.pop(self._data.popitem(last=False)[0], None)
+                self.evictions += 1
+        return value
+
+    def info(self):
+        """Reports cache statistics.
+
+        :return: A :class:`CacheInfo` named tuple of ``hits``, ``misses``,
+           ``evictions``, ``maxsize`` and ``currsize``.
+        """
+        with self._lock:
+            return CacheInfo(
+                self.hits, self.misses, self.evictions,
+                self.maxsize, len(self._data)
+            )
+
+    def clear(self):
+        """Discards all entries and resets the statistics."""
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+class RenderStats:
+    """Counters collected while rendering.
+
+    Each loader collects statistics in its :attr:`stats` attribute; the
+    rendering methods of :class:`.TemplateSet` and :class:`.Template` accept
+    a RenderStats instance to collect them in.
+
+    .. attribute:: resolve_hits
+
+       The number of rendered scalars whose tag was found in the implicit
+       resolution cache.
+
+    .. attribute:: resolve_misses
+
+       The number of rendered scalars whose tag had to be resolved.
+
+    .. attribute:: lazy_realized
+
+       The number of :class:`LazyValue` objects in the Context which were
+       computed.
+    """
+
+    def __init__(self):
+        self.resolve_hits = self.resolve_misses = 0
+        self.lazy_realized = 0
+
+    @property
+    def resolve_hit_rate(self):
+        """The fraction of implicit resolutions which were cache hits."""
+        total = self.resolve_hits + self.resolve_misses
+        return self.resolve_hits / total if total else 0.0
+
+    def __repr__(self):
+        return (
+            f'{type(self).__name__}(resolve_hits={self.resolve_hits}, '
+            f'resolve_misses={self.resolve_misses}, '
+            f'lazy_realized={self.lazy_realized})'
+        )
@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+import enyaml
+from enyaml import Context, Template, TemplateSet
+
+
+class FakeSource:
+    """Returns values after a delay, recording how many are in flight."""
+
+    def __init__(self):
+        self.active = self.max_active = self.calls = 0
+
+    async def get(self, value):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            return value
+        finally:
+            self.active -= 1
+
+    async def items(self, n):
+        for i in range(n):
+            await asyncio.sleep(0)
+            yield i
+
+
+@pytest.fixture
+def source():
+    return FakeSource()
+
+
+def test_render_async_gathers(source):
+    names = [f'v{i}' for i in range(40)]
+    tmpl = Template(
+        ''.join(f'{name}: !$ {name}\n' for name in names)
+        + 'label: !$f "{v0}-{v39}"\nplain: !$ plain\n'
+    )
+    ctx = Context({name: source.get(i) for i, name in enumerate(names)})
+    ctx['plain'] = 'x'
+    ctx['unused'] = 'y'
+    result = asyncio.run(tmpl.render_async(ctx))
+    assert result == {
+        **{name: i for i, name in enumerate(names)},
+        'label': '0-39', 'plain': 'x',
+    }
+    assert source.calls == 40
+    assert source.max_active == 40
+    # The Context isn't modified.
+    assert all(asyncio.iscoroutine(ctx[name]) for name in names)
+
+
+def test_render_all_async_for(source):
+    tmpl = TemplateSet(
+        '--- !set {n: !$ count}\n'
+        '---\n- !for x in get(items): !$ x\n'
+        '---\n- !for x in aitems(n): !$ x\n'
+    )
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        ctx = Context({
+            'count': loop.create_task(source.get(3)),
+            'items': [1, 2],
+        })
+        first = await tmpl.render_all_async(ctx)
+        second = await tmpl.render_all_async(ctx)
+        return first, second
+
+    class Loader(enyaml.TemplateLoader):
+        pass
+    Loader.add_builtin('get', source.get)
+    Loader.add_builtin('aitems', source.items)
+    tmpl.Loader = Loader
+    first, second = asyncio.run(main())
+    assert first == second == [[1, 2], [0, 1, 2]]
+
+
+def test_render_async_top_level(source):
+    async def main():
+        ctx = Context({'a': source.get(1), 'b': source.get(2)})
+        single = await enyaml.render_async('[!$ a, !$ b]', ctx)
+        ctx = Context({'a': source.get(1)})
+        every = await enyaml.render_all_async('--- !$ a\n--- !$ a\n', ctx)
+        return single, every
+    assert asyncio.run(main()) == ([1, 2], [1, 1])
+
+
+def test_awaitable_iterable_needs_render_async(source):
+    class Loader(enyaml.TemplateLoader):
+        pass
+    Loader.add_builtin('aitems', source.items)
+    tmpl = Template('- !for x in aitems(2): !$ x\n', Loader)
+    with pytest.raises(TypeError):
+        tmpl.render(Context())
@@ -0,0 +1,46 @@
+import pytest
+from enyaml import Context, Template, TemplateSet
+from enyaml.batch import render_many
+
+
+SOURCE = '!set {double: !$ n * 2}\n---\n{n: !$ n, double: !$ double}\n'
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_render_many(jobs):
+    contexts = ({'n': n} for n in range(20))
+    results = list(render_many(Template(SOURCE), contexts, jobs=jobs))
+    assert results == [{'n': n, 'double': n * 2} for n in range(20)]
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_render_many_unordered(jobs):
+    contexts = [Context({'n': n}) for n in range(10)]
+    results = render_many(
+        TemplateSet('--- !$ n\n--- !$ n + 1\n'), contexts, jobs=jobs,
+        ordered=False, max_pending=3
+    )
+    assert sorted(results) == [(n, [n, n + 1]) for n in range(10)]
+
+
+def test_render_many_bounded():
+    consumed = []
+
+    def contexts():
+        for n in range(100):
+            consumed.append(n)
+            yield {'n': n}
+
+    results = render_many(
+        SOURCE, contexts(), jobs=2, max_pending=4, chunksize=2)
+    assert next(results) == {'n': 0, 'double': 0}
+    assert len(consumed) <= 10
+    results.close()
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_render_many_error(jobs):
+    results = render_many('!$ n', [{'n': 1}, {}], jobs=jobs)
+    assert next(results) == 1
+    with pytest.raises(KeyError):
+        next(results)
@@ -0,0 +1,225 @@
+import io
+import os
+import pytest
+import yaml
+from enyaml import (
+    Context, GraphCache, LazyValue, ResultCache, Template, TemplateSet,
+)
+from enyaml.loader import TemplateLoader, CTemplateLoader
+
+
+SOURCE = '''\
+!set {m: 1}
+---
+items:
+  !for i in n:
+    - !$ i + m
+    - !$f "x{i}"
+flag: !if [!$ n, yes, no]
+'''
+
+
+def entries(cache):
+    return sorted(
+        name for name in os.listdir(cache.directory)
+        if name.endswith('.pickle')
+    )
+
+
+@pytest.mark.parametrize('Loader', [TemplateLoader, CTemplateLoader])
+def test_cache_hit(tmp_path, Loader):
+    cache = GraphCache(tmp_path / 'cache')
+    ctx = lambda: Context({'n': [0, 1, 2]})  # noqa: E731
+    expected = list(TemplateSet(SOURCE, Loader).render_all(ctx()))
+    first = TemplateSet(SOURCE, Loader, cache=cache)
+    second = TemplateSet(SOURCE, Loader, cache=cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert len(entries(cache)) == 1
+    assert list(first.render_all(ctx())) == expected
+    assert list(second.render_all(ctx())) == expected
+    assert list(second.render_all_direct(ctx())) == expected
+    assert second.render_to_stream(ctx()) == first.render_to_stream(ctx())
+
+
+def test_cache_key(tmp_path):
+    cache = GraphCache(tmp_path)
+    keys = {
+        cache.key('a: 1', TemplateLoader),
+        cache.key('a: 2', TemplateLoader),
+        cache.key('a: 1', CTemplateLoader),
+        cache.key('a: 1', TemplateLoader, 'in.yaml'),
+        cache.key(b'a: 1', TemplateLoader),
+    }
+    assert len(keys) == 5
+    assert cache.key('a: 1', TemplateLoader) in keys
+
+
+def test_cache_key_resolvers(tmp_path):
+    class Loader(TemplateLoader):
+        pass
+    cache = GraphCache(tmp_path)
+    key = cache.key('a: 1', Loader)
+    Loader.add_implicit_resolver('!x', yaml.resolver.re.compile('^x$'), 'x')
+    assert cache.key('a: 1', Loader) != key
+
+
+def test_cache_file_name(tmp_path):
+    cache = GraphCache(tmp_path / 'cache')
+    path = tmp_path / 'in.yaml'
+    path.write_text('a: !$ nope\n')
+    for _ in range(2):
+        with open(path) as f:
+            tmpl = Template(f, cache=cache)
+        assert tmpl.nodes[0].start_mark.name == str(path)
+    assert cache.hits == 1
+
+
+def test_cache_corrupt_entry(tmp_path):
+    cache = GraphCache(tmp_path)
+    TemplateSet('a: 1', cache=cache)
+    name, = entries(cache)
+    (tmp_path / name).write_bytes(b'garbage')
+    tmpl = Template('a: 1', cache=cache)
+    assert tmpl.render(Context()) == {'a': 1}
+    assert (cache.hits, cache.misses) == (0, 2)
+    Template('a: 1', cache=cache)
+    assert cache.hits == 1
+
+
+def test_cache_eviction(tmp_path):
+    cache = GraphCache(tmp_path)
+    TemplateSet('a: 1', cache=cache)
+    cache.max_size = os.path.getsize(tmp_path / entries(cache)[0]) * 2
+    old = entries(cache)[0]
+    os.utime(tmp_path / old, (0, 0))
+    TemplateSet('b: 2', cache=cache)
+    assert len(entries(cache)) == 2
+    TemplateSet('c: 3', cache=cache)
+    assert len(entries(cache)) == 2
+    assert old not in entries(cache)
+    assert cache.evictions == 1
+    cache.clear()
+    assert entries(cache) == []
+
+
+def test_cache_stream(tmp_path):
+    cache = GraphCache(tmp_path)
+    for _ in range(2):
+        tmpl = Template(io.StringIO('a: !$ a'), cache=cache)
+        assert tmpl.render(Context({'a': 1})) == {'a': 1}
+    assert cache.hits == 1
+
+
+def test_result_cache():
+    cache = ResultCache()
+    tmpl = Template('!set {b: !$ a}\n---\nb: !$ b\nc: !$ c\n')
+    ctx = Context({'a': [1], 'c': {'d': 2}})
+    result = cache.render(tmpl, ctx)
+    assert result == {'b': [1], 'c': {'d': 2}}
+    assert 'b' not in ctx
+    result['b'].append(2)
+    assert cache.render(tmpl, Context({'c': {'d': 2}, 'a': [1]})) == {
+        'b': [1], 'c': {'d': 2}}
+    assert cache.render(tmpl, Context({'a': [1], 'c': {'d': 3}})) == {
+        'b': [1], 'c': {'d': 3}}
+    assert cache.render(tmpl, Context({'a': [True], 'c': {'d': 3}})) == {
+        'b': [True], 'c': {'d': 3}}
+    assert cache.info() == (1, 3, 0, 128, 3)
+
+
+def test_result_cache_render_all():
+    cache = ResultCache(maxsize=1)
+    tmpl = TemplateSet('--- !$ a\n--- !$ a + 1\n')
+    for a in (1, 1, 2, 1):
+        assert cache.render_all(tmpl, Context({'a': a})) == [a, a + 1]
+    assert cache.info() == (1, 3, 2, 1, 1)
+
+
+def test_result_cache_ttl():
+    now = [0]
+    cache = ResultCache(ttl=5, clock=lambda: now[0])
+    tmpl = Template('!$ a')
+    cache.render(tmpl, Context({'a': 1}))
+    now[0] = 5
+    cache.render(tmpl, Context({'a': 1}))
+    assert cache.info() == (0, 2, 1, 128, 1)
+
+
+def test_result_cache_hash_value():
+    class Point:
+        def __init__(self, x):
+            self.x = x
+
+        def __getitem__(self, name):
+            return getattr(self, name)
+
+        __hash__ = None
+
+    tmpl = Template('!$ p.x')
+    cache = ResultCache()
+    assert cache.render(tmpl, Context({'p': {'x': 1}})) == 1
+    cache.render(tmpl, Context({'p': Point(1)}))
+    assert cache.uncached == 1
+    cache = ResultCache(hash_value=lambda p: p.x)
+    cache.render(tmpl, Context({'p': Point(1)}))
+    cache.render(tmpl, Context({'p': Point(1)}))
+    assert cache.info().hits == 1
+
+
+def test_result_cache_nondeterministic():
+    class Loader(TemplateLoader):
+        pass
+
+    calls = []
+    Loader.add_builtin('tick', lambda: calls.append(1) or [len(calls)], False)
+    cache = ResultCache()
+    tmpl = Template('!for i in tick(): !$ i', Loader)
+    assert cache.render(tmpl, Context()) == [1]
+    assert cache.render(tmpl, Context()) == [2]
+    assert cache.uncached == 2
+    assert cache.info().currsize == 0
+
+
+def test_result_cache_nondeterministic_nested():
+    class Loader(TemplateLoader):
+        pass
+
+    calls = []
+    Loader.add_builtin('tick', lambda: calls.append(1) or len(calls), False)
+    cache = ResultCache()
+    tmpl = Template('!for i in [tick() for _ in [1]]: !$ i', Loader)
+    assert cache.render(tmpl, Context()) == [1]
+    assert cache.render(tmpl, Context()) == [2]
+    assert cache.uncached == 2
+
+
+def test_result_cache_nested_ctx():
+    cache = ResultCache()
+    tmpl = Template('!for i in [ctx["k"] for _ in [1]]: !$ i')
+    assert cache.render(tmpl, Context({'k': 1})) == [1]
+    assert cache.render(tmpl, Context({'k': 2})) == [2]
+    assert cache.info().hits == 0
+
+
+def test_result_cache_lazy_values():
+    calls = []
+
+    def lazy(value):
+        return LazyValue(lambda: calls.append(value) or value)
+
+    cache = ResultCache()
+    tmpl = Template('!$ a')
+    for _ in range(2):
+        ctx = Context({'a': lazy(1), 'unused': lazy(2)})
+        assert cache.render(tmpl, ctx) == 1
+    assert calls == [1, 1]
+    assert cache.info().hits == 1
+    # Templates which may read any name fingerprint the whole Context, so
+    # they aren't cached while it has uncomputed lazy values.
+    tmpl = Template('!$ ctx.a')
+    assert cache.render(tmpl, Context({'a': 1, 'unused': lazy(2)})) == 1
+    assert calls == [1, 1]
+    assert cache.uncached == 1
+    assert cache.render(tmpl, Context({'a': 1})) == 1
+    assert cache.render(tmpl, Context({'a': 1})) == 1
+    assert cache.info().hits == 2
@@ -18,10 +18,15 @@ def roundtrip_file(request):
     return request.param
 
 
+@pytest.fixture(params=(enyaml.TemplateLoader, enyaml.CTemplateLoader))
+def loader_class(request):
+    return request.param
+
+
 @pytest.fixture
-def roundtrip_loader(roundtrip_file):
+def roundtrip_loader(roundtrip_file, loader_class):
     with roundtrip_file.open() as f:
-        yield enyaml.TemplateLoader(f)
+        yield loader_class(f)
 
 
 class SENTINEL:
@@ -36,3 +41,45 @@ def test_roundtrip(ctx, roundtrip_loader, roundtrip_file):
         assert roundtrip_loader.get_data() == 'vvv'
         expected = roundtrip_loader.get_data()
         assert rendered == expected, str(roundtrip_loader.peek_event().start_mark)
+
+
+def test_roundtrip_direct(ctx, roundtrip_loader, roundtrip_file):
+    while roundtrip_loader.check_data():
+        rendered = roundtrip_loader.render_data_direct(ctx)
+        assert roundtrip_loader.get_data() == 'vvv'
+        expected = roundtrip_loader.get_data()
+        assert rendered == expected, str(roundtrip_loader.peek_event().start_mark)
+
+
+def test_render_direct_matches(roundtrip_file):
+    source = roundtrip_file.read_text()
+    expected = list(enyaml.render_all(source, enyaml.Context()))
+    assert list(enyaml.render_all_direct(source, enyaml.Context())) == \
+        expected
+    tmpl = enyaml.TemplateSet(source)
+    assert list(tmpl.render_all_direct(enyaml.Context())) == expected
+
+
+@pytest.mark.parametrize('source', [
+    '!$ 1 + 1',
+    '- !!str 1\n'
+    '- !!map {a: 1}\n'
+    '- !<tag:enyaml.org,2022:$> a\n',
+    '{a: &x [1, !$ a], b: *x}',
+    '!set~ {a: 1}',
+])
+def test_c_loader_matches(source):
+    ctx = enyaml.Context({'a': 1})
+    expected = enyaml.render(source, ctx)
+    assert enyaml.render(source, ctx, enyaml.CTemplateLoader) == expected
+    expected = enyaml.load(source)
+    assert enyaml.load(source, Loader=enyaml.CTemplateLoader) == expected
+
+
+def test_dump_rendered(ctx, roundtrip_file):
+    with roundtrip_file.open() as f:
+        data = list(enyaml.render_all(f, ctx))
+    dumped = enyaml.dump_all_rendered(data)
+    assert list(enyaml.load_all(dumped)) == data
+    assert dumped.replace('\n...\n', '\n') == \
+        enyaml.dump_all(data).replace('\n...\n', '\n')
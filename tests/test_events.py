@@ -0,0 +1,114 @@
+import pytest
+import yaml
+import enyaml
+
+from test_enyaml import TESTDIR
+
+
+SOURCES = [
+    'b: 1\na: [!$ x, !$ "x * 2"]\n',
+    'base: &base {z: 1, y: 2}\nderived: {<<: *base, y: 3, a: 4}\n',
+    'a: 1\na: 2\n',
+    '- !$ items\n- !$ obj\n- !$ "\'1\'"\n- !$f "{x}"\n',
+    '!set {a: 1}\n---\n- !$ a\n--- !if [false, x]\n--- last\n',
+    'date: 2001-12-14\nhex: 0x10\nnull: ~\n',
+    '!for i in items: {item: !$ i}',
+    '{b: {!for i in items: {y: !$ i, x: [!$ i, !$f "{i}"]}}, a: [1, !$ x]}',
+    '- !for i in items: !if [!$ "i > 1", !$ i]\n- 0\n'
+    '- !for i in items: [!$ i]\n- {a: !set {b: 1}, c: !$ b}\n',
+    '!for i in items:\n  !for j in items: !$ "i * j"\n',
+    '{z: 1, !$ x: {!$f "{x}": [!$ x]}}',
+]
+
+
+@pytest.fixture
+def ctx():
+    return enyaml.Context({
+        'x': 1, 'items': [1, 2], 'obj': {'b': [1], 'a': None}})
+
+
+@pytest.mark.parametrize('source', SOURCES + [
+    path.read_text() for path in (TESTDIR / 'roundtrips').glob('*.yaml')
+])
+@pytest.mark.parametrize('kwds', [{}, {'sort_keys': False}])
+def test_render_to_stream(source, kwds, ctx):
+    expected = enyaml.dump_all_rendered(
+        enyaml.render_all(source, ctx.new_child()), **kwds)
+    output = enyaml.render_to_stream(source, ctx.new_child(), **kwds)
+    assert list(yaml.safe_load_all(output)) == \
+        list(yaml.safe_load_all(expected))
+    if not any(tag in source for tag in ('0x', '2001', '!$ obj')):
+        assert output.replace('\n...\n', '\n') == \
+            expected.replace('\n...\n', '\n')
+
+
+def test_template_render_to_stream(ctx):
+    tmpl = enyaml.TemplateSet(SOURCES[0])
+    assert tmpl.render_to_stream(ctx) == 'a:\n- 1\n- 2\nb: 1\n'
+    assert tmpl.render_to_stream(ctx, encoding='utf-8', explicit_start=True) \
+        == b'---\na:\n- 1\n- 2\nb: 1\n'
+
+
+def test_render_events(ctx):
+    events = list(enyaml.render_events('[!$ x]', ctx))
+    assert [type(event) for event in events] == [
+        yaml.StreamStartEvent, yaml.DocumentStartEvent,
+        yaml.SequenceStartEvent, yaml.ScalarEvent, yaml.SequenceEndEvent,
+        yaml.DocumentEndEvent, yaml.StreamEndEvent,
+    ]
+    assert events[3].value == '1'
+    assert enyaml.emit(events) == '- 1\n'
+
+
+def test_unhashable_key(ctx):
+    with pytest.raises(yaml.constructor.ConstructorError):
+        enyaml.render_to_stream('? [a]\n: b\n', ctx)
+
+
+class Sink:
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(data)
+        self.size += len(data)
+
+
+def test_render_to_stream_streams_for_loops():
+    sink = Sink()
+    written = []
+
+    def rows(count):
+        for i in range(count):
+            written.append(sink.size)
+            yield i
+    ctx = enyaml.Context({'rows': rows(2000)})
+    tmpl = enyaml.Template(
+        'items:\n  !for i in rows: {n: !$ i, s: !$f "{i}"}')
+    output = tmpl.render_to_stream(ctx, sink)
+    assert output is None
+    assert written[0] == 0
+    assert written[-1] > sink.size // 2
+    data = yaml.safe_load(''.join(sink.chunks))
+    assert data['items'][-1] == {'n': 1999, 's': 1999}
+
+
+def test_render_events_streams_for_loops(ctx):
+    seen = []
+
+    def rows():
+        for i in range(3):
+            seen.append(i)
+            yield i
+    ctx['rows'] = rows()
+    events = enyaml.TemplateSet('- !for i in rows: [!$ i]\n- end\n'
+                                ).render_events(ctx)
+    for event in events:
+        if isinstance(event, yaml.ScalarEvent):
+            break
+    assert event.value == '0'
+    assert seen == [0]
+    assert [event.value for event in events
+            if isinstance(event, yaml.ScalarEvent)] == ['1', '2', 'end']
+    assert seen == [0, 1, 2]
@@ -0,0 +1,45 @@
+import pytest
+
+from enyaml.expr import parse
+
+
+CTX = {
+    'a': 2,
+    'b': 3,
+    'zero': 0,
+    'items': [1, 2, 3],
+    'obj': {'name': 'foo', 'inner': {'value': 4}},
+}
+
+EXPRESSIONS = [
+    '1', '1.5', "'foo'", '"bar"', 'a',
+    '-a', '+a', '--a', 'not a', 'not zero',
+    'a + b * 2', '(a + b) * 2', 'a ^ b', 'b / a', 'b // a', 'b % a',
+    'a - b', 'a < b', 'a > b', 'a <= b', 'a >= b', 'a == b', 'a != b',
+    'a and b', 'zero and missing', 'a or missing', 'zero or b',
+    "'yes' if a else 'no'", "'yes' if zero else 'no'",
+    "missing if zero else 'no'",
+    'obj.name', 'obj.inner.value', 'obj.inner.value * a',
+]
+
+
+@pytest.mark.parametrize('string', EXPRESSIONS)
+def test_compiled_matches_evaluate(string):
+    expr = parse(string)
+    result = expr.evaluate(CTX)
+    assert expr.compile()(CTX) == result
+    assert type(expr.compile()(CTX)) is type(result)
+
+
+@pytest.mark.parametrize('string, exc', [
+    ('missing', KeyError),
+    ('obj.missing', KeyError),
+    ('a / zero', ZeroDivisionError),
+])
+def test_compiled_errors(string, exc):
+    expr = parse(string)
+    with pytest.raises(exc):
+        expr.evaluate(CTX)
+    compiled = expr.compile()
+    with pytest.raises(exc):
+        compiled(CTX)
@@ -0,0 +1,51 @@
+import pytest
+
+from enyaml.expr import parse
+from enyaml.expr.expr import ConstantExpression
+
+
+CTX = {'a': 2, 'zero': 0}
+
+
+@pytest.mark.parametrize('string, folded', [
+    ('60 * 60 * 24', '86400'),
+    ("'prod' == 'prod'", 'True'),
+    ("'a' if 'prod' == 'prod' else b", "'a'"),
+    ("a if 1 < 0 else 'b'", "'b'"),
+    ('a * (60 * 60)', '(a * 3600)'),
+    ('0 and a', '0'),
+    ('1 and a', 'a'),
+    ('1 or a', '1'),
+    ("'' or a", 'a'),
+    ('a and 0', '(a and 0)'),
+    ('1 / 0', '(1 / 0)'),
+    ('-(1 + 2)', '-3'),
+])
+def test_optimize(string, folded):
+    expr = parse(string)
+    optimized = expr.optimize()
+    assert str(optimized) == folded
+    try:
+        expected = expr.evaluate(CTX)
+    except ZeroDivisionError:
+        with pytest.raises(ZeroDivisionError):
+            optimized.compile()(CTX)
+    else:
+        assert optimized.evaluate(CTX) == expected
+        assert optimized.compile()(CTX) == expected
+
+
+def test_fully_constant():
+    assert parse('2 ^ 10 - 24').optimize() == ConstantExpression(1000)
+
+
+@pytest.mark.parametrize('string, names', [
+    ('a', {'a'}),
+    ('a.b.c + d', {'a', 'd'}),
+    ('x if y else z', {'x', 'y', 'z'}),
+    ('not (q * 2)', {'q'}),
+    ('60 * 60', set()),
+])
+def test_names(string, names):
+    assert set(parse(string).names()) == names
+    assert set(parse(string).optimize().names()) == names
@@ -0,0 +1,125 @@
+import pytest
+from enyaml import Context, Template, TemplateSet
+from enyaml.incremental import IncrementalRenderer, TrackingContext
+from enyaml.loader import TemplateLoader
+
+
+TAG = '%TAG !e! tag:enyaml.org,2022:\n---\n'
+
+SOURCE = '''\
+!set {greeting: !$f "hello {name}"}
+---
+name: !$ name
+greeting: !$ greeting
+static: {a: [1, 2]}
+services:
+  !for svc in services:
+    name: !$ svc
+    port: !$ port
+mode: !if [!$ debug, debug, quiet]
+tags:
+  - !$ tag
+  - fixed
+  - !for t in extra: !$ t
+--- !$ name
+'''
+
+
+def make_ctx():
+    return Context({
+        'name': 'a', 'services': ['x', 'y'], 'port': 80, 'debug': False,
+        'tag': 't', 'extra': [1, 2],
+    })
+
+
+@pytest.mark.parametrize('updates', [
+    {},
+    {'name': 'b'},
+    {'port': 81},
+    {'services': ['z']},
+    {'debug': True},
+    {'tag': 'u', 'extra': []},
+])
+def test_rerender_matches_render(updates):
+    ctx = make_ctx()
+    renderer = IncrementalRenderer(TemplateSet(SOURCE), ctx)
+    first = renderer.render()
+    full = renderer.rerendered
+    assert first == list(TemplateSet(SOURCE).render_all(make_ctx()))
+    assert 'greeting' not in ctx
+    ctx.update(updates)
+    result = renderer.rerender(updates)
+    expected = list(TemplateSet(SOURCE).render_all(Context(dict(ctx))))
+    assert result == expected
+    assert renderer.rerendered < full / 2
+    if not updates:
+        assert result == first
+        assert renderer.rerendered == 0
+
+
+def test_rerender_shares_unchanged_data():
+    ctx = make_ctx()
+    renderer = IncrementalRenderer(TemplateSet(SOURCE), ctx)
+    first, _ = renderer.render()
+    ctx['port'] = 81
+    second, _ = renderer.rerender({'port'})
+    assert first['services'][0]['port'] == 80
+    assert second['services'][0]['port'] == 81
+    assert second['static'] is first['static']
+    assert second['tags'] is first['tags']
+
+
+def test_rerender_setter_document():
+    ctx = make_ctx()
+    renderer = IncrementalRenderer(TemplateSet(SOURCE), ctx)
+    renderer.render()
+    ctx['name'] = 'b'
+    (doc, name) = renderer.rerender({'name'})
+    assert doc['greeting'] == 'hello b'
+    assert name == 'b'
+
+
+@pytest.mark.parametrize('base', [{}, {'a': 100}])
+def test_rerender_reused_setter_document(base):
+    ctx = Context(dict(base, x=1, y=10))
+    renderer = IncrementalRenderer(
+        TemplateSet('--- !set {a: !$ x}\n--- !$ a + y\n'), ctx)
+    assert renderer.render() == [11]
+    ctx['y'] = 20
+    assert renderer.rerender({'y'}) == [21]
+    assert renderer.reused >= 1
+    assert dict(ctx) == dict(base, x=1, y=20)
+
+
+def test_rerender_nested_setters():
+    source = '!set {x: !$ a}\n---\n- !$ x\n- !set {y: !$ x}\n- !$ y\n'
+    ctx = Context({'a': 1})
+    renderer = IncrementalRenderer(Template(source), ctx)
+    assert renderer.render() == [1, 1]
+    ctx['a'] = 2
+    assert renderer.rerender({'a'}) == [2, 2]
+    assert renderer.rerender(()) == [2, 2]
+    assert renderer.rerendered == 0
+
+
+def test_rerender_nondeterministic():
+    class Loader(TemplateLoader):
+        pass
+
+    counter = iter(range(100))
+    Loader.add_builtin('tick', lambda: [next(counter)], False)
+    renderer = IncrementalRenderer(
+        Template('a:\n  !for i in tick(): !$ i\nb: !$ b\n', Loader),
+        Context({'b': 1}))
+    assert renderer.render() == {'a': [0], 'b': 1}
+    assert renderer.rerender(()) == {'a': [1], 'b': 1}
+    assert renderer.rerendered == 2
+
+
+def test_tracking_context():
+    ctx = TrackingContext({'a': 1})
+    assert ctx['a'] == 1
+    assert 'b' not in ctx
+    ctx['c'] = 2
+    assert ctx.reads == {'a', 'b'}
+    assert ctx.writes == {'c'}
@@ -0,0 +1,81 @@
+import pytest
+import enyaml
+from enyaml.lazy import Deferred
+
+from test_enyaml import TESTDIR
+
+
+@pytest.fixture(params=(TESTDIR / 'roundtrips').glob('*.yaml'))
+def roundtrip_file(request):
+    return request.param
+
+
+def test_render_lazy_matches(roundtrip_file):
+    source = roundtrip_file.read_text()
+    expected = list(enyaml.render_all(source, enyaml.Context()))
+    tmpl = enyaml.TemplateSet(source)
+    rendered = tmpl.render_all_lazy(enyaml.Context())
+    assert [enyaml.realize(data) for data in rendered] == expected
+
+
+@pytest.mark.parametrize('source', [
+    '{a: !$ x, b: [1, {c: !$f "{x}"}], d: {!for i in items: [!$ i]}}',
+    '- !for i in items: {i: !$ i}\n- !if [!$ "x > 1", [no], [yes]]\n'
+    '- !for i in items: !if [!$ "i > 1", [!$ i]]\n',
+    '{a: !set {x: 2}, b: [!$ x], c: [!set {x: 3}], d: [!$ x]}',
+    '!for i in items:\n  - !set {j: !$ i}\n  - [!$ j]\n',
+    '{<<: {a: 1}, b: [!$ x], ? !$ x : 1, !$f "{x}": 2}',
+])
+def test_render_lazy_matches_render(source):
+    ctx = enyaml.Context({'x': 1, 'items': [1, 2]})
+    expected = enyaml.Template(source).render(ctx.new_child())
+    data = enyaml.Template(source).render_lazy(ctx.new_child())
+    assert data == expected
+    assert enyaml.realize(data) == expected
+
+
+class Probe:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def __format__(self, spec):
+        self.calls.append(spec)
+        return spec
+
+
+def test_render_lazy_defers_collections():
+    calls = []
+    ctx = enyaml.Context({'p': Probe(calls), 'items': range(3)})
+    data = enyaml.Template(
+        '{a: [!$f "{p:a}"], b: {!for i in items: {v: !$f "{p:b}{i}"}},'
+        ' c: !$f "{p:c}"}'
+    ).render_lazy(ctx)
+    assert calls == ['c']
+    assert isinstance(data, enyaml.LazyMapping)
+    assert data['a'] == ['a']
+    assert calls == ['c', 'a']
+    assert len(data['b']) == 3
+    assert data['b'][1] == {'v': 'b1'}
+    assert calls == ['c', 'a', 'b']
+
+
+def test_render_lazy_respects_set_order():
+    ctx = enyaml.Context({'x': 1})
+    data = enyaml.TemplateSet(
+        '--- {a: [!$ x], b: [!set {x: 2}], c: [!$ x]}\n--- !set {x: 3}\n'
+    ).render_all_lazy(ctx)
+    data = list(data)[0]
+    assert ctx['x'] == 3
+    assert isinstance(data._items['a'], Deferred)
+    assert data['c'] == [2]
+    assert data['a'] == [1]
+
+
+def test_lazy_views():
+    data = enyaml.Template('{a: [1, 2, 3], b: 2}').render_lazy(
+        enyaml.Context())
+    assert list(data) == ['a', 'b']
+    assert 'a' in data and 'c' not in data
+    assert data['a'][1:] == [2, 3]
+    assert data['a'][-1] == 3
+    assert repr(data) == "LazyMapping({'a': LazySequence([1, 2, 3]), 'b': 2})"
@@ -0,0 +1,127 @@
+import os
+import pytest
+from enyaml.__main__ import main
+
+
+def test_main(tmp_path):
+    infile = tmp_path / 'in.yaml'
+    outfile = tmp_path / 'out.yaml'
+    infile.write_text('!set {x: 1}\n---\na: {b: [!$ x]}\nc: !$ nope\n')
+    with pytest.raises(KeyError):
+        main([str(infile), '-o', str(outfile)])
+    assert main([str(infile), '-o', str(outfile), '--select', 'a.b']) == 0
+    assert outfile.read_text() == '- 1\n'
+
+
+def test_main_select_missing(tmp_path, capsys):
+    infile = tmp_path / 'in.yaml'
+    infile.write_text('a: 1\n')
+    with pytest.raises(SystemExit) as exc:
+        main([str(infile), '--select', 'a.b'])
+    assert exc.value.code == 1
+    assert 'path not found: a.b' in capsys.readouterr().err
+
+
+def test_main_cache(tmp_path):
+    infile = tmp_path / 'in.yaml'
+    outfile = tmp_path / 'out.yaml'
+    cache = tmp_path / 'cache'
+    infile.write_text('!set {x: 1}\n---\na: {b: [!$ x]}\n')
+    for _ in range(2):
+        args = [str(infile), '-o', str(outfile), '--cache', str(cache)]
+        assert main(args) == 0
+        assert outfile.read_text() == 'a:\n  b:\n  - 1\n'
+        assert main(args + ['-s', 'a.b']) == 0
+        assert outfile.read_text() == '- 1\n'
+    assert len(os.listdir(cache)) == 1
+
+
+def test_main_batch(tmp_path, capsys):
+    for i in range(5):
+        (tmp_path / f't{i}.yaml').write_text(f'a: !$ {i} + 1\n')
+    (tmp_path / 'bad.yaml').write_text('a: !$ nope\n')
+    outdir = tmp_path / 'out'
+    pattern = str(tmp_path / '*.yaml')
+    assert main([pattern, '-d', str(outdir), '-j', '2']) == 1
+    for i in range(5):
+        assert (outdir / f't{i}.yaml').read_text() == f'a: {i + 1}\n'
+    err = capsys.readouterr().err
+    assert "bad.yaml: KeyError: 'nope'" in err
+    assert '1 of 6 templates failed' in err
+    infile = str(tmp_path / 't1.yaml')
+    args = [infile, '-p', str(outdir / '{stem}.out{suffix}'), '-s', 'a']
+    assert main(args) == 0
+    assert (outdir / 't1.out.yaml').read_text() == '2\n'
+
+
+def test_main_batch_keeps_layout(tmp_path):
+    for name in ('api', 'web'):
+        (tmp_path / 'svc' / name).mkdir(parents=True)
+        (tmp_path / 'svc' / name / 'config.yaml').write_text(f'a: {name}\n')
+    outdir = tmp_path / 'out'
+    pattern = str(tmp_path / 'svc' / '*' / 'config.yaml')
+    assert main([pattern, '-d', str(outdir), '-j', '2']) == 0
+    assert (outdir / 'api' / 'config.yaml').read_text() == 'a: api\n'
+    assert (outdir / 'web' / 'config.yaml').read_text() == 'a: web\n'
+
+
+@pytest.mark.parametrize('args, message', [
+    (['*/config.yaml', '-p', 'out/{name}'],
+     'would both be rendered to out/config.yaml'),
+    (['api/config.yaml', '-p', '{parent}/{name}'],
+     'would overwrite the template api/config.yaml'),
+    (['api/config.yaml', 'web/config.yaml', '-d', 'api', '-p', '../{name}'],
+     'would overwrite the template api/config.yaml'),
+])
+def test_main_batch_conflicts(tmp_path, monkeypatch, capsys, args, message):
+    monkeypatch.chdir(tmp_path)
+    for name in ('api', 'web'):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'config.yaml').write_text('a: !$ 1\n')
+    with pytest.raises(SystemExit) as exc:
+        main(args)
+    assert exc.value.code == 2
+    assert message in capsys.readouterr().err
+    for name in ('api', 'web'):
+        assert (tmp_path / name / 'config.yaml').read_text() == 'a: !$ 1\n'
+    assert not (tmp_path / 'out').exists()
+
+
+def test_main_several_files_need_outdir(tmp_path):
+    with pytest.raises(SystemExit) as exc:
+        main([str(tmp_path / 'a.yaml'), str(tmp_path / 'b.yaml')])
+    assert exc.value.code == 2
+
+
+@pytest.mark.parametrize('args, message', [
+    (['missing.yaml'], "argument infile: can't open 'missing.yaml'"),
+    (['in.yaml', '-c', 'missing.jsonl'],
+     "argument --contexts/-c: can't open 'missing.jsonl'"),
+    (['-d', 'out'], '--outdir and --pattern need template files'),
+    (['-', '-p', '{name}'], '--outdir and --pattern need template files'),
+    (['in.yaml', '-d', 'out', '-c', 'ctx.jsonl'],
+     "--contexts can't be combined with --outdir or --pattern"),
+])
+def test_main_usage_errors(tmp_path, monkeypatch, capsys, args, message):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'in.yaml').write_text('a: 1\n')
+    (tmp_path / 'ctx.jsonl').write_text('{}\n')
+    with pytest.raises(SystemExit) as exc:
+        main(args)
+    assert exc.value.code == 2
+    assert message in capsys.readouterr().err
+    assert not (tmp_path / 'out').exists()
+
+
+@pytest.mark.parametrize('name, contexts', [
+    ('ctx.jsonl', '{"name": "a", "n": 1}\n\n{"name": "b", "n": 2}\n'),
+    ('ctx.yaml', 'name: a\nn: 1\n---\nname: b\nn: 2\n'),
+])
+def test_main_contexts(tmp_path, name, contexts):
+    infile = tmp_path / 'in.yaml'
+    infile.write_text('!set {m: !$ n}\n---\n{name: !$ name, m: !$ m}\n')
+    (tmp_path / name).write_text(contexts)
+    outfile = tmp_path / 'out.yaml'
+    args = [str(infile), '-c', str(tmp_path / name), '-o', str(outfile)]
+    assert main(args) == 0
+    assert outfile.read_text() == 'm: 1\nname: a\n---\nm: 2\nname: b\n'
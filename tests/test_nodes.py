@@ -0,0 +1,218 @@
+import re
+import pytest
+import enyaml
+from enyaml import nodes
+
+
+def test_expression_parsed_once():
+    nodes.expression_cache.clear()
+    tmpl = enyaml.Template('!for i in items: !$ i * 2')
+    assert tmpl.render(enyaml.Context({'items': [1, 2, 3]})) == [2, 4, 6]
+    assert tmpl.render(enyaml.Context({'items': [4]})) == [8]
+    info = nodes.expression_cache.info()
+    assert info.misses == 1
+    assert info.hits == 0
+
+
+def test_expression_cache_shared_between_templates():
+    nodes.expression_cache.clear()
+    for _ in range(3):
+        assert enyaml.render('!$ 1 + a', enyaml.Context({'a': 1})) == 2
+    info = nodes.expression_cache.info()
+    assert (info.hits, info.misses) == (2, 1)
+
+
+def test_rendered_expression_is_detemplified():
+    node = enyaml.compose('!$ 1')
+    rendered = node.render(enyaml.TemplateLoader(''), enyaml.Context())
+    assert type(rendered) is enyaml.ScalarTemplateNode.node_type
+    assert not hasattr(rendered, 'expr')
+
+
+def test_static_subtree_rendered_once():
+    tmpl = enyaml.Template(
+        'static: {a: [1, 2], b: !!str 3}\n'
+        'dynamic: [1, !$ x]\n'
+    )
+    root = tmpl.nodes[0]
+    (_, static), (_, dynamic) = root.value
+    assert static.static
+    assert not dynamic.static
+    assert not root.static
+    first = tmpl.render(enyaml.Context({'x': 1}))
+    second = tmpl.render(enyaml.Context({'x': 2}))
+    assert first == {'static': {'a': [1, 2], 'b': '3'}, 'dynamic': [1, 1]}
+    assert second == {'static': {'a': [1, 2], 'b': '3'}, 'dynamic': [1, 2]}
+    assert first['static'] is not second['static']
+    loader = tmpl.make_loader()
+    # The first use by each loader isn't copied; later ones copy the
+    # collections, and share the scalars.
+    shared = static.render(loader, None)
+    assert static.render(tmpl.make_loader(), None) is shared
+    copied = static.render(loader, None)
+    assert copied is not shared
+    assert copied.value[0][0] is shared.value[0][0]
+
+
+def test_static_subtree_in_loop_not_shared():
+    tmpl = enyaml.Template('!for i in [1, 2]: {a: [1]}')
+    first, second = tmpl.render(enyaml.Context())
+    assert first == second
+    assert first is not second
+    assert first['a'] is not second['a']
+
+
+def test_static_merge_key():
+    tmpl = enyaml.Template(
+        'base: &base {a: 1}\n'
+        'derived: {<<: *base, b: 2}\n'
+    )
+    for _ in range(2):
+        assert tmpl.render(enyaml.Context()) == {
+            'base': {'a': 1}, 'derived': {'a': 1, 'b': 2}}
+    # Merge keys are flattened in place, so the result is always copied.
+    derived = tmpl.nodes[0].value[1][1]
+    assert derived.static
+    assert derived.render(tmpl.make_loader(), None) is not \
+        derived.render(tmpl.make_loader(), None)
+
+
+def test_for_header_parsed_once():
+    tmpl = enyaml.Template('!for a, b in pairs: !$ a + b')
+    ctx = enyaml.Context({'pairs': [(1, 2), (3, 4)]})
+    assert tmpl.render(ctx) == [3, 7]
+    for_node = tmpl.nodes[0].value[0][0]
+    assert for_node.header[0] == ('a', 'b')
+    assert tmpl.render(enyaml.Context({'pairs': [[5, 6]]})) == [11]
+    assert dict(ctx) == {'pairs': [(1, 2), (3, 4)]}
+
+
+def test_for_unpack_errors():
+    tmpl = enyaml.Template('!for a, b in pairs: !$ a')
+    with pytest.raises(ValueError, match='not enough values'):
+        tmpl.render(enyaml.Context({'pairs': [(1,)]}))
+    with pytest.raises(ValueError, match='too many values'):
+        tmpl.render(enyaml.Context({'pairs': [(1, 2, 3)]}))
+
+
+def test_for_invalid_header():
+    with pytest.raises(nodes.RenderError):
+        enyaml.render('!for 1 in x: y', enyaml.Context())
+
+
+@pytest.mark.parametrize('fmt, expected', [
+    ('{a} {b.real} {c[0]:>{width}} {a!r}', {'a', 'b', 'c', 'width'}),
+    ('{{literal}} {0} {}', set()),
+])
+def test_format_fields(fmt, expected):
+    assert set(nodes.format_fields(fmt)) == expected
+
+
+def test_format_string_lookups():
+    tmpl = enyaml.Template(
+        "- !$f '{name!r:>{width}}'\n"
+        "- !$f '{items[1]}'\n"
+        "- !$f '{ctx[name]}'\n"
+    )
+    ctx = enyaml.Context({'name': 'x', 'width': 5, 'items': [1, 2]})
+    assert tmpl.render(ctx) == ["  'x'", 2, 'x']
+    with pytest.raises(KeyError):
+        enyaml.render("!$f '{missing}'", ctx)
+
+
+def test_render_scope_reused():
+    loader = enyaml.TemplateLoader('')
+    ctx = enyaml.Context()
+    scope = loader.render_scope(ctx)
+    assert loader.render_scope(ctx) is scope
+    assert loader.render_scope(enyaml.Context()) is not scope
+    assert scope['ctx'] is ctx
+    assert scope['__builtins__']['zip'] is zip
+
+
+def test_add_builtin():
+    class Loader(enyaml.TemplateLoader):
+        pass
+
+    enyaml.add_builtin('double', lambda xs: [x * 2 for x in xs], Loader)
+    assert 'double' not in enyaml.TemplateLoader.BUILTINS
+    tmpl = enyaml.Template('!for x in double(items): !$ x', Loader)
+    assert tmpl.render(enyaml.Context({'items': [1, 2]})) == [2, 4]
+    assert tmpl.names == {'double', 'items', 'x'}
+    assert not Loader.NONDETERMINISTIC
+    enyaml.add_builtin('now', object, Loader, deterministic=False)
+    assert Loader.NONDETERMINISTIC == {'now'}
+    assert not enyaml.TemplateLoader.NONDETERMINISTIC
+    enyaml.add_builtin('now', object, Loader)
+    assert not Loader.NONDETERMINISTIC
+
+
+@pytest.mark.parametrize('Loader', [
+    enyaml.TemplateLoader, enyaml.CTemplateLoader])
+def test_add_builtin_all_loaders(monkeypatch, Loader):
+    for cls in (
+        enyaml.BaseTemplateLoader, enyaml.TemplateLoader,
+        enyaml.CTemplateLoader,
+    ):
+        for attr in ('BUILTINS', 'NONDETERMINISTIC'):
+            monkeypatch.setattr(cls, attr, getattr(cls, attr).copy())
+    # A loader class with its own builtins still sees ones added later to
+    # the base class.
+    enyaml.add_builtin('own', list, enyaml.TemplateLoader)
+    enyaml.add_builtin('triple', lambda xs: [x * 3 for x in xs])
+    enyaml.add_builtin('now', object, deterministic=False)
+    tmpl = enyaml.Template('!for x in triple(items): !$ x', Loader)
+    assert tmpl.render(enyaml.Context({'items': [1, 2]})) == [3, 6]
+    assert Loader.NONDETERMINISTIC == {'now'}
+
+
+def test_referenced_names():
+    tmpl = enyaml.TemplateSet(
+        '!set {x: !$ a.b}\n---\n'
+        '- !$f "{c}{d.e:{w}}"\n'
+        '- !for i in f(g): !$ i\n'
+        '- !for j in [h(k) for k in (lambda:m)()]: !$ j\n'
+        '- !$ 1 +\n'
+    )
+    assert tmpl.names >= {'a', 'c', 'd', 'w', 'f', 'g', 'i', 'h', 'm'}
+    assert 'b' not in tmpl.names
+
+
+def test_render_object_creates_no_result_nodes(monkeypatch):
+    tmpl = enyaml.TemplateSet(
+        '{a: [!$ x, !$f "{x}y"], !$ x: !if [!$ x, {!for i in items: !$ i}]}')
+    ctx = enyaml.Context({'x': 1, 'items': [1, 2]})
+    expected = list(tmpl.render_all(ctx))
+
+    def fail(*args, **kwds):
+        raise AssertionError('result node created')
+    monkeypatch.setattr(enyaml.BaseTemplateNode, 'make_result_node', fail)
+    assert list(tmpl.render_all_direct(ctx)) == expected
+
+
+def test_resolve_cache_counts_hits():
+    tmpl = enyaml.Template('!for i in items: [!$f "{i}", !$f "x"]')
+    stats = enyaml.RenderStats()
+    ctx = enyaml.Context({'items': [1, 2, 1, 2]})
+    assert tmpl.render(ctx, stats) == [[1, 'x'], [2, 'x'], [1, 'x'], [2, 'x']]
+    assert stats.resolve_hits + stats.resolve_misses == 8
+    assert stats.resolve_hits >= 5
+    assert tmpl.render_direct(ctx) == tmpl.render(ctx)
+
+
+def test_resolve_cache_cleared_by_add_implicit_resolver():
+    class Loader(enyaml.TemplateLoader):
+        pass
+    tmpl = enyaml.Template('!$f "{x}"', Loader=Loader)
+    ctx = enyaml.Context({'x': 'xyz'})
+    assert tmpl.render(ctx) == 'xyz'
+    Loader.add_implicit_resolver('!xyz', re.compile('^xyz$'), ['x'])
+    Loader.add_constructor('!xyz', lambda loader, node: 'XYZ')
+    assert tmpl.render(ctx) == 'XYZ'
+
+
+def test_literal_scalar_resolved_when_composed():
+    tmpl = enyaml.Template('!tmpl 1')
+    stats = enyaml.RenderStats()
+    assert tmpl.render(enyaml.Context(), stats) == 1
+    assert stats.resolve_hits == stats.resolve_misses == 0
@@ -0,0 +1,76 @@
+import pytest
+import enyaml
+from enyaml.selector import parse_path
+
+
+SOURCE = '''
+!set
+x: 1
+---
+services:
+  api:
+    env: {URL: !$f "http://api:{x}"}
+    ports: [80, !$ "x + 8000"]
+  db:
+    env: !$ fail
+  !$f "svc{x}": [a, b]
+items:
+  - !if [false, skipped]
+  - !for i in items: {i: !$ i}
+  - !for i in items: !if [!$ "i > 1", [!$ i]]
+  - last
+set:
+  - !set {x: 2}
+  - !$ x
+after: !$ x
+'''
+
+
+@pytest.fixture
+def tmpl():
+    return enyaml.Template(SOURCE)
+
+
+def ctx():
+    return enyaml.Context({'items': [1, 2, 3]})
+
+
+def test_parse_path():
+    assert parse_path('a.b.0') == ('a', 'b', '0')
+    assert parse_path('') == ()
+    assert parse_path(['a.b', 0]) == ('a.b', 0)
+
+
+@pytest.mark.parametrize('path, expected', [
+    ('services.api.env', {'URL': 'http://api:1'}),
+    ('services.api.ports.1', 8001),
+    ('services.svc1.1', 'b'),
+    ('items.0', {'i': 1}),
+    ('items.2.i', 3),
+    ('items.3', [2]),
+    ('items.5', 'last'),
+    ('items.-1', 'last'),
+    ('set.0', 2),
+    ('after', 2),
+])
+def test_select(tmpl, path, expected):
+    assert tmpl.select(ctx(), path) == expected
+
+
+def test_select_skips_other_nodes(tmpl):
+    with pytest.raises(KeyError):
+        tmpl.render(ctx())
+    assert tmpl.select(ctx(), 'services.api.env.URL') == 'http://api:1'
+
+
+@pytest.mark.parametrize('path', [
+    'nope', 'services.nope', 'items.6', 'items.x', 'after.x', 'set.1.x',
+])
+def test_select_missing(tmpl, path):
+    with pytest.raises(enyaml.PathNotFoundError):
+        tmpl.select(ctx(), path)
+
+
+def test_select_all():
+    tmpl = enyaml.TemplateSet('--- {a: 1}\n--- !set {b: 2}\n--- {a: !$ b}\n')
+    assert list(tmpl.select_all(enyaml.Context(), 'a')) == [1, 2]
@@ -0,0 +1,152 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import enyaml
+from enyaml import nodes
+from yaml.composer import ComposerError
+from yaml.constructor import ConstructorError
+
+from test_enyaml import TESTDIR
+
+
+@pytest.fixture
+def ctx():
+    return enyaml.Context()
+
+
+@pytest.fixture(params=(TESTDIR / 'roundtrips').glob('*.yaml'))
+def roundtrip_file(request):
+    return request.param
+
+
+def test_render_all_matches_per_call(roundtrip_file):
+    source = roundtrip_file.read_text()
+    tmpl = enyaml.TemplateSet(source)
+    for _ in range(2):
+        expected = list(enyaml.render_all(source, enyaml.Context()))
+        assert list(tmpl.render_all(enyaml.Context())) == expected
+
+
+def test_render_repeatedly():
+    tmpl = enyaml.Template('- !$ a\n- !for x in items: !$ x\n')
+    assert tmpl.render(enyaml.Context({'a': 1, 'items': [2, 3]})) == [1, 2, 3]
+    assert tmpl.render(enyaml.Context({'a': 4, 'items': []})) == [4]
+
+
+def test_render_set_persists_across_documents(ctx):
+    tmpl = enyaml.Template('--- !set\nfoo: 1\n--- !$ foo\n')
+    assert tmpl.render(ctx) == 1
+    assert ctx['foo'] == 1
+
+
+def test_render_multiple_documents(ctx):
+    tmpl = enyaml.Template('--- 1\n--- 2\n')
+    with pytest.raises(ComposerError):
+        tmpl.render(ctx)
+
+
+def test_render_empty(ctx):
+    assert enyaml.Template('').render(ctx) is None
+
+
+TAG = '%TAG !e! tag:enyaml.org,2022:\n---\n'
+
+
+@pytest.mark.parametrize('source', [
+    '!$ a',
+    TAG + '{a: !$ a, b: !$f "{a}", c: !$f "x{a}", d: !e!$:!!str a}',
+    TAG + '- !e!$f:!!str "{a}"\n- !e!tmpl:!!str 1\n- !!set {x}\n'
+    '- !$ items\n',
+    '{<<: {x: 1}, x: 2, y: [!if [!$ "a > 1", yes, no]]}',
+    TAG + '- !for i in items: [!$ i]\n- !e!for:!!seq i in items: !$ i\n'
+    '- !for i, j in zip(items, items): !$ "i + j"\n',
+    TAG + '{x: {!e!for:!!seq i in items: !$ i}}',
+    '!set {b: !$ a}\n---\n[!$ b, !if [false, x]]\n',
+    '- !set {b: 1}\n- !$ b\n- !if [false, x]\n',
+    '{a: 1, a: 2, ? !$ a : 3}',
+])
+def test_render_direct_matches(source):
+    ctx = enyaml.Context({'a': 1, 'items': [1, 2]})
+    expected = list(enyaml.render_all(source, ctx.new_child()))
+    tmpl = enyaml.TemplateSet(source)
+    assert list(tmpl.render_all_direct(ctx.new_child())) == expected
+    if len(expected) == 1:
+        assert enyaml.Template(source).render_direct(ctx.new_child()) == \
+            expected[0]
+
+
+def test_render_direct_unhashable_key(ctx):
+    with pytest.raises(ConstructorError):
+        enyaml.Template('? [a]\n: b\n').render_direct(ctx)
+    with pytest.raises(ComposerError):
+        enyaml.Template('--- 1\n--- 2\n').render_direct(ctx)
+
+
+CONCURRENT_SOURCE = """\
+static: {a: [1, 2], b: text}
+--- !set
+total: !$ base + n
+---
+n: !$ n
+total: !$ total
+items:
+  - !for i in items: {i: !$ i, label: !$f "{name}-{i}"}
+choice: !if [!$ "n > 5", big, small]
+label: !$f "{n}"
+"""
+
+
+def test_render_from_threads(monkeypatch):
+    # Renders a shared template from many threads at once, each with its own
+    # layer over a shared Context, and compares with rendering serially.
+    monkeypatch.setattr(nodes, 'RESOLVE_CACHE_SIZE', 8)
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        base = enyaml.Context({'base': 100, 'name': 'x'})
+
+        def render(tmpl, n):
+            ctx = base.new_child({'n': n, 'items': list(range(n % 10))})
+            return (
+                list(tmpl.render_all(ctx.new_child())),
+                list(tmpl.render_all_direct(ctx.new_child())),
+                tmpl.render_to_stream(ctx.new_child()),
+            )
+
+        serial_tmpl = enyaml.TemplateSet(CONCURRENT_SOURCE)
+        expected = [render(serial_tmpl, n) for n in range(200)]
+        tmpl = enyaml.TemplateSet(CONCURRENT_SOURCE)
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(
+                lambda n: render(tmpl, n), range(200)))
+    finally:
+        sys.setswitchinterval(interval)
+    assert results == expected
+    assert dict(base) == {'base': 100, 'name': 'x'}
+
+
+def test_render_lazy_values():
+    calls = []
+
+    def factory(name, value):
+        return enyaml.LazyValue(lambda: calls.append(name) or value)
+
+    tmpl = enyaml.Template(
+        '- !$ a\n- !$f "{b}"\n- !for x in c: !$ x\n'
+        '- !if [!$ flag, !$ d, !$ e]\n'
+    )
+    base = enyaml.Context({
+        'a': factory('a', 1), 'b': factory('b', 2), 'c': factory('c', [3]),
+        'd': factory('d', 4), 'e': factory('e', 5), 'flag': False,
+        'unused': factory('unused', 6),
+    })
+    stats = enyaml.RenderStats()
+    assert tmpl.render(base.new_child(), stats) == [1, 2, 3, 5]
+    assert sorted(calls) == ['a', 'b', 'c', 'e']
+    assert stats.lazy_realized == 4
+    # Realized values were cached in the shared scope which defined them.
+    stats = enyaml.RenderStats()
+    ctx = base.new_child({'flag': True})
+    assert tmpl.render_direct(ctx, stats) == [1, 2, 3, 4]
+    assert stats.lazy_realized == 1
+    assert sorted(calls) == ['a', 'b', 'c', 'd', 'e']
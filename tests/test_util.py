@@ -0,0 +1,199 @@
+import pytest
+from enyaml.util import LRUCache, RenderStats
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.get_or_create('a', str.upper)
+    cache.get_or_create('b', str.upper)
+    cache.get_or_create('a', str.upper)
+    cache.get_or_create('c', str.upper)
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert cache.info() == (1, 3, 1, 2, 2)
+
+
+def test_lru_cache_factory_error():
+    cache = LRUCache(2)
+
+    def fail(key):
+        raise ValueError(key)
+
+    with pytest.raises(ValueError):
+        cache.get_or_create('a', fail)
+    assert len(cache) == 0
+
+
+def test_lru_cache_ttl():
+    now = [0.0]
+    cache = LRUCache(2, ttl=10, clock=lambda: now[0])
+    cache.get_or_create('a', str.upper)
+    now[0] = 9
+    assert 'a' in cache
+    cache.get_or_create('a', str.lower)
+    now[0] = 10
+    assert 'a' not in cache
+    assert cache.get_or_create('a', str.lower) == 'a'
+    assert cache.info() == (1, 2, 1, 2, 1)
+
+
+def test_lru_cache_clear():
+    cache = LRUCache(2)
+    cache.get_or_create('a', str.upper)
+    cache.clear()
+    assert cache.info() == (0, 0, 0, 2, 0)
+
+
+def test_context_lookup_through_scopes():
+    from enyaml import Context
+    c = Context({'a': 1, 'b': 1})
+    with c.push({'a': 2}):
+        with c.push():
+            c['b'] = 3
+            c['c'] = 3
+            assert (c['a'], c['b'], c['c']) == (2, 3, 3)
+            del c['b']
+            assert c['b'] == 1
+        assert 'c' not in c
+        with c.push({'b': 4, 'd': 4}, len(c.maps)):
+            assert (c['b'], c['d']) == (1, 4)
+        assert c.get('d') is None
+    assert dict(c) == {'a': 1, 'b': 1}
+    with pytest.raises(KeyError):
+        c['c']
+
+
+def test_context_pop_and_clear():
+    from enyaml import Context
+    c = Context({'a': 1})
+    with c.push({'a': 2, 'b': 2}):
+        assert c.pop('a') == 2
+        assert c['a'] == 1
+        c.clear()
+        assert 'b' not in c
+        assert c['a'] == 1
+    assert c.pop('a') == 1
+    assert 'a' not in c
+
+
+def test_context_rebuild():
+    from enyaml import Context
+    d = {}
+    c = Context(d)
+    d['a'] = 1
+    c.rebuild()
+    assert c['a'] == 1
+    assert c.new_child({'a': 2})['a'] == 2
+
+
+def test_context_sees_direct_changes():
+    from enyaml import Context
+    d = {'a': 1}
+    c = Context(d)
+    d['a'] = 2
+    assert c['a'] == 2
+    d['b'] = 3
+    assert 'b' in c and c['b'] == 3
+    del d['b']
+    assert 'b' not in c and c.get('b') is None
+    c.maps.insert(0, {'a': 5})
+    assert c['a'] == 5
+    c.maps[0] = {'c': 6}
+    assert (c['a'], c['c']) == (2, 6)
+    del c.maps[0]
+    assert 'c' not in c
+    c.maps.append({'e': 7})
+    assert c['e'] == 7
+    c.maps = [{'f': 8}]
+    assert dict(c) == {'f': 8}
+    with c.push({'f': 9}):
+        assert c['f'] == 9
+    assert c['f'] == 8
+
+
+def test_context_sees_direct_front_changes():
+    from collections import ChainMap
+    from enyaml import Context, LazyValue
+    for cls in (ChainMap, Context):
+        c = cls({'a': 1}).new_child()
+        merged = c | {'a': 2}
+        assert type(merged) is cls
+        assert (merged['a'], dict(merged)) == (2, {'a': 2})
+        assert c['a'] == 1
+        c.maps[0].update(a=3)
+        assert (c['a'], c.get('a'), 'a' in c) == (3, 3, True)
+        assert dict(c) == {'a': 3}
+        del c.maps[0]['a']
+        assert c['a'] == 1
+        assert ({'a': 5} | c)['a'] == 1
+    c.maps[0].update(a=3, b=LazyValue(lambda: 4))
+    assert (c['b'], c.maps[0]['b']) == (4, 4)
+    assert dict(c.snapshot()) == {'a': 3, 'b': 4}
+
+
+def test_context_pickle():
+    import pickle
+    from enyaml import Context
+    c = pickle.loads(pickle.dumps(Context({'a': 2}, {'a': 1, 'b': 1})))
+    assert dict(c) == {'a': 2, 'b': 1}
+    c.maps.pop(0)
+    assert c['a'] == 1
+
+
+def test_context_lazy_value():
+    from enyaml import Context, LazyValue
+    calls = []
+
+    def factory(value):
+        return lambda: calls.append(value) or value
+
+    base = {'a': LazyValue(factory('a')), 'unused': LazyValue(factory('u'))}
+    c = Context(base)
+    assert 'a' in c and 'unused' in c
+    assert calls == []
+    with c.push({'b': LazyValue(factory('b'))}) as scope:
+        assert c['a'] == 'a'
+        assert c.get('b') == 'b'
+        assert scope.maps[0]['b'] == 'b'
+    assert 'b' not in c
+    # The value is cached in the scope which defined it.
+    assert base['a'] == 'a'
+    assert c.new_child()['a'] == 'a'
+    assert calls == ['a', 'b']
+
+
+def test_context_lazy_value_shared():
+    from enyaml import Context, LazyValue
+    calls = []
+    c = Context({'a': LazyValue(lambda: calls.append(1) or 1)})
+    snapshot = c.snapshot()
+    c.stats = RenderStats()
+    assert c['a'] == snapshot['a'] == 1
+    assert calls == [1]
+    assert c.stats.lazy_realized == 1
+
+
+def test_context_lazy_value_error():
+    from enyaml import Context, LazyValue
+    results = iter([ValueError, 1])
+
+    def factory():
+        result = next(results)
+        if result is ValueError:
+            raise result
+        return result
+
+    c = Context({'a': LazyValue(factory)})
+    with pytest.raises(ValueError):
+        c['a']
+    assert c['a'] == 1
+
+
+def test_render_stats():
+    stats = RenderStats()
+    assert stats.resolve_hit_rate == 0.0
+    stats.resolve_hits = 3
+    stats.resolve_misses = 1
+    assert stats.resolve_hit_rate == 0.75
+    assert repr(stats) == (
+        'RenderStats(resolve_hits=3, resolve_misses=1, lazy_realized=0)')